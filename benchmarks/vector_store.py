@@ -0,0 +1,202 @@
+"""Scaling benchmark for VectorStore on synthetic embeddings.
+
+Measures ingest throughput, exact and approximate (IVF) query latency,
+recall@k of the approximate search against exact search and resident memory
+for each corpus size, and writes the results as JSON.
+"""
+
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import typer
+
+from ask_panda.tools.ann_index import IVFIndex
+from ask_panda.tools.quantization import ScalarQuantizer
+from ask_panda.tools.vector_store import VectorStore
+
+SCHEMA_VERSION = 1
+DEFAULT_SIZES = "10000,100000,1000000"
+
+app = typer.Typer(help="Benchmark VectorStore ingest, search latency, recall and memory")
+
+
+def _rss_mb() -> float:
+    """Get the current resident set size.
+
+    Returns:
+        The resident memory in MiB, or the peak if the current value is unavailable.
+    """
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except (OSError, IndexError, ValueError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    """Get the peak resident set size of this process.
+
+    Returns:
+        The peak resident memory in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _synthetic(rng: np.random.Generator, centers: np.ndarray, count: int) -> np.ndarray:
+    """Draw embeddings from a Gaussian mixture around unit-length centers.
+
+    Clustered data gives the IVF index realistic structure, unlike uniform noise.
+
+    Args:
+        rng: The random generator.
+        centers: ``(clusters, dim)`` cluster centers.
+        count: Number of vectors to draw.
+
+    Returns:
+        A ``(count, dim)`` float32 array.
+    """
+    labels = rng.integers(len(centers), size=count)
+    noise = rng.standard_normal((count, centers.shape[1]), dtype=np.float32)
+    return centers[labels] + 0.35 * noise / np.sqrt(centers.shape[1])
+
+
+def _latencies(timings: list[float]) -> dict[str, float]:
+    """Summarize query latencies.
+
+    Args:
+        timings: Per-query latencies in seconds.
+
+    Returns:
+        Median, 99th percentile and mean latency in milliseconds.
+    """
+    millis = np.asarray(timings) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(millis, 50)),
+        "p99_ms": float(np.percentile(millis, 99)),
+        "mean_ms": float(millis.mean()),
+    }
+
+
+def run_size(
+    size: int, dim: int, queries: int, top_k: int, batch_size: int, nprobe: int, quantize: bool, seed: int
+) -> dict[str, Any]:
+    """Benchmark one corpus size.
+
+    Args:
+        size: Number of documents.
+        dim: Embedding dimension.
+        queries: Number of timed queries per search mode.
+        top_k: Number of results per query.
+        batch_size: Number of documents per ``add_documents`` call.
+        nprobe: Number of IVF lists probed per approximate query.
+        quantize: Whether the approximate search also uses 8-bit scalar quantization.
+        seed: Random seed.
+
+    Returns:
+        The results for this size.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(size // 1000, 16), dim), dtype=np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    nlist = max(int(4 * np.sqrt(size)), 1)
+    store = VectorStore(
+        embedding_dim=dim,
+        initial_capacity=size,
+        index=IVFIndex(nlist=nlist, nprobe=nprobe, min_train_size=min(size, 10_000)),
+        quantizer=ScalarQuantizer() if quantize else None,
+    )
+    baseline_rss = _rss_mb()
+
+    # Only add_documents is timed; each batch is generated beforehand
+    ingest_seconds = 0.0
+    for start in range(0, size, batch_size):
+        count = min(batch_size, size - start)
+        documents, embeddings = [f"doc {i}" for i in range(start, start + count)], _synthetic(rng, centers, count)
+        started = time.perf_counter()
+        store.add_documents(documents, embeddings=embeddings)
+        ingest_seconds += time.perf_counter() - started
+
+    started = time.perf_counter()
+    store.build_index()
+    build_seconds = time.perf_counter() - started
+
+    query_vectors = _synthetic(rng, centers, queries)
+    exact_timings, approx_timings, recalls = [], [], []
+    for query in query_vectors:
+        started = time.perf_counter()
+        exact = store.search("", top_k=top_k, query_embedding=query, exact=True)
+        exact_timings.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        approx = store.search("", top_k=top_k, query_embedding=query)
+        approx_timings.append(time.perf_counter() - started)
+        expected = {result["index"] for result in exact}
+        recalls.append(len(expected & {result["index"] for result in approx}) / len(expected))
+
+    return {
+        "documents": size,
+        "ingest": {"seconds": ingest_seconds, "documents_per_second": size / ingest_seconds},
+        "exact": _latencies(exact_timings),
+        "approximate": {
+            "index": "ivf+sq8" if quantize else "ivf",
+            "nlist": nlist,
+            "nprobe": nprobe,
+            "build_seconds": build_seconds,
+            **_latencies(approx_timings),
+            f"recall_at_{top_k}": float(np.mean(recalls)),
+        },
+        "memory": {"rss_mb": _rss_mb(), "store_rss_mb": _rss_mb() - baseline_rss, "peak_rss_mb": _peak_rss_mb()},
+    }
+
+
+@app.command()
+def main(
+    sizes: str = typer.Option(DEFAULT_SIZES, help="Comma-separated corpus sizes"),
+    dim: int = typer.Option(256, help="Embedding dimension"),
+    queries: int = typer.Option(200, help="Timed queries per search mode"),
+    top_k: int = typer.Option(10, help="Results per query; recall is measured at this k"),
+    batch_size: int = typer.Option(10_000, help="Documents per add_documents call"),
+    nprobe: int = typer.Option(8, help="IVF lists probed per approximate query"),
+    quantize: bool = typer.Option(False, help="Also use 8-bit scalar quantization for approximate search"),
+    seed: int = typer.Option(0, help="Random seed"),
+    output: str | None = typer.Option(None, help="Write the JSON report here instead of stdout"),
+) -> None:
+    """Run the benchmark for every size, each in a fresh process so memory figures do not accumulate."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for size in (int(value) for value in sizes.split(",")):
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            results.append(executor.submit(run_size, size, dim, queries, top_k, batch_size, nprobe, quantize, seed).result())
+        typer.echo(f"{size} documents done", err=True)
+
+    report = {
+        "schema_version": SCHEMA_VERSION,
+        "timestamp": datetime.now(UTC).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "system": platform.system(),
+        },
+        "parameters": {"dim": dim, "queries": queries, "top_k": top_k, "batch_size": batch_size, "quantize": quantize, "seed": seed},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output is None:
+        typer.echo(text)
+    else:
+        Path(output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    app()
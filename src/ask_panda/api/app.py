@@ -1,28 +1,44 @@
 """FastAPI application factory."""
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from ask_panda.api.routes import router
 from ask_panda.config.schemas import ServerConfig
 
+if TYPE_CHECKING:
+    from ask_panda.server import Agent
+
 
-def create_app(config: ServerConfig | None = None) -> FastAPI:
+def create_app(config: ServerConfig | None = None, agent: "Agent | None" = None) -> FastAPI:
     """Create and configure the FastAPI application.
 
     Args:
         config: Optional server configuration.
+        agent: Optional agent answering chat requests; without one the routes return placeholders.
 
     Returns:
         Configured FastAPI application.
     """
     config = config or ServerConfig()
 
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        """Close the agent when the application shuts down."""
+        yield
+        if agent is not None:
+            agent.close()
+
     app = FastAPI(
         title="Ask PanDA API",
         description="A flexible API for building smart assistants for PanDA workflows",
         version="0.1.0",
         debug=config.debug,
+        lifespan=lifespan,
     )
 
     # Configure CORS
@@ -34,6 +50,8 @@ def create_app(config: ServerConfig | None = None) -> FastAPI:
         allow_headers=["*"],
     )
 
+    app.state.agent = agent
+
     # Include routes
     app.include_router(router, prefix="/api/v1")
 
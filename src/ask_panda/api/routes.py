@@ -2,7 +2,7 @@
 
 from typing import Any
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -74,11 +74,14 @@ async def query(request: QueryRequest) -> QueryResponse:
 
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
+async def chat(request: ChatRequest, http_request: Request) -> ChatResponse:
     """Have a chat conversation with the assistant.
 
+    Messages with the same conversation id share one conversation memory.
+
     Args:
         request: The chat request.
+        http_request: The HTTP request, giving access to the application's agent.
 
     Returns:
         Chat response.
@@ -87,9 +90,14 @@ async def chat(request: ChatRequest) -> ChatResponse:
 
     conversation_id = request.conversation_id or str(uuid.uuid4())
 
-    # Placeholder implementation
+    agent = http_request.app.state.agent
+    if agent is not None:
+        message = await agent.chat(request.message, conversation_id=conversation_id)
+    else:
+        # Placeholder implementation
+        message = f"I understand you're asking about: {request.message}"
     return ChatResponse(
-        message=f"I understand you're asking about: {request.message}",
+        message=message,
         conversation_id=conversation_id,
         experiment=request.experiment,
     )
@@ -58,8 +58,8 @@ def serve(
     """Start the API server."""
     import uvicorn
 
-    from ask_panda.api.app import create_app
     from ask_panda.config.schemas import ServerConfig
+    from ask_panda.server import create_app_from_env
 
     console.print("[bold blue]Starting Ask PanDA API server...[/bold blue]")
     console.print(f"Host: {host}")
@@ -68,7 +68,7 @@ def serve(
     console.print(f"Debug mode: {debug}")
 
     config = ServerConfig(host=host, port=port, debug=debug)
-    api_app = create_app(config)
+    api_app = create_app_from_env(config, experiment)
 
     uvicorn.run(api_app, host=host, port=port)
 
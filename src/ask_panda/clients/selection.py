@@ -9,10 +9,16 @@ from ask_panda.clients.logs import LogsClient
 from ask_panda.clients.maintenance import MaintenanceClient
 from ask_panda.clients.pilots import PilotsClient
 from ask_panda.config.schemas import ClientConfig
+from ask_panda.singleflight import SingleFlight, request_key
 
 
 class ClientSelector:
-    """Selector for routing queries to the appropriate domain client."""
+    """Selector for routing queries to the appropriate domain client.
+
+    Unless disabled in the configuration, identical queries to the same
+    client that arrive while one is running share its result (the same
+    dictionary) instead of querying the service again.
+    """
 
     def __init__(self, config: ClientConfig) -> None:
         """Initialize the client selector.
@@ -22,6 +28,7 @@ class ClientSelector:
         """
         self.config = config
         self._clients: dict[str, BaseClient] = {}
+        self.flights: SingleFlight | None = SingleFlight() if config.coalesce_requests else None
         self._initialize_clients()
 
     def _initialize_clients(self) -> None:
@@ -88,14 +95,32 @@ class ClientSelector:
             client = self.get_client(client_type)
             if client is None:
                 raise ValueError(f"Client '{client_type}' is not available")
-            async with client:
-                return await client.query(query, **kwargs)
-
-        # Auto-select based on query content (simple keyword matching)
-        client_type = self._auto_select_client(query)
-        client = self.get_client(client_type)
-        if client is None:
-            raise ValueError("No appropriate client available for the query")
+        else:
+            # Auto-select based on query content (simple keyword matching)
+            client_type = self._auto_select_client(query)
+            client = self.get_client(client_type)
+            if client is None:
+                raise ValueError("No appropriate client available for the query")
+
+        if self.flights is None:
+            return await self._query_client(client, query, kwargs)
+        result: dict[str, Any] = await self.flights.do(
+            request_key(client_type, query, **kwargs), lambda: self._query_client(client, query, kwargs)
+        )
+        return result
+
+    @staticmethod
+    async def _query_client(client: BaseClient, query: str, kwargs: dict[str, Any]) -> dict[str, Any]:
+        """Query a client within its session.
+
+        Args:
+            client: The client.
+            query: The query string.
+            kwargs: Additional query parameters.
+
+        Returns:
+            Query results.
+        """
         async with client:
             return await client.query(query, **kwargs)
 
@@ -3,7 +3,7 @@
 from enum import Enum
 from typing import Any
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class ModelProvider(str, Enum):
@@ -22,6 +22,13 @@ class ModelConfig(BaseModel):
     base_url: str | None = Field(default=None, description="Base URL for the model API")
     temperature: float = Field(default=0.7, ge=0.0, le=2.0, description="Temperature for sampling")
     max_tokens: int = Field(default=4096, gt=0, description="Maximum tokens in response")
+    embedding_cache_size: int = Field(default=10_000, ge=0, description="Embeddings kept in the in-memory cache (0 disables caching)")
+    embedding_cache_path: str | None = Field(default=None, description="SQLite file for the persistent embedding cache")
+    response_cache_size: int = Field(default=1000, ge=0, description="Responses kept in the in-memory cache (0 disables caching)")
+    response_cache_ttl: float | None = Field(default=3600.0, gt=0, description="Seconds a cached response stays valid")
+    response_cache_path: str | None = Field(default=None, description="SQLite file for the persistent response cache")
+    cache_sampled_responses: bool = Field(default=False, description="Also cache responses generated with non-zero temperature")
+    coalesce_requests: bool = Field(default=True, description="Share one model call among identical concurrent requests")
 
 
 class ClientConfig(BaseModel):
@@ -34,6 +41,7 @@ class ClientConfig(BaseModel):
     maintenance_enabled: bool = Field(default=True, description="Enable maintenance client")
     base_url: str | None = Field(default="http://bigpanda.cern.ch", description="Base URL for PanDA services")
     timeout: int = Field(default=30, gt=0, description="Request timeout in seconds")
+    coalesce_requests: bool = Field(default=True, description="Share one service call among identical concurrent queries")
 
 
 class ExperimentConfig(BaseModel):
@@ -64,3 +72,45 @@ class AgentConfig(BaseModel):
         default="You are a helpful assistant for PanDA workflows.",
         description="System prompt for the agent",
     )
+    vector_store_path: str | None = Field(default=None, description="Directory of a saved vector store to open at startup")
+    max_conversations: int = Field(default=10_000, gt=0, description="Maximum number of conversations kept in memory")
+    conversation_token_budget: int | None = Field(
+        default=None, gt=0, description="Maximum tokens held across all conversations (None for no bound)"
+    )
+    conversation_idle_ttl: float | None = Field(
+        default=3600.0, gt=0, description="Seconds after which an idle conversation is forgotten (None to keep them)"
+    )
+    conversation_store_path: str | None = Field(default=None, description="SQLite file persisting conversations across restarts")
+    memory_max_tokens: int = Field(default=4000, gt=0, description="Token budget of a conversation's messages in the prompt")
+    summary_threshold: int | None = Field(
+        default=None,
+        gt=0,
+        description="Conversation tokens above which older turns are summarized (None disables it); below memory_max_tokens",
+    )
+    summary_keep_recent: int = Field(default=6, ge=0, description="Newest messages kept verbatim when summarizing")
+    long_term_memory: bool = Field(default=False, description="Archive old turns in a vector index and recall relevant ones")
+    recent_window: int = Field(default=8, gt=0, description="Messages kept verbatim in the prompt when long-term memory is on")
+    recall_top_k: int = Field(default=3, gt=0, description="Past turns recalled into the prompt per message")
+    semantic_cache: bool = Field(default=False, description="Answer paraphrased queries from a semantic cache")
+    semantic_cache_threshold: float = Field(
+        default=0.92, gt=0.0, le=1.0, description="Minimum question similarity for a semantic cache hit"
+    )
+    semantic_cache_ttl: float = Field(default=3600.0, gt=0, description="Seconds a cached answer stays valid by default")
+    semantic_cache_ttls: dict[str, float] = Field(
+        default_factory=lambda: {"maintenance": 60.0, "pilots": 300.0, "logs": 300.0, "data": 900.0, "docs": 86400.0},
+        description="Seconds a cached answer stays valid, per client type",
+    )
+
+    @model_validator(mode="after")
+    def _check_summary_threshold(self) -> "AgentConfig":
+        """Check that summarizing starts before the memory budget trims turns.
+
+        Returns:
+            The validated configuration.
+
+        Raises:
+            ValueError: If the summary threshold is not below the memory budget.
+        """
+        if self.summary_threshold is not None and self.summary_threshold >= self.memory_max_tokens:
+            raise ValueError("summary_threshold must be below memory_max_tokens, or turns are trimmed before they are summarized")
+        return self
@@ -1,11 +1,15 @@
 """Model backends for Ask PanDA API."""
 
 from ask_panda.models.base import BaseModel
+from ask_panda.models.cache import CachedModel, EmbeddingCache, ResponseCache
 from ask_panda.models.ollama import OllamaModel
 from ask_panda.models.openai import OpenAIModel
 
 __all__ = [
     "BaseModel",
+    "CachedModel",
+    "EmbeddingCache",
     "OllamaModel",
     "OpenAIModel",
+    "ResponseCache",
 ]
@@ -1,10 +1,12 @@
 """Base model class for language model backends."""
 
+import asyncio
 from abc import ABC, abstractmethod
 from collections.abc import AsyncGenerator
 from typing import Any
 
 from ask_panda.config.schemas import ModelConfig
+from ask_panda.models.tokens import estimate_tokens
 
 
 class BaseModel(ABC):
@@ -18,6 +20,25 @@ class BaseModel(ABC):
         """
         self.config = config
 
+    @property
+    def embedding_model(self) -> str:
+        """Get the name of the model used by :meth:`embed`."""
+        return self.config.model_name
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a text as this model's tokenizer would.
+
+        The default is a tokenizer-free estimate; backends override it when
+        an exact tokenizer is available.
+
+        Args:
+            text: The text.
+
+        Returns:
+            The token count.
+        """
+        return estimate_tokens(text)
+
     @abstractmethod
     async def generate(self, messages: list[dict[str, str]], **kwargs: Any) -> str:
         """Generate a response from the model.
@@ -32,7 +53,7 @@ class BaseModel(ABC):
         ...
 
     @abstractmethod
-    async def generate_stream(self, messages: list[dict[str, str]], **kwargs: Any) -> AsyncGenerator[str, None]:
+    def generate_stream(self, messages: list[dict[str, str]], **kwargs: Any) -> AsyncGenerator[str, None]:
         """Generate a streaming response from the model.
 
         Args:
@@ -55,3 +76,17 @@ class BaseModel(ABC):
             The embedding vector.
         """
         ...
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Generate embeddings for several texts.
+
+        Backends with a native batch endpoint should override this; the
+        default issues one :meth:`embed` call per text concurrently.
+
+        Args:
+            texts: The texts to embed.
+
+        Returns:
+            One embedding vector per text, in input order.
+        """
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
@@ -0,0 +1,653 @@
+"""Caching wrappers for language model backends."""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Callable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from ask_panda.models.base import BaseModel
+from ask_panda.singleflight import SingleFlight
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for use as a cache key.
+
+    Applies Unicode NFC normalization, collapses runs of whitespace and strips
+    the ends, so trivially different copies of a text share one key.
+
+    Args:
+        text: The text to normalize.
+
+    Returns:
+        The normalized text.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an LRU tier and an optional SQLite tier.
+
+    Entries are keyed by the embedding model name and the SHA-256 of the
+    normalized text. Vectors are held as float32 arrays in memory and as raw
+    float32 blobs on disk; disk hits are promoted into the memory tier. The
+    async methods used by :class:`CachedModel` access the disk tier on a
+    worker thread, so the event loop never waits for SQLite.
+    """
+
+    def __init__(self, max_entries: int = 10_000, path: str | Path | None = None) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of vectors kept in memory.
+            path: Optional SQLite file for the persistent tier.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        """Build the cache key for a text.
+
+        Args:
+            model: The embedding model name.
+            text: The text to embed.
+
+        Returns:
+            The cache key.
+        """
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """Insert a vector into the memory tier, evicting the least recently used.
+
+        Args:
+            key: The cache key.
+            vector: The embedding vector.
+        """
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> np.ndarray | None:
+        """Look up a vector.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cached vector or None on a miss.
+        """
+        return self.get_many([key])[key]
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray | None]:
+        """Look up several vectors, reading the disk tier once for all memory misses.
+
+        Args:
+            keys: The cache keys.
+
+        Returns:
+            The cached vector of every key, or None for misses.
+        """
+        found = self._get_memory(keys)
+        return found | self._get_disk([key for key, vector in found.items() if vector is None])
+
+    async def aget_many(self, keys: list[str]) -> dict[str, np.ndarray | None]:
+        """Look up several vectors without blocking the event loop on the disk tier.
+
+        Args:
+            keys: The cache keys.
+
+        Returns:
+            The cached vector of every key, or None for misses.
+        """
+        found = self._get_memory(keys)
+        missing = [key for key, vector in found.items() if vector is None]
+        if missing and self._db is not None:
+            found |= await asyncio.to_thread(self._get_disk, missing)
+        else:
+            self.misses += len(missing)
+        return found
+
+    def _get_memory(self, keys: list[str]) -> dict[str, np.ndarray | None]:
+        """Look up vectors in the memory tier.
+
+        Args:
+            keys: The cache keys.
+
+        Returns:
+            The cached vector of every key, or None if it is not in memory.
+        """
+        found: dict[str, np.ndarray | None] = {}
+        with self._lock:
+            for key in keys:
+                vector = found[key] = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+        return found
+
+    def _get_disk(self, keys: list[str]) -> dict[str, np.ndarray | None]:
+        """Look up vectors in the disk tier, promoting hits into memory.
+
+        Args:
+            keys: The cache keys, all missing from memory.
+
+        Returns:
+            The cached vector of every key, or None on a miss.
+        """
+        found: dict[str, np.ndarray | None] = dict.fromkeys(keys)
+        with self._lock:
+            if self._db is not None:
+                for start in range(0, len(keys), 500):
+                    batch = keys[start:start + 500]
+                    placeholders = ", ".join("?" * len(batch))
+                    rows = self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+                    for key, blob in rows:
+                        vector = found[key] = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+            self.misses += sum(vector is None for vector in found.values())
+        return found
+
+    def put_many(self, items: list[tuple[str, list[float]]]) -> None:
+        """Store several vectors in both tiers.
+
+        Args:
+            items: Pairs of cache key and embedding vector.
+        """
+        self._put_disk(self._put_memory(items))
+
+    async def aput_many(self, items: list[tuple[str, list[float]]]) -> None:
+        """Store several vectors in both tiers, writing the disk tier on a worker thread.
+
+        Args:
+            items: Pairs of cache key and embedding vector.
+        """
+        arrays = self._put_memory(items)
+        if self._db is not None:
+            await asyncio.to_thread(self._put_disk, arrays)
+
+    def _put_memory(self, items: list[tuple[str, list[float]]]) -> list[tuple[str, np.ndarray]]:
+        """Store vectors in the memory tier.
+
+        Args:
+            items: Pairs of cache key and embedding vector.
+
+        Returns:
+            The pairs with the vectors converted to float32 arrays.
+        """
+        arrays = [(key, np.asarray(vector, dtype=np.float32)) for key, vector in items]
+        with self._lock:
+            for key, vector in arrays:
+                self._remember(key, vector)
+        return arrays
+
+    def _put_disk(self, arrays: list[tuple[str, np.ndarray]]) -> None:
+        """Store vectors in the disk tier, if any.
+
+        Args:
+            arrays: Pairs of cache key and float32 vector.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in arrays],
+                )
+                self._db.commit()
+
+    def put(self, key: str, vector: list[float]) -> None:
+        """Store a vector in both tiers.
+
+        Args:
+            key: The cache key.
+            vector: The embedding vector.
+        """
+        self.put_many([(key, vector)])
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache counters.
+
+        Returns:
+            Hit, disk hit, miss and size counters.
+        """
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "size": len(self._memory)}
+
+    def close(self) -> None:
+        """Close the SQLite tier, if any."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class ResponseCache:
+    """Exact-match cache of generated responses with an LRU tier and an optional SQLite tier.
+
+    Entries are keyed by the SHA-256 of a canonical JSON encoding of the
+    model name, the messages, the temperature, the token limit and any other
+    generation parameters, and expire ``ttl`` seconds after they were
+    generated. Disk hits are promoted into the memory tier.
+
+    Sampled responses are not reproducible, so requests with a non-zero
+    temperature bypass the cache unless ``cache_sampled`` is set. Like
+    :class:`EmbeddingCache`, the async methods access the disk tier on a
+    worker thread.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl: float | None = 3600.0,
+        path: str | Path | None = None,
+        cache_sampled: bool = False,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of responses kept in memory.
+            ttl: Seconds a response stays valid; None keeps responses until evicted.
+            path: Optional SQLite file for the persistent tier.
+            cache_sampled: Also cache responses generated with a non-zero temperature.
+            clock: Wall clock returning seconds; shared with the disk tier, so it must survive restarts.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_sampled = cache_sampled
+        self.clock = clock
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            # Expired rows are pruned on every write, which must not scan the table
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_by_created ON responses (created)")
+            self._db.commit()
+
+    @staticmethod
+    def key(model: str, messages: list[dict[str, str]], temperature: float, max_tokens: int, **kwargs: Any) -> str:
+        """Build the cache key for a generation request.
+
+        Args:
+            model: The model name.
+            messages: List of messages in chat format.
+            temperature: The sampling temperature.
+            max_tokens: The response token limit.
+            **kwargs: Any other generation parameters.
+
+        Returns:
+            The cache key.
+        """
+        request = {"model": model, "messages": messages, "temperature": float(temperature), "max_tokens": max_tokens, **kwargs}
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def cacheable(self, temperature: float) -> bool:
+        """Check whether a request with this temperature may be served from the cache.
+
+        Args:
+            temperature: The sampling temperature.
+
+        Returns:
+            True unless sampling is on and sampled responses are not cached.
+        """
+        return temperature == 0 or self.cache_sampled
+
+    def _expired(self, created: float) -> bool:
+        """Check whether an entry has outlived the TTL.
+
+        Args:
+            created: When the entry was generated.
+
+        Returns:
+            True if the entry must not be served.
+        """
+        return self.ttl is not None and self.clock() - created > self.ttl
+
+    def _remember(self, key: str, entry: tuple[str, float]) -> None:
+        """Insert a response into the memory tier, evicting the least recently used.
+
+        Args:
+            key: The cache key.
+            entry: The response and its creation time.
+        """
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> str | None:
+        """Look up a response.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cached response or None on a miss.
+        """
+        response = self._get_memory(key)
+        return response if response is not None else self._get_disk(key)
+
+    async def aget(self, key: str) -> str | None:
+        """Look up a response without blocking the event loop on the disk tier.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cached response or None on a miss.
+        """
+        response = self._get_memory(key)
+        if response is not None:
+            return response
+        if self._db is None:
+            self.misses += 1
+            return None
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def _get_memory(self, key: str) -> str | None:
+        """Look up a response in the memory tier.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cached response, or None if it is not in memory or has expired.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[1]):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _get_disk(self, key: str) -> str | None:
+        """Look up a response in the disk tier, promoting a hit into memory.
+
+        Args:
+            key: The cache key, missing from memory.
+
+        Returns:
+            The cached response or None on a miss.
+        """
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    response: str = row[0]
+                    self._remember(key, (response, row[1]))
+                    self.disk_hits += 1
+                    return response
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response in both tiers.
+
+        Args:
+            key: The cache key.
+            response: The generated response.
+        """
+        self._put_disk(key, self._put_memory(key, response))
+
+    async def aput(self, key: str, response: str) -> None:
+        """Store a response in both tiers, writing the disk tier on a worker thread.
+
+        Args:
+            key: The cache key.
+            response: The generated response.
+        """
+        entry = self._put_memory(key, response)
+        if self._db is not None:
+            await asyncio.to_thread(self._put_disk, key, entry)
+
+    def _put_memory(self, key: str, response: str) -> tuple[str, float]:
+        """Store a response in the memory tier.
+
+        Args:
+            key: The cache key.
+            response: The generated response.
+
+        Returns:
+            The response and its creation time.
+        """
+        entry = (response, self.clock())
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def _put_disk(self, key: str, entry: tuple[str, float]) -> None:
+        """Store a response in the disk tier, if any, and prune expired responses.
+
+        Args:
+            key: The cache key.
+            entry: The response and its creation time.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)", (key, *entry))
+                if self.ttl is not None:
+                    self._db.execute("DELETE FROM responses WHERE created < ?", (entry[1] - self.ttl,))
+                self._db.commit()
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache counters.
+
+        Returns:
+            Hit, disk hit, miss, bypass and size counters.
+        """
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "size": len(self._memory),
+        }
+
+    def close(self) -> None:
+        """Close the SQLite tier, if any."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class CachedModel(BaseModel):
+    """Model wrapper that serves repeated embeddings from an :class:`EmbeddingCache`.
+
+    With a :class:`ResponseCache`, repeated generation requests are also
+    answered from the cache. With ``coalesce``, identical generation requests
+    that arrive while one is already running share its result instead of
+    calling the wrapped model again. Otherwise generation calls are passed
+    through to the wrapped model unchanged.
+    """
+
+    def __init__(
+        self,
+        model: BaseModel,
+        embedding_cache: EmbeddingCache | None = None,
+        response_cache: ResponseCache | None = None,
+        coalesce: bool = False,
+    ) -> None:
+        """Initialize the wrapper.
+
+        Args:
+            model: The model to wrap.
+            embedding_cache: Cache for embeddings; a default in-memory cache if omitted.
+            response_cache: Optional cache for generated responses.
+            coalesce: Share one upstream call among identical concurrent generation requests.
+        """
+        super().__init__(model.config)
+        self.model = model
+        self.embedding_cache = embedding_cache or EmbeddingCache()
+        self.response_cache = response_cache
+        self.flights: SingleFlight | None = SingleFlight() if coalesce else None
+
+    @property
+    def embedding_model(self) -> str:
+        """Get the name of the wrapped model's embedding model."""
+        return self.model.embedding_model
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the wrapped model's tokenizer.
+
+        Args:
+            text: The text.
+
+        Returns:
+            The token count.
+        """
+        return self.model.count_tokens(text)
+
+    def _request_key(self, messages: list[dict[str, str]], kwargs: dict[str, Any]) -> tuple[str, float]:
+        """Build the canonical key of a generation request.
+
+        Args:
+            messages: List of messages in chat format.
+            kwargs: Additional generation parameters.
+
+        Returns:
+            The key and the effective temperature.
+        """
+        options = dict(kwargs)
+        temperature = options.pop("temperature", self.config.temperature)
+        max_tokens = options.pop("max_tokens", self.config.max_tokens)
+        return ResponseCache.key(self.config.model_name, messages, temperature, max_tokens, **options), temperature
+
+    def _response_key(self, key: str, temperature: float) -> str | None:
+        """Decide whether a request may use the response cache.
+
+        Args:
+            key: The request key.
+            temperature: The effective temperature.
+
+        Returns:
+            The cache key, or None if the request bypasses the cache.
+        """
+        if self.response_cache is None:
+            return None
+        if not self.response_cache.cacheable(temperature):
+            self.response_cache.bypasses += 1
+            return None
+        return key
+
+    async def generate(self, messages: list[dict[str, str]], **kwargs: Any) -> str:
+        """Generate a response with the wrapped model, consulting the response cache first.
+
+        Args:
+            messages: List of messages in chat format.
+            **kwargs: Additional generation parameters.
+
+        Returns:
+            The generated response text.
+        """
+        if self.response_cache is None and self.flights is None:
+            return await self.model.generate(messages, **kwargs)
+        request_key, temperature = self._request_key(messages, kwargs)
+        key = self._response_key(request_key, temperature)
+        if key is not None and self.response_cache is not None:
+            cached = await self.response_cache.aget(key)
+            if cached is not None:
+                return cached
+        if self.flights is None:
+            response = await self.model.generate(messages, **kwargs)
+        else:
+            response = await self.flights.do(request_key, lambda: self.model.generate(messages, **kwargs))
+        if key is not None and self.response_cache is not None:
+            await self.response_cache.aput(key, response)
+        return response
+
+    async def generate_stream(self, messages: list[dict[str, str]], **kwargs: Any) -> AsyncGenerator[str, None]:
+        """Generate a streaming response with the wrapped model, consulting the response cache first.
+
+        A cached response is yielded as one chunk. A fresh response is cached
+        once the stream has been consumed completely. Streams are never
+        coalesced.
+
+        Args:
+            messages: List of messages in chat format.
+            **kwargs: Additional generation parameters.
+
+        Yields:
+            Chunks of the generated response text.
+        """
+        key = self._response_key(*self._request_key(messages, kwargs)) if self.response_cache is not None else None
+        cached = await self.response_cache.aget(key) if key is not None and self.response_cache is not None else None
+        if cached is not None:
+            yield cached
+            return
+        chunks = []
+        async for chunk in self.model.generate_stream(messages, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if key is not None and self.response_cache is not None:
+            await self.response_cache.aput(key, "".join(chunks))
+
+    async def embed(self, text: str) -> list[float]:
+        """Generate embeddings, consulting the cache first.
+
+        Args:
+            text: The text to embed.
+
+        Returns:
+            The embedding vector.
+        """
+        return (await self.embed_batch([text]))[0]
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Generate embeddings for several texts, embedding only cache misses.
+
+        Misses are sent to the wrapped model in one batch; duplicate texts
+        within the batch are embedded once.
+
+        Args:
+            texts: The texts to embed.
+
+        Returns:
+            One embedding vector per text, in input order.
+        """
+        keys = [EmbeddingCache.key(self.embedding_model, text) for text in texts]
+        cached = await self.embedding_cache.aget_many(list(dict.fromkeys(keys)))
+        vectors = {key: vector.tolist() for key, vector in cached.items() if vector is not None}
+        missing = {key: text for key, text in zip(keys, texts, strict=True) if cached[key] is None}
+        if missing:
+            embedded = await self.model.embed_batch(list(missing.values()))
+            fresh = list(zip(missing, embedded, strict=True))
+            await self.embedding_cache.aput_many(fresh)
+            vectors.update(fresh)
+        return [vectors[key] for key in keys]
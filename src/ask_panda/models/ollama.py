@@ -78,3 +78,18 @@ class OllamaModel(BaseModel):
             prompt=text,
         )
         return response["embedding"]
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Generate embeddings for several texts in one Ollama request.
+
+        Args:
+            texts: The texts to embed.
+
+        Returns:
+            One embedding vector per text, in input order.
+        """
+        response = await self._client.embed(
+            model=self.config.model_name,
+            input=texts,
+        )
+        return [list(embedding) for embedding in response["embeddings"]]
@@ -7,11 +7,14 @@ from openai import AsyncOpenAI
 
 from ask_panda.config.schemas import ModelConfig
 from ask_panda.models.base import BaseModel
+from ask_panda.models.tokens import estimate_tokens, tiktoken_counter
 
 
 class OpenAIModel(BaseModel):
     """OpenAI model backend."""
 
+    EMBEDDING_MODEL = "text-embedding-ada-002"
+
     def __init__(self, config: ModelConfig) -> None:
         """Initialize the OpenAI model.
 
@@ -23,6 +26,23 @@ class OpenAIModel(BaseModel):
             api_key=config.api_key,
             base_url=config.base_url,
         )
+        self._count_tokens = tiktoken_counter(config.model_name) or estimate_tokens
+
+    @property
+    def embedding_model(self) -> str:
+        """Get the name of the OpenAI embedding model."""
+        return self.EMBEDDING_MODEL
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with tiktoken when installed, otherwise estimate them.
+
+        Args:
+            text: The text.
+
+        Returns:
+            The token count.
+        """
+        return self._count_tokens(text)
 
     async def generate(self, messages: list[dict[str, str]], **kwargs: Any) -> str:
         """Generate a response from OpenAI.
@@ -74,7 +94,22 @@ class OpenAIModel(BaseModel):
             The embedding vector.
         """
         response = await self._client.embeddings.create(
-            model="text-embedding-ada-002",
+            model=self.EMBEDDING_MODEL,
             input=text,
         )
         return response.data[0].embedding
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Generate embeddings for several texts in one OpenAI request.
+
+        Args:
+            texts: The texts to embed.
+
+        Returns:
+            One embedding vector per text, in input order.
+        """
+        response = await self._client.embeddings.create(
+            model=self.EMBEDDING_MODEL,
+            input=texts,
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
@@ -0,0 +1,50 @@
+"""Token counting for context window budgets."""
+
+import re
+from collections.abc import Callable
+
+TokenCounter = Callable[[str], int]
+
+# Tokens added per chat message for the role and separators (OpenAI chat format).
+MESSAGE_OVERHEAD = 4
+
+_WORD = re.compile(r"\w+")
+_SYMBOL = re.compile(r"[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of BPE tokens in a text without a tokenizer.
+
+    Every word run counts one token per four characters, rounded up, and
+    every punctuation character counts one. This slightly over-counts prose,
+    so budgets built on it err on the safe side.
+
+    Args:
+        text: The text.
+
+    Returns:
+        The estimated token count.
+    """
+    return sum((len(word) + 3) // 4 for word in _WORD.findall(text)) + len(_SYMBOL.findall(text))
+
+
+def tiktoken_counter(model_name: str) -> TokenCounter | None:
+    """Build an exact token counter for an OpenAI model.
+
+    Requires the optional ``tiktoken`` package (``pip install ask-panda-api[tokenizer]``).
+
+    Args:
+        model_name: The OpenAI model name.
+
+    Returns:
+        The token counter, or None if tiktoken is not installed or does not know the model.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        encoding = tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return None
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
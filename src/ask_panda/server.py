@@ -1,10 +1,16 @@
 """Main server module for running the Ask PanDA agent."""
 
 import argparse
+import asyncio
+import logging
 import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from typing import Any
 
 import uvicorn
+from fastapi import FastAPI
+from openai import OpenAIError
 
 from ask_panda.api.app import create_app
 from ask_panda.clients.selection import ClientSelector
@@ -17,8 +23,17 @@ from ask_panda.config.schemas import (
     ServerConfig,
 )
 from ask_panda.experiments import AtlasExperiment, EpicExperiment, VeraRubinExperiment
-from ask_panda.models import BaseModel, OllamaModel, OpenAIModel
-from ask_panda.tools import ContextMemory, VectorStore
+from ask_panda.models import BaseModel, CachedModel, EmbeddingCache, OllamaModel, OpenAIModel, ResponseCache
+from ask_panda.tools import (
+    ContextMemory,
+    ConversationRegistry,
+    ConversationStore,
+    LongTermMemory,
+    SemanticCache,
+    VectorStore,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class Agent:
@@ -33,26 +48,144 @@ class Agent:
         self.config = config
         self.model = self._create_model()
         self.client_selector = ClientSelector(config.clients)
-        self.memory = ContextMemory()
-        self.vector_store = VectorStore()
-
-        # Add system prompt to memory
-        self.memory.add_system_message(config.system_prompt)
+        self.vector_store = VectorStore.open(config.vector_store_path) if config.vector_store_path else VectorStore()
+        self.answer_cache = (
+            SemanticCache(
+                self.model,
+                threshold=config.semantic_cache_threshold,
+                ttl=config.semantic_cache_ttl,
+                ttls=config.semantic_cache_ttls,
+            )
+            if config.semantic_cache
+            else None
+        )
+
+        # One memory per conversation id; calls without one get a fresh memory each
+        self.conversation_store = ConversationStore(config.conversation_store_path) if config.conversation_store_path else None
+        self._background: set[asyncio.Task[Any]] = set()
+        self.conversations = ConversationRegistry(
+            self._create_memory,
+            max_conversations=config.max_conversations,
+            max_total_tokens=config.conversation_token_budget,
+            idle_ttl=config.conversation_idle_ttl,
+        )
 
     def _create_model(self) -> BaseModel:
         """Create the language model based on configuration.
 
         Returns:
-            The configured language model.
+            The configured language model, wrapped in embedding and response caches and request
+            coalescing unless all are disabled.
+        """
+        model_config = self.config.model
+        model: BaseModel = OllamaModel(model_config) if model_config.provider == ModelProvider.OLLAMA else OpenAIModel(model_config)
+        if not (model_config.embedding_cache_size or model_config.response_cache_size or model_config.coalesce_requests):
+            return model
+        response_cache = None
+        if model_config.response_cache_size:
+            response_cache = ResponseCache(
+                model_config.response_cache_size,
+                model_config.response_cache_ttl,
+                model_config.response_cache_path,
+                cache_sampled=model_config.cache_sampled_responses,
+            )
+        return CachedModel(
+            model,
+            EmbeddingCache(model_config.embedding_cache_size, model_config.embedding_cache_path),
+            response_cache,
+            coalesce=model_config.coalesce_requests,
+        )
+
+    def _create_memory(self, conversation_id: str | None = None) -> ContextMemory:
+        """Create a conversation memory holding the system prompt.
+
+        With a conversation store, the memory of a conversation is loaded from
+        and persisted to it.
+
+        Args:
+            conversation_id: The conversation id, or None for an unpersisted memory.
+
+        Returns:
+            The new memory.
+        """
+        # With long-term memory the in-memory messages are only the recent window
+        long_term = None
+        window: dict[str, Any] = {}
+        if self.config.long_term_memory:
+            long_term = LongTermMemory(self.model, top_k=self.config.recall_top_k)
+            window["max_messages"] = self.config.recent_window
+        memory = ContextMemory(
+            **window,
+            max_tokens=self.config.memory_max_tokens,
+            token_counter=self.model.count_tokens,
+            summary_threshold=self.config.summary_threshold,
+            keep_recent=self.config.summary_keep_recent,
+            long_term=long_term,
+        )
+        memory.add_system_message(self.config.system_prompt)
+        if conversation_id is not None and self.conversation_store is not None:
+            memory.attach(self.conversation_store, conversation_id)
+        return memory
+
+    @asynccontextmanager
+    async def _conversation(self, conversation_id: str | None) -> AsyncIterator[ContextMemory]:
+        """Lock a conversation for one turn.
+
+        Calls without a conversation id share no history and need no lock, so
+        they run concurrently and identical ones can be coalesced.
+
+        Args:
+            conversation_id: The conversation id, or None for a fresh memory holding only the system prompt.
+
+        Yields:
+            The conversation memory.
         """
-        if self.config.model.provider == ModelProvider.OLLAMA:
-            return OllamaModel(self.config.model)
-        return OpenAIModel(self.config.model)
+        if conversation_id is None:
+            yield self._create_memory()
+        else:
+            async with self.conversations.session(conversation_id) as memory:
+                yield memory
 
-    async def query(self, query: str, **kwargs: Any) -> dict[str, Any]:
+    async def query(self, query: str, conversation_id: str | None = None, **kwargs: Any) -> dict[str, Any]:
         """Process a query.
 
+        With a semantic cache, calls without a conversation id and the opening
+        turn of a conversation are answered from and added to the cache; later
+        turns depend on the conversation's history and bypass it, so answers
+        are never shared across histories.
+
+        Args:
+            query: The user query.
+            conversation_id: Optional conversation id; without one the call has no conversation history.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Query response. Answers served from the semantic cache have ``cached`` set.
+        """
+        experiment = self.config.experiment.name
+        client_type = kwargs.get("client_type") or self.client_selector.select_client_type(query)
+        async with self._conversation(conversation_id) as memory:
+            # Only answers given without conversation history can be shared
+            answer_cache = self.answer_cache if memory.turn_count == 0 else None
+            embedding: list[float] = []
+            if answer_cache is not None:
+                embedding = await answer_cache.embed(query)
+                cached = answer_cache.get(embedding, experiment, client_type)
+                if cached is not None:
+                    memory.add_user_message(query)
+                    memory.add_assistant_message(cached["response"])
+                    return {"query": query, **cached, "experiment": experiment, "cached": True}
+            result = await self._query(memory, query, **kwargs)
+            self._schedule_compaction(memory)
+        if answer_cache is not None:
+            answer_cache.put(embedding, experiment, client_type, {"response": result["response"], "client_data": result["client_data"]})
+        return result
+
+    async def _query(self, memory: ContextMemory, query: str, **kwargs: Any) -> dict[str, Any]:
+        """Process a query within a locked conversation.
+
         Args:
+            memory: The conversation memory.
             query: The user query.
             **kwargs: Additional parameters.
 
@@ -60,20 +193,20 @@ class Agent:
             Query response.
         """
         # Add user message to memory
-        self.memory.add_user_message(query)
+        memory.add_user_message(query)
 
         # Route to appropriate client
         client_type = kwargs.get("client_type")
         client_result = await self.client_selector.route_query(query, client_type)
 
         # Generate response using the model
-        messages = self.memory.to_chat_format()
+        messages = await memory.recall_chat_format(query)
         messages.append({"role": "user", "content": f"Based on this data: {client_result}\n\nAnswer: {query}"})
 
         response = await self.model.generate(messages)
 
         # Add assistant response to memory
-        self.memory.add_assistant_message(response)
+        memory.add_assistant_message(response)
 
         return {
             "query": query,
@@ -82,20 +215,50 @@ class Agent:
             "experiment": self.config.experiment.name,
         }
 
-    async def chat(self, message: str) -> str:
+    async def chat(self, message: str, conversation_id: str | None = None) -> str:
         """Process a chat message.
 
         Args:
             message: The user message.
+            conversation_id: Optional conversation id; without one the call has no conversation history.
 
         Returns:
             Assistant response.
         """
-        self.memory.add_user_message(message)
-        messages = self.memory.to_chat_format()
-        response = await self.model.generate(messages)
-        self.memory.add_assistant_message(response)
-        return response
+        async with self._conversation(conversation_id) as memory:
+            memory.add_user_message(message)
+            response = await self.model.generate(await memory.recall_chat_format(message))
+            memory.add_assistant_message(response)
+            self._schedule_compaction(memory)
+            return response
+
+    def _schedule_compaction(self, memory: ContextMemory) -> None:
+        """Summarize older turns in the background if the memory has grown past its threshold.
+
+        Args:
+            memory: The conversation memory.
+        """
+        if memory.needs_compaction:
+            task = asyncio.create_task(memory.compact(self.model))
+            self._background.add(task)
+            task.add_done_callback(self._compaction_done)
+
+    def _compaction_done(self, task: "asyncio.Task[Any]") -> None:
+        """Forget a finished background summary; a failed one leaves the memory unchanged.
+
+        Args:
+            task: The finished task.
+        """
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Summarizing conversation failed", exc_info=task.exception())
+
+    def close(self) -> None:
+        """Cancel background summaries, write buffered conversation messages and release the conversation store."""
+        for task in self._background:
+            task.cancel()
+        if self.conversation_store is not None:
+            self.conversation_store.close()
 
 
 def get_experiment_config(experiment_name: str) -> AgentConfig:
@@ -124,13 +287,16 @@ def get_experiment_config(experiment_name: str) -> AgentConfig:
     return experiment.config
 
 
-def create_agent_from_env() -> Agent:
+def create_agent_from_env(experiment: str | None = None) -> Agent:
     """Create an agent from environment variables.
 
+    Args:
+        experiment: Experiment name, overriding the ``EXPERIMENT`` variable.
+
     Returns:
         Configured agent.
     """
-    experiment = os.getenv("EXPERIMENT", "atlas")
+    name = experiment or os.getenv("EXPERIMENT") or "atlas"
     model_provider = os.getenv("MODEL_PROVIDER", "openai")
     model_name = os.getenv("MODEL_NAME", "gpt-4")
     api_key = os.getenv("OPENAI_API_KEY") or os.getenv("API_KEY")
@@ -142,14 +308,38 @@ def create_agent_from_env() -> Agent:
             model_name=model_name,
             api_key=api_key,
             base_url=base_url,
+            embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH"),
+            response_cache_path=os.getenv("RESPONSE_CACHE_PATH"),
         ),
         clients=ClientConfig(),
-        experiment=ExperimentConfig(name=experiment, description=f"{experiment} experiment"),
+        experiment=ExperimentConfig(name=name, description=f"{name} experiment"),
+        vector_store_path=os.getenv("VECTOR_STORE_PATH"),
     )
 
     return Agent(config)
 
 
+def create_app_from_env(server_config: ServerConfig, experiment: str | None = None) -> FastAPI:
+    """Create the API application with an agent configured from environment variables.
+
+    Without model credentials no agent can be built; the application then
+    serves placeholder answers, as it does without an agent.
+
+    Args:
+        server_config: Server configuration.
+        experiment: Experiment name, overriding the ``EXPERIMENT`` variable.
+
+    Returns:
+        The application, which closes its agent when it shuts down.
+    """
+    try:
+        agent = create_agent_from_env(experiment)
+    except OpenAIError as error:
+        logger.warning("No agent could be built, serving placeholder answers: %s", error)
+        return create_app(server_config)
+    return create_app(server_config, agent)
+
+
 def main() -> None:
     """Main entry point for running the server."""
     parser = argparse.ArgumentParser(description="Ask PanDA API Server")
@@ -188,7 +378,7 @@ def main() -> None:
     print(f"Debug: {args.debug}")
 
     server_config = ServerConfig(host=args.host, port=args.port, debug=args.debug)
-    app = create_app(server_config)
+    app = create_app_from_env(server_config, args.experiment)
 
     uvicorn.run(app, host=args.host, port=args.port)
 
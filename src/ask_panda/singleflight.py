@@ -0,0 +1,97 @@
+"""Coalescing of identical concurrent calls."""
+
+import asyncio
+import hashlib
+import json
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+def request_key(*parts: Any, **options: Any) -> str:
+    """Build a canonical key for a request.
+
+    Args:
+        *parts: Positional request parts, such as a client type and a query.
+        **options: Request options; their order does not matter.
+
+    Returns:
+        The SHA-256 of the canonical JSON encoding of the request.
+    """
+    canonical = json.dumps([parts, options], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """An in-flight call and the number of callers awaiting it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[Any]") -> None:
+        """Initialize the flight.
+
+        Args:
+            task: The task running the call.
+        """
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome.
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it runs await the same task. Everyone gets the result, or the same
+    exception. A caller that is cancelled stops waiting without disturbing
+    the others, and the call itself is cancelled once no caller waits for it
+    any more. Nothing is kept after a call finishes, so later callers start
+    a fresh call.
+    """
+
+    def __init__(self) -> None:
+        """Initialize with no calls in flight."""
+        self.calls = 0
+        self.coalesced = 0
+        self._flights: dict[Hashable, _Flight] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a call, or join the identical call already in flight.
+
+        Args:
+            key: Identifies identical calls.
+            func: Starts the call; only invoked if no call with the key is in flight.
+
+        Returns:
+            The result of the call.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                # Later callers must start afresh rather than join the cancelled call
+                self._land(key, flight)
+
+    def _land(self, key: Hashable, flight: _Flight) -> None:
+        """Forget a finished call.
+
+        Args:
+            key: The call's key.
+            flight: The finished flight.
+        """
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    @property
+    def in_flight(self) -> int:
+        """Get the number of calls currently running."""
+        return len(self._flights)
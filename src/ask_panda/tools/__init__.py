@@ -1,9 +1,38 @@
 """Tools for Ask PanDA API."""
 
+from ask_panda.tools.ann_index import IVFIndex, VectorIndex
+from ask_panda.tools.chunking import Chunk, chunk_file, chunk_files
 from ask_panda.tools.context_memory import ContextMemory
+from ask_panda.tools.conversation_store import ConversationStore
+from ask_panda.tools.conversations import ConversationRegistry
+from ask_panda.tools.dedup import SimHashDeduplicator
+from ask_panda.tools.ingestion import IngestionStats, ingest_documents, ingest_files
+from ask_panda.tools.lexical_index import LexicalIndex
+from ask_panda.tools.long_term_memory import LongTermMemory
+from ask_panda.tools.quantization import ProductQuantizer, Quantizer, ScalarQuantizer
+from ask_panda.tools.semantic_cache import SemanticCache
+from ask_panda.tools.sharded_store import ShardedVectorStore
 from ask_panda.tools.vector_store import VectorStore
 
 __all__ = [
+    "Chunk",
     "ContextMemory",
+    "ConversationRegistry",
+    "ConversationStore",
+    "IVFIndex",
+    "IngestionStats",
+    "LexicalIndex",
+    "LongTermMemory",
+    "ProductQuantizer",
+    "Quantizer",
+    "ScalarQuantizer",
+    "SemanticCache",
+    "ShardedVectorStore",
+    "SimHashDeduplicator",
+    "VectorIndex",
     "VectorStore",
+    "chunk_file",
+    "chunk_files",
+    "ingest_documents",
+    "ingest_files",
 ]
@@ -0,0 +1,283 @@
+"""Approximate nearest-neighbour indexes for the vector store."""
+
+from abc import ABC, abstractmethod
+from typing import Any
+
+import numpy as np
+
+
+def select_top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Select the positions of the ``top_k`` highest scores.
+
+    Args:
+        scores: 1-D array of scores.
+        top_k: Number of positions to select.
+
+    Returns:
+        Positions sorted by descending score, ties broken by ascending position.
+    """
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k] if top_k < len(scores) else np.arange(len(scores))
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def assign_clusters(centroids: np.ndarray, vectors: np.ndarray, spherical: bool = True, batch_size: int = 65_536) -> np.ndarray:
+    """Assign each vector to its nearest centroid.
+
+    Args:
+        centroids: The ``(k, dim)`` centroids.
+        vectors: The ``(n, dim)`` vectors.
+        spherical: Use cosine similarity (normalized inputs) instead of Euclidean distance.
+        batch_size: Rows scored per batch, bounding temporary memory.
+
+    Returns:
+        The centroid index of each vector.
+    """
+    # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2), so both cases are one matrix product.
+    bias = np.zeros(len(centroids), dtype=np.float32) if spherical else -0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        assignment[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T + bias, axis=1)
+    return assignment
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator, spherical: bool = True) -> np.ndarray:
+    """Run Lloyd's k-means.
+
+    Args:
+        vectors: The ``(n, dim)`` float32 training vectors.
+        k: Number of centroids; capped at ``n``.
+        iterations: Number of iterations.
+        rng: Random generator used for initialization and reseeding empty clusters.
+        spherical: Keep centroids on the unit sphere (cosine k-means).
+
+    Returns:
+        The ``(k, dim)`` centroids.
+    """
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign_clusters(centroids, vectors, spherical)
+        order = np.argsort(assignment, kind="stable")
+        clusters, starts = np.unique(assignment[order], return_index=True)
+        counts = np.diff(np.append(starts, len(vectors)))
+        # Clusters that lost all their members are reseeded with random vectors.
+        centroids = vectors[rng.choice(len(vectors), k)].copy()
+        centroids[clusters] = np.add.reduceat(vectors[order], starts, axis=0) / counts[:, None]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            np.divide(centroids, norms, out=centroids, where=norms > 0)
+    return centroids.astype(np.float32)
+
+
+class VectorIndex(ABC):
+    """Base class for search indexes over a vector store's embedding matrix.
+
+    Indexes only hold row ids and their own routing structures; candidate
+    vectors are always read from the matrix passed in by the store. Stores
+    with fewer than ``min_train_size`` rows are not indexed.
+    """
+
+    min_train_size = 0
+
+    @property
+    @abstractmethod
+    def is_built(self) -> bool:
+        """Whether the index is ready to answer queries."""
+        ...
+
+    @abstractmethod
+    def build(self, vectors: np.ndarray) -> None:
+        """Build the index from scratch.
+
+        Args:
+            vectors: The full ``(count, dim)`` normalized embedding matrix.
+        """
+        ...
+
+    @abstractmethod
+    def add(self, start: int, vectors: np.ndarray) -> None:
+        """Insert newly appended rows into a built index.
+
+        Args:
+            start: Row id of the first vector.
+            vectors: The ``(n, dim)`` normalized vectors.
+        """
+        ...
+
+    @abstractmethod
+    def candidates(self, query: np.ndarray, **kwargs: Any) -> np.ndarray:
+        """Get the row ids worth scoring for a query.
+
+        Args:
+            query: The normalized query vector.
+            **kwargs: Index-specific search parameters.
+
+        Returns:
+            Candidate row ids.
+        """
+        ...
+
+    def remap(self, mapping: np.ndarray, vectors: np.ndarray) -> None:
+        """Renumber indexed rows after the store compacts its matrix.
+
+        The default rebuilds the index from the compacted matrix; indexes
+        that can renumber their entries in place should override this.
+
+        Args:
+            mapping: New row id for every old row id, or -1 for dropped rows.
+            vectors: The compacted ``(count, dim)`` embedding matrix.
+        """
+        if self.is_built:
+            self.build(vectors)
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Drop all indexed data."""
+        ...
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index with spherical k-means centroids.
+
+    Each row is assigned to its nearest centroid. A query scores the
+    centroids, probes the ``nprobe`` closest inverted lists and scores only
+    the rows found there. Raising ``nprobe`` trades latency for recall.
+    """
+
+    def __init__(
+        self,
+        nlist: int = 256,
+        nprobe: int = 8,
+        min_train_size: int = 10_000,
+        kmeans_iterations: int = 20,
+        max_train_samples: int = 100_000,
+        seed: int = 0,
+    ) -> None:
+        """Initialize the IVF index.
+
+        Args:
+            nlist: Number of k-means centroids (inverted lists).
+            nprobe: Default number of lists probed per query.
+            min_train_size: Stores smaller than this are not indexed and use exact search.
+            kmeans_iterations: Number of k-means iterations during build.
+            max_train_samples: Maximum number of rows sampled to train the centroids.
+            seed: Seed for centroid initialization and sampling.
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iterations = kmeans_iterations
+        self.max_train_samples = max_train_samples
+        self.seed = seed
+        self._centroids: np.ndarray | None = None
+        self._lists: list[np.ndarray] = []
+        self._sizes = np.zeros(0, dtype=np.int64)
+
+    @property
+    def is_built(self) -> bool:
+        """Whether the centroids have been trained."""
+        return self._centroids is not None
+
+    def build(self, vectors: np.ndarray) -> None:
+        """Train the centroids and assign every row to a list.
+
+        Does nothing if there are fewer than ``min_train_size`` rows.
+
+        Args:
+            vectors: The full ``(count, dim)`` normalized embedding matrix.
+        """
+        self.reset()
+        if len(vectors) < max(self.min_train_size, 1):
+            return
+        self._centroids = self._train(vectors)
+        nlist = len(self._centroids)
+        self._lists = [np.zeros(0, dtype=np.int64) for _ in range(nlist)]
+        self._sizes = np.zeros(nlist, dtype=np.int64)
+        self.add(0, vectors)
+
+    def _train(self, vectors: np.ndarray) -> np.ndarray:
+        """Run spherical k-means on a sample of the rows.
+
+        Args:
+            vectors: The normalized embedding matrix.
+
+        Returns:
+            The ``(nlist, dim)`` normalized centroids.
+        """
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), self.max_train_samples)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+        return kmeans(sample, self.nlist, self.kmeans_iterations, rng)
+
+    def add(self, start: int, vectors: np.ndarray) -> None:
+        """Append rows to the inverted lists of their nearest centroids.
+
+        Args:
+            start: Row id of the first vector.
+            vectors: The ``(n, dim)`` normalized vectors.
+
+        Raises:
+            RuntimeError: If the index has not been built.
+        """
+        if self._centroids is None:
+            raise RuntimeError("IVF index is not built")
+        assignment = assign_clusters(self._centroids, vectors)
+        ids = np.arange(start, start + len(vectors), dtype=np.int64)
+        order = np.argsort(assignment, kind="stable")
+        lists, split = np.unique(assignment[order], return_index=True)
+        for cluster, members in zip(lists, np.split(ids[order], split[1:]), strict=True):
+            self._append(int(cluster), members)
+
+    def _append(self, cluster: int, ids: np.ndarray) -> None:
+        """Append ids to one inverted list, growing it geometrically.
+
+        Args:
+            cluster: The list index.
+            ids: Row ids to append.
+        """
+        size = self._sizes[cluster]
+        needed = size + len(ids)
+        if needed > len(self._lists[cluster]):
+            grown = np.zeros(max(needed, 2 * len(self._lists[cluster]), 16), dtype=np.int64)
+            grown[:size] = self._lists[cluster][:size]
+            self._lists[cluster] = grown
+        self._lists[cluster][size:needed] = ids
+        self._sizes[cluster] = needed
+
+    def candidates(self, query: np.ndarray, nprobe: int | None = None, **kwargs: Any) -> np.ndarray:
+        """Get the row ids in the inverted lists closest to the query.
+
+        Args:
+            query: The normalized query vector.
+            nprobe: Number of lists to probe; defaults to the index setting.
+            **kwargs: Ignored search parameters meant for other indexes.
+
+        Returns:
+            Candidate row ids.
+
+        Raises:
+            RuntimeError: If the index has not been built.
+        """
+        if self._centroids is None:
+            raise RuntimeError("IVF index is not built")
+        probe = select_top_k(self._centroids @ query, min(nprobe or self.nprobe, len(self._centroids)))
+        return np.concatenate([self._lists[c][:self._sizes[c]] for c in probe])
+
+    def remap(self, mapping: np.ndarray, vectors: np.ndarray) -> None:
+        """Renumber the inverted lists in place, keeping the trained centroids.
+
+        Args:
+            mapping: New row id for every old row id, or -1 for dropped rows.
+            vectors: The compacted embedding matrix (unused).
+        """
+        for cluster, ids in enumerate(self._lists):
+            renumbered = mapping[ids[:self._sizes[cluster]]]
+            self._lists[cluster] = renumbered[renumbered >= 0]
+            self._sizes[cluster] = len(self._lists[cluster])
+
+    def reset(self) -> None:
+        """Drop the centroids and inverted lists."""
+        self._centroids = None
+        self._lists = []
+        self._sizes = np.zeros(0, dtype=np.int64)
@@ -0,0 +1,280 @@
+"""Streaming chunker for markdown, HTML and plain text sources."""
+
+import os
+import re
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Literal
+
+ChunkFormat = Literal["markdown", "html", "text"]
+
+# A block is (heading level, text); level 0 is body text.
+Block = tuple[int, str]
+
+FORMATS: dict[str, ChunkFormat] = {
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".html": "html",
+    ".htm": "html",
+    ".txt": "text",
+}
+
+_TOKEN = re.compile(r"\S+\s*")
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_HTML_HEADINGS = {f"h{level}": level for level in range(1, 7)}
+_HTML_SKIPPED = {"script", "style", "head", "nav"}
+_HTML_BREAKS = {"p", "div", "br", "li", "tr", "pre", "table", "ul", "ol", "section", "article", "blockquote"}
+
+
+@dataclass
+class Chunk:
+    """A piece of a source document ready to be embedded."""
+
+    text: str
+    metadata: dict[str, Any] = field(default_factory=dict)
+
+
+def _markdown_blocks(lines: Iterable[str]) -> Iterator[Block]:
+    """Split markdown lines into headings and body text.
+
+    ATX headings (``#`` to ``######``) inside fenced code blocks are treated
+    as body text.
+
+    Args:
+        lines: The markdown lines.
+
+    Yields:
+        Heading and body text blocks.
+    """
+    fence: str | None = None
+    for line in lines:
+        fence_match = _FENCE.match(line)
+        if fence_match:
+            marker = fence_match.group(1)
+            fence = marker if fence is None else (None if marker == fence else fence)
+        heading = _HEADING.match(line) if fence is None and fence_match is None else None
+        if heading:
+            yield len(heading.group(1)), heading.group(2)
+        else:
+            yield 0, line
+
+
+class _HTMLBlockParser(HTMLParser):
+    """Incremental HTML parser collecting headings and visible text."""
+
+    def __init__(self) -> None:
+        """Initialize the parser."""
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[Block] = []
+        self._heading: tuple[int, list[str]] | None = None
+        self._skipping = 0
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        """Start a heading, a skipped element or a line break."""
+        if tag in _HTML_SKIPPED:
+            self._skipping += 1
+        elif tag in _HTML_HEADINGS:
+            self._heading = _HTML_HEADINGS[tag], []
+        elif tag in _HTML_BREAKS and self._heading is None:
+            self.blocks.append((0, "\n"))
+
+    def handle_endtag(self, tag: str) -> None:
+        """Finish a heading or a skipped element."""
+        if tag in _HTML_SKIPPED:
+            self._skipping = max(self._skipping - 1, 0)
+        elif tag in _HTML_HEADINGS and self._heading is not None:
+            level, parts = self._heading
+            self._heading = None
+            self.blocks.append((level, " ".join("".join(parts).split())))
+
+    def handle_data(self, data: str) -> None:
+        """Collect visible text."""
+        if self._skipping:
+            return
+        if self._heading is not None:
+            self._heading[1].append(data)
+        else:
+            self.blocks.append((0, data))
+
+    def drain(self) -> list[Block]:
+        """Take the blocks parsed so far.
+
+        Returns:
+            The completed blocks.
+        """
+        blocks, self.blocks = self.blocks, []
+        return blocks
+
+
+def _html_blocks(lines: Iterable[str]) -> Iterator[Block]:
+    """Split HTML into headings and visible body text.
+
+    The parser is fed one line at a time, so only the current element is
+    buffered regardless of the document size.
+
+    Args:
+        lines: The HTML lines.
+
+    Yields:
+        Heading and body text blocks.
+    """
+    parser = _HTMLBlockParser()
+    for line in lines:
+        parser.feed(line)
+        yield from parser.drain()
+    parser.close()
+    yield from parser.drain()
+
+
+def chunk_lines(
+    lines: Iterable[str],
+    fmt: ChunkFormat = "markdown",
+    max_tokens: int = 256,
+    overlap: int = 32,
+    split_headings: bool = True,
+    metadata: dict[str, Any] | None = None,
+) -> Iterator[Chunk]:
+    """Split a stream of lines into chunks.
+
+    Text is cut into windows of at most ``max_tokens`` whitespace-delimited
+    tokens, consecutive windows sharing ``overlap`` tokens. With
+    ``split_headings`` every heading also starts a new window, and each chunk
+    records the heading path it belongs to. Only the current window is held
+    in memory.
+
+    Args:
+        lines: The source lines, e.g. an open file.
+        fmt: The source format.
+        max_tokens: Maximum number of tokens per chunk.
+        overlap: Number of tokens repeated at the start of the next window.
+        split_headings: Whether headings start a new chunk.
+        metadata: Metadata copied into every chunk.
+
+    Yields:
+        Chunks with ``section`` (heading path) and ``chunk`` (sequence number) metadata.
+
+    Raises:
+        ValueError: If ``max_tokens`` is not positive or ``overlap`` is not smaller than it.
+    """
+    if max_tokens <= 0 or not 0 <= overlap < max_tokens:
+        raise ValueError(f"Invalid chunk size {max_tokens} with overlap {overlap}")
+    if fmt == "markdown":
+        blocks = _markdown_blocks(lines)
+    elif fmt == "html":
+        blocks = _html_blocks(lines)
+    else:
+        blocks = ((0, line) for line in lines)
+
+    base = metadata or {}
+    headings: list[Block] = []
+    window: list[str] = []
+    fresh = 0
+    number = 0
+
+    def emit() -> Chunk | None:
+        nonlocal number
+        text = "".join(window).strip()
+        if not text:
+            return None
+        section = " > ".join(title for _, title in headings)
+        chunk = Chunk(text, {**base, "section": section, "chunk": number})
+        number += 1
+        return chunk
+
+    for level, text in blocks:
+        if level and split_headings:
+            if fresh and (chunk := emit()):
+                yield chunk
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, text))
+            # The heading opens the window for context but does not make a chunk on its own.
+            window, fresh = _TOKEN.findall(text + "\n"), 0
+            continue
+        for token in _TOKEN.findall(text):
+            window.append(token)
+            fresh += 1
+            if len(window) >= max_tokens:
+                if chunk := emit():
+                    yield chunk
+                window, fresh = window[len(window) - overlap:] if overlap else [], 0
+    if fresh and (chunk := emit()):
+        yield chunk
+
+
+def iter_files(paths: Iterable[str | Path], suffixes: Iterable[str] = tuple(FORMATS)) -> Iterator[Path]:
+    """Expand paths into the source files below them.
+
+    Directories are walked lazily in sorted order, one directory listing at
+    a time.
+
+    Args:
+        paths: Files and directories.
+        suffixes: File suffixes to include when walking directories.
+
+    Yields:
+        The source file paths.
+    """
+    wanted = {suffix.lower() for suffix in suffixes}
+    for path in map(Path, paths):
+        if not path.is_dir():
+            yield path
+            continue
+        for root, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if Path(name).suffix.lower() in wanted:
+                    yield Path(root) / name
+
+
+def chunk_file(
+    path: str | Path,
+    max_tokens: int = 256,
+    overlap: int = 32,
+    split_headings: bool = True,
+    fmt: ChunkFormat | None = None,
+    encoding: str = "utf-8",
+) -> Iterator[Chunk]:
+    """Stream the chunks of one file.
+
+    Args:
+        path: The source file.
+        max_tokens: Maximum number of tokens per chunk.
+        overlap: Number of tokens shared by consecutive chunks.
+        split_headings: Whether headings start a new chunk.
+        fmt: The source format; guessed from the suffix if omitted.
+        encoding: The file encoding.
+
+    Yields:
+        Chunks with ``source``, ``section`` and ``chunk`` metadata.
+    """
+    path = Path(path)
+    fmt = fmt or FORMATS.get(path.suffix.lower(), "text")
+    with path.open(encoding=encoding, errors="replace") as lines:
+        yield from chunk_lines(lines, fmt, max_tokens, overlap, split_headings, {"source": str(path)})
+
+
+def chunk_files(
+    paths: Iterable[str | Path],
+    max_tokens: int = 256,
+    overlap: int = 32,
+    split_headings: bool = True,
+    suffixes: Iterable[str] = tuple(FORMATS),
+) -> Iterator[Chunk]:
+    """Stream the chunks of every source file below the given paths.
+
+    Args:
+        paths: Files and directories.
+        max_tokens: Maximum number of tokens per chunk.
+        overlap: Number of tokens shared by consecutive chunks.
+        split_headings: Whether headings start a new chunk.
+        suffixes: File suffixes to include when walking directories.
+
+    Yields:
+        Chunks with ``source``, ``section`` and ``chunk`` metadata.
+    """
+    for path in iter_files(paths, suffixes):
+        yield from chunk_file(path, max_tokens, overlap, split_headings)
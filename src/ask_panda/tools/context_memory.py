@@ -1,46 +1,280 @@
 """Context memory for maintaining conversation context."""
 
+import asyncio
+import time
 from collections import deque
-from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any
+from itertools import chain, islice
+from typing import TYPE_CHECKING, Any
+
+from ask_panda.models.base import BaseModel
+from ask_panda.models.tokens import MESSAGE_OVERHEAD, TokenCounter, estimate_tokens
+
+if TYPE_CHECKING:
+    from ask_panda.tools.conversation_store import ConversationStore
+    from ask_panda.tools.long_term_memory import LongTermMemory
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation between a user and an assistant helping with PanDA workflows. "
+    "Keep task and job ids, error messages, sites, decisions and open questions; drop pleasantries. "
+    "If it starts with an earlier summary, merge it into the new one. Reply with the summary only."
+)
 
 
-@dataclass
 class Message:
-    """A message in the conversation."""
+    """A message in the conversation.
+
+    The record is slotted and owns its chat-format dict, which the memory's
+    chat view shares instead of copying. The timestamp is seconds since the
+    epoch and the metadata dict is only created when first needed.
+    """
+
+    __slots__ = ("_metadata", "chat", "timestamp", "tokens")
+
+    def __init__(
+        self,
+        role: str,
+        content: str,
+        timestamp: float | None = None,
+        metadata: dict[str, Any] | None = None,
+        tokens: int = 0,
+    ) -> None:
+        """Initialize a message.
+
+        Args:
+            role: The role of the message sender.
+            content: The message content.
+            timestamp: Creation time in seconds since the epoch; defaults to now.
+            metadata: Optional metadata for the message.
+            tokens: Token count of the message, including chat-format overhead.
+        """
+        self.chat = {"role": role, "content": content}
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.tokens = tokens
+        self._metadata = metadata or None
 
-    role: str
-    content: str
-    timestamp: datetime = field(default_factory=datetime.now)
-    metadata: dict[str, Any] = field(default_factory=dict)
+    @property
+    def role(self) -> str:
+        """Get the role of the message sender."""
+        return self.chat["role"]
+
+    @property
+    def content(self) -> str:
+        """Get the message content."""
+        return self.chat["content"]
+
+    @property
+    def metadata(self) -> dict[str, Any]:
+        """Get the message metadata, creating an empty dict on first access."""
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+
+    def __repr__(self) -> str:
+        """Represent the message for debugging."""
+        return f"Message(role={self.role!r}, content={self.content!r}, tokens={self.tokens})"
+
+    @property
+    def is_summary(self) -> bool:
+        """Check whether the message is a summary of earlier turns."""
+        return bool(self._metadata and self._metadata.get("summary"))
 
 
 class ContextMemory:
-    """Memory for maintaining conversation context and history."""
+    """Memory for maintaining conversation context and history.
+
+    System messages and other pinned messages live in reserved slots that
+    are never evicted, summarized or archived. They always come first in the
+    prompt, as the very same dicts, so the prompt prefix stays byte-identical
+    from turn to turn and provider-side prompt caching can reuse it. The
+    message and token limits apply only to the conversation tail behind them.
+
+    Every message's token count, including the per-message chat overhead, is
+    computed once on insert and a running total is kept, so enforcing
+    ``max_tokens`` only pops messages from the oldest end: amortized O(1)
+    per message. The chat-format view is kept alongside the messages and is
+    only ever appended to or trimmed, so rendering a long session does not
+    rebuild any message dicts.
+
+    With a ``summary_threshold``, the memory also supports rolling
+    compaction: once it holds more tokens than the threshold, :meth:`compact`
+    replaces all but the ``keep_recent`` newest messages with a model-written
+    summary, placed at the start of the tail. Summaries only
+    live in memory; an attached store keeps the full log.
 
-    def __init__(self, max_messages: int = 100, max_tokens: int = 4000) -> None:
+    With a ``long_term`` memory, user and assistant turns that are trimmed
+    or summarized away are archived in a vector index instead of being lost,
+    and :meth:`recall_chat_format` pulls the past turns most relevant to the
+    current query back into the prompt next to the recent window.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = 100,
+        max_tokens: int = 4000,
+        token_counter: TokenCounter | None = None,
+        summary_threshold: int | None = None,
+        keep_recent: int = 6,
+        long_term: "LongTermMemory | None" = None,
+    ) -> None:
         """Initialize context memory.
 
         Args:
-            max_messages: Maximum number of messages to retain.
-            max_tokens: Maximum token count for context window.
+            max_messages: Maximum number of conversation messages to retain,
+                not counting pinned messages.
+            max_tokens: Maximum token count of the conversation messages, not
+                counting pinned messages. The newest message is always kept,
+                even if it exceeds the budget on its own.
+            token_counter: Function counting the tokens of a text; a
+                tokenizer-free estimate by default. Pass the model's
+                ``count_tokens`` for exact counts.
+            summary_threshold: Token count above which older turns should be
+                summarized; None disables compaction. It must be below
+                ``max_tokens``, which would otherwise trim the turns first.
+            keep_recent: Number of newest messages never summarized.
+            long_term: Optional long-term memory archiving turns that leave
+                this memory; ``max_messages`` then sets the recent window.
+
+        Raises:
+            ValueError: If ``summary_threshold`` is not below ``max_tokens``.
         """
+        if summary_threshold is not None and summary_threshold >= max_tokens:
+            raise ValueError(f"summary_threshold ({summary_threshold}) must be below max_tokens ({max_tokens})")
         self.max_messages = max_messages
         self.max_tokens = max_tokens
-        self._messages: deque[Message] = deque(maxlen=max_messages)
+        self.token_counter = token_counter or estimate_tokens
+        self.summary_threshold = summary_threshold
+        self.keep_recent = keep_recent
+        self.long_term = long_term
+        self._compacting = False
+        self._pinned: list[Message] = []
+        self._pinned_chat: list[dict[str, str]] = []
+        self._pinned_tokens = 0
+        self._messages: deque[Message] = deque()
+        self._chat: deque[dict[str, str]] = deque()
+        self._total_tokens = 0
         self._context: dict[str, Any] = {}
+        self.store: ConversationStore | None = None
+        self.conversation_id: str | None = None
+        # Messages of the conversation in the store, None until it has been loaded
+        self._stored: int | None = None
+        # Bumped whenever the conversation is replaced wholesale, which voids a running compaction
+        self._epoch = 0
+
+    def attach(self, store: "ConversationStore", conversation_id: str) -> None:
+        """Persist this memory as a conversation in a store.
+
+        Every message added from now on is appended to the store. Nothing is
+        read here: the stored conversation is loaded by the next
+        :meth:`refresh`, which does its disk access off the event loop.
+
+        Args:
+            store: The conversation store.
+            conversation_id: The conversation id.
+        """
+        self.store = store
+        self.conversation_id = conversation_id
+        self._stored = None
+
+    async def refresh(self) -> bool:
+        """Load the conversation from the attached store if it was never loaded or has grown there.
+
+        Workers sharing a store each hold their own copy of a conversation,
+        which goes stale when another worker handles a turn. The conversation
+        is replaced by the stored recent window that fits the memory's
+        limits; pinned messages are kept and a summary is dropped, since
+        summaries are not stored. With a long-term memory, it is rebuilt from
+        the stored turns before the window, so recall survives eviction and
+        restarts. The store is read in a worker thread.
+
+        Returns:
+            True if the conversation was reloaded.
+        """
+        store, conversation_id = self.store, self.conversation_id
+        if store is None or conversation_id is None:
+            return False
+        stored = await asyncio.to_thread(store.count, conversation_id)
+        if stored == self._stored:
+            return False
+        # With long-term memory, older turns are loaded too; trimming them to the window archives them
+        limit, budget = self.max_messages, self.max_tokens if self.long_term is None else None
+        if self.long_term is not None:
+            limit += self.long_term.max_turns
+        messages = await asyncio.to_thread(store.load_recent, conversation_id, limit, budget) if stored else []
+        self._epoch += 1
+        self._messages.clear()
+        self._chat.clear()
+        self._total_tokens = 0
+        if self.long_term is not None:
+            self.long_term.clear()
+        for message in messages:
+            self._append(message)
+        self._stored = stored
+        return True
+
+    def _append(self, message: Message) -> None:
+        """Append a message and trim the oldest ones to the limits.
+
+        Args:
+            message: The message.
+        """
+        self._messages.append(message)
+        self._chat.append(message.chat)
+        self._total_tokens += message.tokens
+        self._trim()
+
+    def _trim(self) -> None:
+        """Drop the oldest messages until the memory is within its limits, keeping the summary."""
+        while len(self._messages) > 1 and (len(self._messages) > self.max_messages or self._total_tokens > self.max_tokens):
+            # The summary stands in for all turns before it, so the oldest turn after it goes instead
+            oldest = 1 if self._messages[0].is_summary else 0
+            if len(self._messages) - oldest <= 1:
+                break
+            message = self._messages[oldest]
+            del self._messages[oldest]
+            del self._chat[oldest]
+            self._total_tokens -= message.tokens
+            self._archive(message)
+
+    def _archive(self, message: Message) -> None:
+        """Hand a conversation turn that leaves the memory to the long-term memory, if any.
+
+        Args:
+            message: The message.
+        """
+        if self.long_term is not None and message.role != "system":
+            self.long_term.archive(message)
+
+    def pin_message(self, role: str, content: str, metadata: dict[str, Any] | None = None) -> None:
+        """Add a message to the reserved slots ahead of the conversation.
+
+        Pinned messages are never evicted and keep their order. They are not
+        written to an attached store.
+
+        Args:
+            role: The role of the message sender.
+            content: The message content.
+            metadata: Optional metadata for the message.
+        """
+        message = Message(role, content, metadata=metadata, tokens=self.token_counter(content) + MESSAGE_OVERHEAD)
+        self._pinned.append(message)
+        self._pinned_chat.append(message.chat)
+        self._pinned_tokens += message.tokens
 
     def add_message(self, role: str, content: str, metadata: dict[str, Any] | None = None) -> None:
-        """Add a message to memory.
+        """Add a message to the conversation.
 
         Args:
             role: The role of the message sender (e.g., 'user', 'assistant').
             content: The message content.
             metadata: Optional metadata for the message.
         """
-        message = Message(role=role, content=content, metadata=metadata or {})
-        self._messages.append(message)
+        message = Message(role, content, metadata=metadata, tokens=self.token_counter(content) + MESSAGE_OVERHEAD)
+        self._append(message)
+        if self.store is not None and self.conversation_id is not None:
+            self.store.append(self.conversation_id, message)
+            if self._stored is not None:
+                self._stored += 1
 
     def add_user_message(self, content: str, **kwargs: Any) -> None:
         """Add a user message.
@@ -61,13 +295,13 @@ class ContextMemory:
         self.add_message("assistant", content, kwargs)
 
     def add_system_message(self, content: str, **kwargs: Any) -> None:
-        """Add a system message.
+        """Add a system message to the reserved slots, see :meth:`pin_message`.
 
         Args:
             content: The message content.
             **kwargs: Additional metadata.
         """
-        self.add_message("system", content, kwargs)
+        self.pin_message("system", content, kwargs)
 
     def get_messages(self, count: int | None = None) -> list[dict[str, Any]]:
         """Get messages from memory.
@@ -76,12 +310,13 @@ class ContextMemory:
             count: Number of recent messages to retrieve. If None, returns all.
 
         Returns:
-            List of messages as dictionaries.
+            List of messages as dictionaries, pinned messages first.
         """
-        messages = list(self._messages)
-        if count is not None:
-            messages = messages[-count:]
-        return [{"role": m.role, "content": m.content, "timestamp": m.timestamp.isoformat()} for m in messages]
+        start = 0 if count is None else max(self.message_count - count, 0)
+        return [
+            {"role": m.role, "content": m.content, "timestamp": datetime.fromtimestamp(m.timestamp).isoformat()}
+            for m in islice(chain(self._pinned, self._messages), start, None)
+        ]
 
     def get_context(self) -> dict[str, Any]:
         """Get the current context.
@@ -104,24 +339,171 @@ class ContextMemory:
         """Clear the context."""
         self._context.clear()
 
-    def clear_messages(self) -> None:
-        """Clear all messages."""
+    def clear_messages(self, keep_pinned: bool = False) -> None:
+        """Clear all messages, including the stored conversation if attached.
+
+        Args:
+            keep_pinned: Only clear the conversation, keeping the pinned messages.
+        """
+        if not keep_pinned:
+            self._pinned.clear()
+            self._pinned_chat.clear()
+            self._pinned_tokens = 0
+        if self.store is not None and self.conversation_id is not None:
+            self.store.delete(self.conversation_id)
+            self._stored = 0
+        self._epoch += 1
         self._messages.clear()
+        self._chat.clear()
+        self._total_tokens = 0
+        if self.long_term is not None:
+            self.long_term.clear()
 
     def clear(self) -> None:
         """Clear all memory (messages and context)."""
         self.clear_messages()
         self.clear_context()
 
-    def to_chat_format(self) -> list[dict[str, str]]:
+    def to_chat_format(self, max_tokens: int | None = None) -> list[dict[str, str]]:
         """Convert messages to chat completion format.
 
+        Args:
+            max_tokens: Optional token budget for the conversation. Only the
+                longest run of most recent messages whose cached token counts
+                fit is returned; pinned messages are always included.
+
+        Returns:
+            List of messages in OpenAI chat format, pinned messages first and
+            then the conversation, oldest first. The list is new but the
+            message dicts are shared with the memory and must not be modified.
+        """
+        if max_tokens is None or max_tokens >= self._total_tokens:
+            return [*self._pinned_chat, *self._chat]
+        kept = 0
+        used = 0
+        for message in reversed(self._messages):
+            used += message.tokens
+            if used > max_tokens:
+                break
+            kept += 1
+        return [*self._pinned_chat, *islice(self._chat, len(self._chat) - kept, None)]
+
+    async def recall_chat_format(self, query: str | None = None, max_tokens: int | None = None) -> list[dict[str, str]]:
+        """Convert messages to chat completion format, adding relevant past turns.
+
+        Past turns recalled from the long-term memory are inserted as one
+        system message after the pinned messages and the summary, if any.
+        Without a long-term memory this is :meth:`to_chat_format`.
+
+        Args:
+            query: Text to recall turns for; the newest user message by default.
+            max_tokens: Optional token budget for the conversation; recalled
+                turns are counted first and the recent window gets the rest.
+
         Returns:
             List of messages in OpenAI chat format.
         """
-        return [{"role": m.role, "content": m.content} for m in self._messages]
+        if self.long_term is None:
+            return self.to_chat_format(max_tokens)
+        if query is None:
+            query = next((message.content for message in reversed(self._messages) if message.role == "user"), "")
+        recalled = await self.long_term.recall(query) if query else []
+        if not recalled:
+            return self.to_chat_format(max_tokens)
+        content = "Relevant earlier turns:\n" + "\n".join(f"{message.role}: {message.content}" for message in recalled)
+        if max_tokens is not None:
+            max_tokens = max(max_tokens - self.token_counter(content) - MESSAGE_OVERHEAD, 0)
+        chat = self.to_chat_format(max_tokens)
+        start = len(self._pinned_chat)
+        if start < len(chat) and self._messages[0].is_summary and chat[start] is self._messages[0].chat:
+            start += 1
+        chat.insert(start, {"role": "system", "content": content})
+        return chat
+
+    @property
+    def needs_compaction(self) -> bool:
+        """Check whether the conversation has passed its summary threshold."""
+        if self.summary_threshold is None or self._total_tokens <= self.summary_threshold or self._compacting:
+            return False
+        return bool(self._compactable())
+
+    @property
+    def summary(self) -> str | None:
+        """Get the summary of earlier turns, if any."""
+        for message in self._messages:
+            if message.is_summary:
+                return message.content
+        return None
+
+    def _compactable(self) -> list[Message]:
+        """Find the messages a compaction would replace.
+
+        Returns:
+            The conversation messages before the recent window, including any
+            previous summary; empty if there is nothing new to summarize.
+        """
+        span = list(islice(self._messages, 0, max(len(self._messages) - self.keep_recent, 0)))
+        return span if any(not message.is_summary for message in span) else []
+
+    async def compact(self, model: BaseModel) -> bool:
+        """Replace older turns with a summary written by a model.
+
+        The model call runs without blocking the memory: messages added
+        meanwhile are kept, and messages trimmed meanwhile are simply gone.
+        If the conversation is cleared or reloaded from its store meanwhile,
+        the summary is discarded, since the reloaded window may still hold
+        the summarized turns. Only one compaction runs at a time.
+
+        Args:
+            model: The model writing the summary.
+
+        Returns:
+            True if older turns were replaced.
+        """
+        if not self.needs_compaction:
+            return False
+        span = self._compactable()
+        transcript = "\n\n".join(f"{message.role}: {message.content}" for message in span)
+        epoch = self._epoch
+        self._compacting = True
+        try:
+            summary = await model.generate(
+                [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}]
+            )
+        finally:
+            self._compacting = False
+        if self._epoch != epoch:
+            return False
+
+        replaced = {id(message) for message in span}
+        kept = []
+        for message in self._messages:
+            if id(message) in replaced:
+                self._archive(message)
+            else:
+                kept.append(message)
+        content = f"Summary of the earlier conversation: {summary}"
+        kept.insert(
+            0,
+            Message("system", content, metadata={"summary": True}, tokens=self.token_counter(content) + MESSAGE_OVERHEAD),
+        )
+        self._messages = deque(kept)
+        self._chat = deque(message.chat for message in kept)
+        self._total_tokens = sum(message.tokens for message in kept)
+        self._trim()
+        return True
 
     @property
     def message_count(self) -> int:
-        """Get the number of messages in memory."""
+        """Get the number of messages in memory, including pinned messages."""
+        return len(self._pinned) + len(self._messages)
+
+    @property
+    def turn_count(self) -> int:
+        """Get the number of conversation messages in memory, excluding pinned messages."""
         return len(self._messages)
+
+    @property
+    def token_count(self) -> int:
+        """Get the number of tokens in memory, including pinned messages and per-message overhead."""
+        return self._pinned_tokens + self._total_tokens
@@ -0,0 +1,178 @@
+"""Durable, append-only conversation log in SQLite."""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from ask_panda.tools.context_memory import Message
+
+
+class ConversationStore:
+    """Append-only message log in a SQLite file, shared by all workers on a host.
+
+    Appends are buffered in memory and written behind in batches by a
+    background thread: a batch is committed in one transaction every
+    ``flush_interval`` seconds, or as soon as it reaches ``batch_size``
+    messages. Appending only takes a short lock around the buffer, which the
+    writer swaps out before it commits, so adding a message never waits for
+    the disk. Reads do wait for a running write; callers on an event loop
+    run them in a worker thread. The database runs in WAL mode, so readers in other processes are
+    not blocked by the writer. Messages still buffered when a process dies
+    are lost.
+    """
+
+    def __init__(self, path: str | Path, batch_size: int = 64, flush_interval: float | None = 1.0) -> None:
+        """Open or create the store.
+
+        Args:
+            path: The SQLite file.
+            batch_size: Number of buffered messages that triggers a write.
+            flush_interval: Seconds between background writes; None disables the background
+                thread, and full batches are then written by the appending caller.
+        """
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self._pending: list[tuple[str, str, str, float, int, str | None]] = []
+        # The buffer lock is only held to swap the buffer; the database lock serializes disk access
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: sqlite3.Connection | None = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY, conversation_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "timestamp REAL NOT NULL, tokens INTEGER NOT NULL, metadata TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages (conversation_id, id)")
+        self._db.commit()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._flusher: threading.Thread | None = None
+        if flush_interval is not None:
+            self._flusher = threading.Thread(target=self._flush_periodically, args=(flush_interval,), daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self, interval: float) -> None:
+        """Flush the buffer every interval, or when a batch is full, until the store is closed.
+
+        Args:
+            interval: Seconds between flushes.
+        """
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.flush()
+
+    def append(self, conversation_id: str, message: Message) -> None:
+        """Buffer a message for writing.
+
+        Args:
+            conversation_id: The conversation id.
+            message: The message.
+        """
+        metadata = json.dumps(message._metadata) if message._metadata else None
+        row = (conversation_id, message.role, message.content, message.timestamp, message.tokens, metadata)
+        with self._lock:
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            if self._flusher is not None:
+                self._wake.set()
+            else:
+                self.flush()
+
+    def _write(self) -> None:
+        """Write the buffered messages in one transaction; the database lock must be held."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending and self._db is not None:
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO messages (conversation_id, role, content, timestamp, tokens, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                    pending,
+                )
+
+    def flush(self) -> None:
+        """Write all buffered messages."""
+        with self._db_lock:
+            self._write()
+
+    def load_recent(self, conversation_id: str, max_messages: int, max_tokens: int | None = None) -> list[Message]:
+        """Load the most recent messages of a conversation.
+
+        Only the rows of the recent window are read, newest first, stopping at
+        ``max_messages`` or when the next message would exceed ``max_tokens``.
+
+        Args:
+            conversation_id: The conversation id.
+            max_messages: Maximum number of messages to load.
+            max_tokens: Optional token budget for the loaded messages.
+
+        Returns:
+            The messages, oldest first.
+        """
+        with self._db_lock:
+            self._write()
+            if self._db is None:
+                return []
+            rows = self._db.execute(
+                "SELECT role, content, timestamp, tokens, metadata FROM messages "
+                "WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+                (conversation_id, max_messages),
+            )
+            messages = []
+            used = 0
+            for role, content, timestamp, tokens, metadata in rows:
+                used += tokens
+                if max_tokens is not None and used > max_tokens:
+                    break
+                messages.append(Message(role, content, timestamp, json.loads(metadata) if metadata else None, tokens))
+        messages.reverse()
+        return messages
+
+    def delete(self, conversation_id: str) -> None:
+        """Delete a conversation, including its buffered messages.
+
+        Args:
+            conversation_id: The conversation id.
+        """
+        with self._db_lock:
+            with self._lock:
+                self._pending = [row for row in self._pending if row[0] != conversation_id]
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+
+    def count(self, conversation_id: str) -> int:
+        """Count the stored messages of a conversation, including buffered ones.
+
+        Nothing is written, so this is cheap enough to check before every turn.
+
+        Args:
+            conversation_id: The conversation id.
+
+        Returns:
+            The number of messages.
+        """
+        # Holding the database lock keeps a batch from being in neither the buffer nor the file
+        with self._db_lock:
+            with self._lock:
+                buffered = sum(row[0] == conversation_id for row in self._pending)
+            if self._db is None:
+                return buffered
+            stored: int = self._db.execute("SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)).fetchone()[0]
+            return stored + buffered
+
+    def close(self) -> None:
+        """Stop the background thread, write the buffer and close the file."""
+        self._stop.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._db_lock:
+            self._write()
+            if self._db is not None:
+                self._db.close()
+                self._db = None
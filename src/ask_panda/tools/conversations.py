@@ -0,0 +1,172 @@
+"""Registry of per-conversation context memories."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+
+from ask_panda.tools.context_memory import ContextMemory
+
+
+class _Conversation:
+    """A registered conversation and its bookkeeping."""
+
+    __slots__ = ("last_used", "lock", "memory", "tokens", "users")
+
+    def __init__(self, memory: ContextMemory, now: float) -> None:
+        """Initialize the entry.
+
+        Args:
+            memory: The conversation memory.
+            now: The current clock reading.
+        """
+        self.memory = memory
+        self.lock = asyncio.Lock()
+        self.last_used = now
+        self.tokens = memory.token_count
+        self.users = 0
+
+
+class ConversationRegistry:
+    """Context memories keyed by conversation id, with bounded total size.
+
+    Conversations are kept in least-recently-used order. After every session
+    the registry evicts conversations that have been idle for longer than
+    ``idle_ttl`` and then the least recently used ones until both the number of
+    conversations and their total token count are within bounds. Conversations
+    with an open or waiting session are never evicted.
+
+    Each conversation has its own lock, so turns of one conversation run one
+    at a time while different conversations proceed concurrently. The
+    registry is meant to be used from a single event loop.
+
+    Memories attached to a :class:`ConversationStore` are loaded from it at
+    the start of their first session and refreshed at the start of every
+    later one, so a conversation whose turns alternate between workers
+    sharing the store stays current in each of them. The store is read in a
+    worker thread, never on the event loop.
+    """
+
+    def __init__(
+        self,
+        memory_factory: Callable[[str], ContextMemory] | None = None,
+        max_conversations: int = 10_000,
+        max_total_tokens: int | None = None,
+        idle_ttl: float | None = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize an empty registry.
+
+        Args:
+            memory_factory: Creates the memory of a new conversation from its id;
+                an empty :class:`ContextMemory` by default. Memories backed by a
+                :class:`ConversationStore` make eviction lossless.
+            max_conversations: Maximum number of conversations kept.
+            max_total_tokens: Optional bound on the tokens held across all conversations.
+            idle_ttl: Seconds after its last use that a conversation expires; None disables expiry.
+            clock: Monotonic clock returning seconds.
+        """
+        self.memory_factory = memory_factory or (lambda conversation_id: ContextMemory())
+        self.max_conversations = max_conversations
+        self.max_total_tokens = max_total_tokens
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self.evictions = 0
+        self._conversations: OrderedDict[str, _Conversation] = OrderedDict()
+        self._total_tokens = 0
+
+    @asynccontextmanager
+    async def session(self, conversation_id: str) -> AsyncIterator[ContextMemory]:
+        """Hold a conversation's lock and use its memory, creating it if needed.
+
+        Args:
+            conversation_id: The conversation id.
+
+        Yields:
+            The conversation memory.
+        """
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            conversation = self._conversations[conversation_id] = _Conversation(self.memory_factory(conversation_id), self.clock())
+            self._total_tokens += conversation.tokens
+        else:
+            self._conversations.move_to_end(conversation_id)
+        conversation.users += 1
+        try:
+            async with conversation.lock:
+                await conversation.memory.refresh()
+                yield conversation.memory
+        finally:
+            conversation.users -= 1
+            conversation.last_used = self.clock()
+            if self._conversations.get(conversation_id) is conversation:
+                self._conversations.move_to_end(conversation_id)
+                self._total_tokens += conversation.memory.token_count - conversation.tokens
+                conversation.tokens = conversation.memory.token_count
+            self.evict()
+
+    def evict(self) -> int:
+        """Evict expired conversations, then the least recently used ones over the bounds.
+
+        Returns:
+            The number of evicted conversations.
+        """
+        now = self.clock()
+        excess = len(self._conversations) - self.max_conversations
+        excess_tokens = self._total_tokens - self.max_total_tokens if self.max_total_tokens is not None else 0
+        victims = []
+        for conversation_id, conversation in self._conversations.items():
+            expired = self.idle_ttl is not None and now - conversation.last_used > self.idle_ttl
+            if not expired and excess <= 0 and excess_tokens <= 0:
+                break
+            if conversation.users:
+                continue
+            victims.append(conversation_id)
+            excess -= 1
+            excess_tokens -= conversation.tokens
+        for conversation_id in victims:
+            self.remove(conversation_id)
+        self.evictions += len(victims)
+        return len(victims)
+
+    def get(self, conversation_id: str) -> ContextMemory | None:
+        """Get a conversation's memory without locking it or marking it as used.
+
+        Args:
+            conversation_id: The conversation id.
+
+        Returns:
+            The memory, or None if the conversation is not registered.
+        """
+        conversation = self._conversations.get(conversation_id)
+        return None if conversation is None else conversation.memory
+
+    def remove(self, conversation_id: str) -> None:
+        """Forget a conversation, if registered.
+
+        Args:
+            conversation_id: The conversation id.
+        """
+        conversation = self._conversations.pop(conversation_id, None)
+        if conversation is not None:
+            self._total_tokens -= conversation.tokens
+
+    def clear(self) -> None:
+        """Forget all conversations."""
+        self._conversations.clear()
+        self._total_tokens = 0
+
+    @property
+    def count(self) -> int:
+        """Get the number of registered conversations."""
+        return len(self._conversations)
+
+    @property
+    def token_count(self) -> int:
+        """Get the number of tokens held across all conversations."""
+        return self._total_tokens
+
+    def __contains__(self, conversation_id: object) -> bool:
+        """Check whether a conversation is registered."""
+        return conversation_id in self._conversations
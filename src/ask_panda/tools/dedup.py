@@ -0,0 +1,136 @@
+"""SimHash near-duplicate detection with an LSH band index."""
+
+import hashlib
+import re
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+_SIGNATURE_BITS = 64
+
+
+def _shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    """Hash the word shingles of a text to 64-bit values.
+
+    Args:
+        text: The text.
+        shingle_size: Number of consecutive words per shingle.
+
+    Returns:
+        One uint64 hash per distinct shingle.
+    """
+    words = _WORD.findall(text.lower())
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(len(words) - shingle_size + 1, 1))}
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    return np.frombuffer(digests, dtype=np.uint64)
+
+
+class SimHashDeduplicator:
+    """Detects near-duplicate texts by the Hamming distance of their SimHashes.
+
+    Each text gets a 64-bit SimHash over its word shingles. The signature is
+    split into ``max_distance + 1`` bands, and every band value is a bucket
+    key: two signatures within ``max_distance`` bits must agree on at least
+    one band, so a lookup only compares against the documents sharing a
+    bucket instead of the whole corpus.
+    """
+
+    def __init__(self, max_distance: int = 3, shingle_size: int = 3) -> None:
+        """Initialize an empty detector.
+
+        Args:
+            max_distance: Maximum number of differing signature bits for a near-duplicate.
+            shingle_size: Number of consecutive words hashed together.
+
+        Raises:
+            ValueError: If ``max_distance`` leaves no bits per band.
+        """
+        if not 0 <= max_distance < _SIGNATURE_BITS // 2:
+            raise ValueError(f"max_distance must be between 0 and {_SIGNATURE_BITS // 2 - 1}, got {max_distance}")
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        bounds = np.linspace(0, _SIGNATURE_BITS, max_distance + 2).astype(int).tolist()
+        self._bands = [((1 << (end - start)) - 1, start) for start, end in zip(bounds[:-1], bounds[1:], strict=True)]
+        self._buckets: list[dict[int, list[int]]] = [{} for _ in self._bands]
+        self._signatures: dict[int, int] = {}
+
+    def signature(self, text: str) -> int:
+        """Compute the SimHash of a text.
+
+        Args:
+            text: The text.
+
+        Returns:
+            The 64-bit signature.
+        """
+        hashes = _shingle_hashes(text, self.shingle_size)
+        # One row of 64 bits per shingle; a signature bit is set where most shingles set it.
+        bits = np.unpackbits(hashes.astype(">u8").view(np.uint8).reshape(-1, 8), axis=1)
+        majority = (2 * bits.sum(axis=0, dtype=np.int64) > len(hashes)).astype(np.uint8)
+        return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+    def _keys(self, signature: int) -> list[int]:
+        """Split a signature into its band values.
+
+        Args:
+            signature: The signature.
+
+        Returns:
+            One bucket key per band.
+        """
+        return [(signature >> shift) & mask for mask, shift in self._bands]
+
+    def find(self, signature: int) -> int | None:
+        """Find an indexed document that is a near-duplicate of a signature.
+
+        Args:
+            signature: The signature to look up.
+
+        Returns:
+            The id of the closest near-duplicate, or None.
+        """
+        best: tuple[int, int] | None = None
+        for buckets, key in zip(self._buckets, self._keys(signature), strict=True):
+            for doc_id in buckets.get(key, ()):
+                distance = (self._signatures[doc_id] ^ signature).bit_count()
+                if distance <= self.max_distance and (best is None or (distance, doc_id) < best):
+                    best = distance, doc_id
+        return None if best is None else best[1]
+
+    def add(self, doc_id: int, signature: int) -> None:
+        """Index a document signature, replacing any previous one for the id.
+
+        Args:
+            doc_id: The document id.
+            signature: The document signature.
+        """
+        self.remove(doc_id)
+        self._signatures[doc_id] = signature
+        for buckets, key in zip(self._buckets, self._keys(signature), strict=True):
+            buckets.setdefault(key, []).append(doc_id)
+
+    def remove(self, doc_id: int) -> None:
+        """Remove a document from the index, if present.
+
+        Args:
+            doc_id: The document id.
+        """
+        signature = self._signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        for buckets, key in zip(self._buckets, self._keys(signature), strict=True):
+            bucket = buckets[key]
+            bucket.remove(doc_id)
+            if not bucket:
+                del buckets[key]
+
+    def clear(self) -> None:
+        """Remove all documents."""
+        for buckets in self._buckets:
+            buckets.clear()
+        self._signatures.clear()
+
+    @property
+    def count(self) -> int:
+        """Get the number of indexed documents."""
+        return len(self._signatures)
@@ -0,0 +1,175 @@
+"""Batched, concurrent embedding ingestion into the vector store."""
+
+import asyncio
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from itertools import islice, repeat, tee
+from pathlib import Path
+from typing import Any
+
+from ask_panda.models.base import BaseModel
+from ask_panda.tools.chunking import FORMATS, chunk_files
+from ask_panda.tools.vector_store import VectorStore
+
+Batch = tuple[int, list[str], list[dict[str, Any]]]
+# A batch, the stored near-duplicate of each document (or None) and the embeddings of the rest.
+Embedded = tuple[Batch, list[int | None], list[list[float]]]
+
+
+@dataclass
+class IngestionStats:
+    """Progress and throughput of an ingestion run."""
+
+    documents: int = 0
+    batches: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        """Get the ingestion throughput."""
+        return self.documents / self.elapsed if self.elapsed > 0 else 0.0
+
+
+ProgressCallback = Callable[[IngestionStats], None]
+
+
+def _batches(documents: Iterable[str], metadata_list: Iterable[dict[str, Any]] | None, batch_size: int) -> Iterator[Batch]:
+    """Group documents and their metadata into numbered batches.
+
+    Args:
+        documents: The document texts.
+        metadata_list: Optional metadata per document.
+        batch_size: Maximum number of documents per batch.
+
+    Yields:
+        Tuples of batch number, texts and metadata.
+    """
+    pairs = zip(documents, repeat({}) if metadata_list is None else metadata_list, strict=metadata_list is not None)
+    batch_no = 0
+    while chunk := list(islice(pairs, batch_size)):
+        yield batch_no, [text for text, _ in chunk], [metadata or {} for _, metadata in chunk]
+        batch_no += 1
+
+
+async def ingest_documents(
+    store: VectorStore,
+    model: BaseModel,
+    documents: Iterable[str],
+    metadata_list: Iterable[dict[str, Any]] | None = None,
+    batch_size: int = 64,
+    max_concurrency: int = 4,
+    on_progress: ProgressCallback | None = None,
+) -> tuple[list[int], IngestionStats]:
+    """Embed documents in batches and add them to a vector store.
+
+    Up to ``max_concurrency`` batches are embedded at once with
+    :meth:`BaseModel.embed_batch`. Each batch is written into the store's
+    matrix, on the store's thread pool, as soon as its embeddings arrive, so
+    documents are consumed lazily and at most ``batch_size * max_concurrency``
+    texts are held at a time.
+    Batches land in completion order; the returned indices follow input order.
+
+    If the store has a deduplicator, documents already stored as
+    near-duplicates are not embedded at all, and duplicates among batches in
+    flight are dropped when they are added; both count as ``skipped``.
+
+    Args:
+        store: The vector store to add documents to.
+        model: The model used to compute embeddings.
+        documents: The document texts; any iterable, including generators.
+        metadata_list: Optional metadata per document.
+        batch_size: Number of documents per embedding request.
+        max_concurrency: Maximum number of embedding requests in flight.
+        on_progress: Optional callback invoked after every stored batch.
+
+    Returns:
+        The store ids of the documents in input order, and the run statistics.
+    """
+    stats = IngestionStats()
+    indices: dict[int, list[int]] = {}
+    pending: set[asyncio.Task[Embedded]] = set()
+    started = time.perf_counter()
+
+    async def embed(batch: Batch) -> Embedded:
+        duplicates = [store.find_duplicate(text) for text in batch[1]]
+        fresh = [text for text, duplicate in zip(batch[1], duplicates, strict=True) if duplicate is None]
+        return batch, duplicates, await model.embed_batch(fresh) if fresh else []
+
+    async def store_completed(done: set[asyncio.Task[Embedded]]) -> None:
+        for task in done:
+            (batch_no, texts, metadata), duplicates, embeddings = task.result()
+            fresh = [position for position, duplicate in enumerate(duplicates) if duplicate is None]
+            skipped_before = store.duplicates_skipped
+            added = iter(
+                await store.aadd_documents([texts[i] for i in fresh], [metadata[i] for i in fresh], embeddings=embeddings)
+            )
+            stats.skipped += len(texts) - len(fresh) + store.duplicates_skipped - skipped_before
+            indices[batch_no] = [next(added) if duplicate is None else duplicate for duplicate in duplicates]
+            stats.documents += len(texts)
+            stats.batches += 1
+            stats.elapsed = time.perf_counter() - started
+            if on_progress is not None:
+                on_progress(stats)
+
+    try:
+        for batch in _batches(documents, metadata_list, batch_size):
+            if len(pending) >= max_concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                await store_completed(done)
+            pending.add(asyncio.create_task(embed(batch)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            await store_completed(done)
+    finally:
+        for task in pending:
+            task.cancel()
+
+    stats.elapsed = time.perf_counter() - started
+    return [index for batch_no in sorted(indices) for index in indices[batch_no]], stats
+
+
+async def ingest_files(
+    store: VectorStore,
+    model: BaseModel,
+    paths: Iterable[str | Path],
+    max_tokens: int = 256,
+    overlap: int = 32,
+    split_headings: bool = True,
+    suffixes: Iterable[str] = tuple(FORMATS),
+    batch_size: int = 64,
+    max_concurrency: int = 4,
+    on_progress: ProgressCallback | None = None,
+) -> tuple[list[int], IngestionStats]:
+    """Chunk source files and add the chunks to a vector store.
+
+    Files are read line by line through :func:`chunk_files` and the chunks are
+    pulled by :func:`ingest_documents` only as batches are submitted, so memory
+    stays bounded by the batch window however large the source tree is.
+
+    Args:
+        store: The vector store to add chunks to.
+        model: The model used to compute embeddings.
+        paths: Markdown, HTML or text files, or directories to walk.
+        max_tokens: Maximum number of tokens per chunk.
+        overlap: Number of tokens shared by consecutive chunks.
+        split_headings: Whether headings start a new chunk.
+        suffixes: File suffixes to include when walking directories.
+        batch_size: Number of chunks per embedding request.
+        max_concurrency: Maximum number of embedding requests in flight.
+        on_progress: Optional callback invoked after every stored batch.
+
+    Returns:
+        The store ids of the chunks in source order, and the run statistics.
+    """
+    texts, metadata = tee(chunk_files(paths, max_tokens, overlap, split_headings, suffixes))
+    return await ingest_documents(
+        store,
+        model,
+        (chunk.text for chunk in texts),
+        (chunk.metadata for chunk in metadata),
+        batch_size=batch_size,
+        max_concurrency=max_concurrency,
+        on_progress=on_progress,
+    )
@@ -0,0 +1,173 @@
+"""BM25 lexical index and rank fusion for hybrid retrieval."""
+
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+from ask_panda.tools.ann_index import select_top_k
+
+# Keeps identifiers such as "CERN-PROD", "ANALY_BNL" or "1305" together.
+_TOKEN = re.compile(r"[a-z0-9]+(?:[._\-/:][a-z0-9]+)*")
+_SUBTOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase lexical tokens.
+
+    Compound identifiers are kept whole and also split into their parts, so
+    ``CERN-PROD`` matches queries for ``CERN-PROD`` as well as ``cern``.
+
+    Args:
+        text: The text to tokenize.
+
+    Returns:
+        The tokens, in order.
+    """
+    tokens: list[str] = []
+    for token in _TOKEN.findall(text.lower()):
+        tokens.append(token)
+        parts = _SUBTOKEN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class _TermPostings:
+    """Growable document id and term frequency arrays for one term."""
+
+    def __init__(self) -> None:
+        """Initialize an empty posting list."""
+        self.ids = np.zeros(2, dtype=np.int32)
+        self.tfs = np.zeros(2, dtype=np.int32)
+        self.size = 0
+
+    def append(self, doc_id: int, tf: int) -> None:
+        """Append a document, which must have a larger id than any present.
+
+        Args:
+            doc_id: The document id.
+            tf: The term frequency in the document.
+        """
+        if self.size == len(self.ids):
+            self.ids = np.concatenate([self.ids, np.zeros(len(self.ids), dtype=np.int32)])
+            self.tfs = np.concatenate([self.tfs, np.zeros(len(self.tfs), dtype=np.int32)])
+        self.ids[self.size] = doc_id
+        self.tfs[self.size] = tf
+        self.size += 1
+
+
+class LexicalIndex:
+    """Incremental inverted index with Okapi BM25 scoring.
+
+    Postings are int32 id/frequency arrays that grow geometrically, so adding
+    a document costs O(its distinct terms) and a query only touches the
+    postings of its own terms.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        """Initialize an empty index.
+
+        Args:
+            k1: BM25 term frequency saturation.
+            b: BM25 document length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, _TermPostings] = {}
+        self._lengths = np.zeros(16, dtype=np.float32)
+        self._total_length = 0
+        self.count = 0
+
+    def add(self, doc_id: int, text: str) -> None:
+        """Index the next document.
+
+        Args:
+            doc_id: The document id; must be at least :attr:`count`.
+            text: The document text.
+        """
+        tokens = tokenize(text)
+        if doc_id >= len(self._lengths):
+            self._lengths = np.concatenate([self._lengths, np.zeros(max(doc_id + 1, len(self._lengths)), dtype=np.float32)])
+        self._lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self._postings.setdefault(term, _TermPostings()).append(doc_id, tf)
+        self.count = doc_id + 1
+
+    def search(
+        self, query: str, top_k: int, allowed: np.ndarray | None = None, mask: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Rank documents by BM25 score.
+
+        Args:
+            query: The query text.
+            top_k: Number of results to return.
+            allowed: Optional sorted ids to restrict the results to.
+            mask: Optional boolean array over document ids; False excludes a document.
+
+        Returns:
+            Document ids and their BM25 scores, best match first. Documents
+            sharing no term with the query are not returned.
+        """
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if self.count == 0:
+            return empty
+        avg_length = self._total_length / self.count or 1.0
+        ids: list[np.ndarray] = []
+        weights: list[np.ndarray] = []
+        for term in dict.fromkeys(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            doc_ids, tfs = postings.ids[:postings.size], postings.tfs[:postings.size].astype(np.float32)
+            idf = math.log(1.0 + (self.count - postings.size + 0.5) / (postings.size + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self._lengths[doc_ids] / avg_length)
+            ids.append(doc_ids)
+            weights.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not ids:
+            return empty
+
+        docs, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights)).astype(np.float32)
+        if allowed is not None:
+            keep = np.isin(docs, allowed, assume_unique=True)
+            docs, scores = docs[keep], scores[keep]
+        if mask is not None:
+            keep = mask[docs]
+            docs, scores = docs[keep], scores[keep]
+        best = select_top_k(scores, top_k)
+        return docs[best].astype(np.int64), scores[best]
+
+    def clear(self) -> None:
+        """Remove all documents."""
+        self._postings.clear()
+        self._lengths = np.zeros(16, dtype=np.float32)
+        self._total_length = 0
+        self.count = 0
+
+
+def reciprocal_rank_fusion(rankings: list[np.ndarray], top_k: int, k: int = 60) -> tuple[np.ndarray, np.ndarray]:
+    """Fuse several rankings with reciprocal rank fusion.
+
+    Each document scores ``sum(1 / (k + rank))`` over the rankings it appears
+    in, with ranks starting at 1.
+
+    Args:
+        rankings: Document ids per ranking, best first.
+        top_k: Number of results to return.
+        k: Damping constant; larger values flatten the contribution of top ranks.
+
+    Returns:
+        Document ids and their fused scores, best first.
+    """
+    rankings = [ranking for ranking in rankings if len(ranking)]
+    if not rankings:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    ids = np.concatenate(rankings)
+    contributions = np.concatenate([1.0 / (k + np.arange(1, len(ranking) + 1)) for ranking in rankings])
+    docs, inverse = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+    best = select_top_k(scores, top_k)
+    return docs[best], scores[best]
@@ -0,0 +1,101 @@
+"""Embedding-based long-term recall of past conversation turns."""
+
+from collections import deque
+
+from ask_panda.models.base import BaseModel
+from ask_panda.tools.context_memory import Message
+from ask_panda.tools.vector_store import VectorStore
+
+
+class LongTermMemory:
+    """Per-conversation vector index of turns that left the recent window.
+
+    Archived turns are only queued; they are embedded together with the next
+    query in a single ``embed_batch`` call, so archiving adds no model round
+    trip of its own. The index is created on first use, sized to the model's
+    embedding dimension, and holds at most ``max_turns`` turns, dropping the
+    oldest first.
+    """
+
+    def __init__(self, model: BaseModel, top_k: int = 3, min_score: float = 0.3, max_turns: int = 1000) -> None:
+        """Initialize an empty long-term memory.
+
+        Args:
+            model: The model embedding turns and queries.
+            top_k: Number of past turns recalled per query.
+            min_score: Minimum cosine similarity of a recalled turn.
+            max_turns: Maximum number of archived turns.
+        """
+        self.model = model
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_turns = max_turns
+        self._pending: list[Message] = []
+        self._store: VectorStore | None = None
+        self._ids: deque[int] = deque()
+
+    def archive(self, message: Message) -> None:
+        """Queue a turn for the index.
+
+        Args:
+            message: The turn leaving the recent window.
+        """
+        self._pending.append(message)
+
+    def _index(self, messages: list[Message], embeddings: list[list[float]]) -> None:
+        """Add embedded turns to the index, dropping the oldest beyond the limit.
+
+        Args:
+            messages: The turns.
+            embeddings: Their embeddings.
+        """
+        if not messages:
+            return
+        if self._store is None:
+            self._store = VectorStore(embedding_dim=len(embeddings[0]), initial_capacity=64)
+        metadata = [{"role": message.role, "timestamp": message.timestamp} for message in messages]
+        self._ids.extend(self._store.add_documents([message.content for message in messages], metadata, embeddings))
+        while len(self._ids) > self.max_turns:
+            self._store.delete_document(self._ids.popleft())
+
+    async def recall(self, query: str) -> list[Message]:
+        """Archive the queued turns and find the past turns most relevant to a query.
+
+        Args:
+            query: The query, typically the newest user message.
+
+        Returns:
+            Up to ``top_k`` past turns scoring at least ``min_score``, oldest first.
+        """
+        pending, self._pending = self._pending, []
+        if not pending and self._store is None:
+            return []
+        try:
+            embeddings = await self.model.embed_batch([message.content for message in pending] + [query])
+        except BaseException:
+            self._pending[:0] = pending
+            raise
+        self._index(pending, embeddings[:-1])
+        if self._store is None:
+            return []
+        results = self._store.search(query, top_k=self.top_k, query_embedding=embeddings[-1])
+        recalled = [
+            Message(result["metadata"]["role"], result["content"], result["metadata"]["timestamp"])
+            for result in results
+            if result["score"] >= self.min_score
+        ]
+        recalled.sort(key=lambda message: message.timestamp)
+        return recalled
+
+    @property
+    def count(self) -> int:
+        """Get the number of archived turns, including queued ones."""
+        return len(self._ids) + len(self._pending)
+
+    def clear(self) -> None:
+        """Forget all archived turns and release the index."""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        self._ids.clear()
+        self._pending.clear()
@@ -0,0 +1,157 @@
+"""Inverted metadata index for filtered vector search."""
+
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+import numpy as np
+
+Scalar = str | int | float | bool
+ValueKey = tuple[bool, Scalar]
+
+
+def _value_key(value: Scalar) -> ValueKey:
+    """Build a posting key that keeps ``True`` and ``1`` apart.
+
+    Args:
+        value: The metadata value.
+
+    Returns:
+        The posting key.
+    """
+    return isinstance(value, bool), value
+
+
+def _scalars(value: Any) -> list[Scalar]:
+    """Get the indexable scalars of a metadata value.
+
+    Lists and tuples are multi-valued fields; other non-scalar values are not indexed.
+
+    Args:
+        value: The metadata value.
+
+    Returns:
+        The scalar values.
+    """
+    values = value if isinstance(value, list | tuple) else [value]
+    return [v for v in values if isinstance(v, Scalar)]
+
+
+class _Postings:
+    """Growable, sorted array of document ids."""
+
+    def __init__(self) -> None:
+        """Initialize an empty posting list."""
+        self._ids = np.zeros(4, dtype=np.int64)
+        self._size = 0
+
+    def append(self, doc_id: int) -> None:
+        """Append an id larger than every id already present.
+
+        Args:
+            doc_id: The document id.
+        """
+        if self._size == len(self._ids):
+            self._ids = np.concatenate([self._ids, np.zeros(len(self._ids), dtype=np.int64)])
+        self._ids[self._size] = doc_id
+        self._size += 1
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Get the sorted ids."""
+        return self._ids[:self._size]
+
+
+class MetadataIndex:
+    """Per-field inverted index from metadata values to sorted document ids.
+
+    Documents must be added in increasing id order, which keeps every posting
+    list sorted so lookups are plain sorted-array unions and intersections.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty index."""
+        self._fields: dict[str, dict[ValueKey, _Postings]] = {}
+        self.count = 0
+
+    def add(self, doc_id: int, metadata: Mapping[str, Any]) -> None:
+        """Index the metadata of the next document.
+
+        Args:
+            doc_id: The document id; must be at least :attr:`count`.
+            metadata: The document metadata.
+        """
+        for field, value in metadata.items():
+            postings = self._fields.setdefault(field, {})
+            for scalar in dict.fromkeys(_scalars(value)):
+                postings.setdefault(_value_key(scalar), _Postings()).append(doc_id)
+        self.count = doc_id + 1
+
+    def lookup(self, where: Mapping[str, Any]) -> np.ndarray:
+        """Find the documents matching every condition.
+
+        A condition value that is a list, tuple or set matches any of its
+        members; any other value must match exactly. For multi-valued fields a
+        document matches if any of its values does.
+
+        Args:
+            where: Field conditions, combined with AND.
+
+        Returns:
+            Sorted ids of matching documents.
+        """
+        result: np.ndarray | None = None
+        for field, wanted in sorted(where.items(), key=lambda item: self._estimate(*item)):
+            ids = self._field_ids(field, wanted)
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+            if not len(result):
+                break
+        return np.zeros(0, dtype=np.int64) if result is None else result
+
+    def _postings(self, field: str, wanted: Any) -> list[np.ndarray]:
+        """Get the posting lists selected by one condition.
+
+        Args:
+            field: The metadata field.
+            wanted: The wanted value or collection of values.
+
+        Returns:
+            The matching posting arrays.
+        """
+        postings = self._fields.get(field, {})
+        values: Iterable[Any] = wanted if isinstance(wanted, list | tuple | set | frozenset) else [wanted]
+        keys = [_value_key(v) for v in values if isinstance(v, Scalar)]
+        return [postings[key].ids for key in keys if key in postings]
+
+    def _estimate(self, field: str, wanted: Any) -> int:
+        """Estimate how many documents one condition matches.
+
+        Args:
+            field: The metadata field.
+            wanted: The wanted value or collection of values.
+
+        Returns:
+            Upper bound on the number of matches, used to intersect smallest first.
+        """
+        return sum(len(ids) for ids in self._postings(field, wanted))
+
+    def _field_ids(self, field: str, wanted: Any) -> np.ndarray:
+        """Get the sorted ids matching one condition.
+
+        Args:
+            field: The metadata field.
+            wanted: The wanted value or collection of values.
+
+        Returns:
+            Sorted ids of matching documents.
+        """
+        lists = self._postings(field, wanted)
+        if not lists:
+            return np.zeros(0, dtype=np.int64)
+        if len(lists) == 1:
+            return lists[0]
+        return np.unique(np.concatenate(lists))
+
+    def clear(self) -> None:
+        """Remove all postings."""
+        self._fields.clear()
+        self.count = 0
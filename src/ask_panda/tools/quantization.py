@@ -0,0 +1,258 @@
+"""Embedding quantizers for compressed candidate scans in the vector store."""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from ask_panda.tools.ann_index import assign_clusters, kmeans
+
+
+class Quantizer(ABC):
+    """Base class for embedding quantizers.
+
+    A quantizer compresses normalized embeddings into compact ``uint8`` codes
+    and scores codes against a query approximately. The vector store uses
+    these scores to shortlist candidates and rescores the shortlist with the
+    full-precision embeddings.
+    """
+
+    batch_size = 8192
+
+    @property
+    @abstractmethod
+    def is_trained(self) -> bool:
+        """Whether the quantizer can encode vectors."""
+        ...
+
+    @property
+    @abstractmethod
+    def code_size(self) -> int:
+        """Number of bytes per encoded vector."""
+        ...
+
+    @abstractmethod
+    def train(self, vectors: np.ndarray) -> None:
+        """Fit the quantizer to a set of vectors.
+
+        Args:
+            vectors: The ``(n, dim)`` normalized training vectors.
+        """
+        ...
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode vectors.
+
+        Args:
+            vectors: The ``(n, dim)`` normalized vectors.
+
+        Returns:
+            The ``(n, code_size)`` uint8 codes.
+        """
+        ...
+
+    @abstractmethod
+    def _score_batch(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Score one batch of codes.
+
+        Args:
+            codes: The ``(n, code_size)`` codes.
+            query: The normalized query vector.
+
+        Returns:
+            Approximate similarity scores.
+        """
+        ...
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate the similarity between a query and encoded vectors.
+
+        Codes are decoded in batches so temporary memory stays bounded.
+
+        Args:
+            codes: The ``(n, code_size)`` codes.
+            query: The normalized query vector.
+
+        Returns:
+            Approximate similarity scores.
+        """
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.batch_size):
+            scores[start:start + self.batch_size] = self._score_batch(codes[start:start + self.batch_size], query)
+        return scores
+
+
+class ScalarQuantizer(Quantizer):
+    """8-bit scalar quantizer with a per-dimension range.
+
+    Each dimension is mapped linearly onto 256 levels between its trained
+    minimum and maximum, cutting memory to a quarter of float32.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the scalar quantizer."""
+        self._offset: np.ndarray | None = None
+        self._scale: np.ndarray | None = None
+
+    @property
+    def is_trained(self) -> bool:
+        """Whether the per-dimension ranges have been fitted."""
+        return self._offset is not None
+
+    @property
+    def code_size(self) -> int:
+        """Number of bytes per encoded vector."""
+        return 0 if self._offset is None else len(self._offset)
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Fit the per-dimension ranges.
+
+        Args:
+            vectors: The ``(n, dim)`` normalized training vectors.
+        """
+        low = vectors.min(axis=0).astype(np.float32)
+        high = vectors.max(axis=0).astype(np.float32)
+        scale = (high - low) / 255.0
+        self._offset = low
+        self._scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode vectors as 8-bit levels.
+
+        Args:
+            vectors: The ``(n, dim)`` normalized vectors.
+
+        Returns:
+            The ``(n, dim)`` uint8 codes.
+
+        Raises:
+            RuntimeError: If the quantizer has not been trained.
+        """
+        if self._offset is None or self._scale is None:
+            raise RuntimeError("Scalar quantizer is not trained")
+        codes: np.ndarray = np.clip(np.rint((vectors - self._offset) / self._scale), 0, 255).astype(np.uint8)
+        return codes
+
+    def _score_batch(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Score codes as ``(code * scale + offset) . query``.
+
+        Args:
+            codes: The ``(n, dim)`` codes.
+            query: The normalized query vector.
+
+        Returns:
+            Approximate similarity scores.
+
+        Raises:
+            RuntimeError: If the quantizer has not been trained.
+        """
+        if self._offset is None or self._scale is None:
+            raise RuntimeError("Scalar quantizer is not trained")
+        scores: np.ndarray = codes.astype(np.float32) @ (self._scale * query) + float(self._offset @ query)
+        return scores
+
+
+class ProductQuantizer(Quantizer):
+    """Product quantizer with 256 centroids per subspace.
+
+    The embedding is split into ``num_subspaces`` contiguous slices, each
+    encoded as the index of its nearest k-means centroid, so a vector costs
+    ``num_subspaces`` bytes. Scoring uses one lookup table per query.
+    """
+
+    def __init__(self, num_subspaces: int = 96, kmeans_iterations: int = 15, max_train_samples: int = 50_000, seed: int = 0) -> None:
+        """Initialize the product quantizer.
+
+        Args:
+            num_subspaces: Number of subspaces; must divide the embedding dimension.
+            kmeans_iterations: Number of k-means iterations per subspace.
+            max_train_samples: Maximum number of vectors sampled for training.
+            seed: Seed for sampling and centroid initialization.
+        """
+        self.num_subspaces = num_subspaces
+        self.kmeans_iterations = kmeans_iterations
+        self.max_train_samples = max_train_samples
+        self.seed = seed
+        self._codebooks: np.ndarray | None = None
+
+    @property
+    def is_trained(self) -> bool:
+        """Whether the codebooks have been trained."""
+        return self._codebooks is not None
+
+    @property
+    def code_size(self) -> int:
+        """Number of bytes per encoded vector."""
+        return self.num_subspaces
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """Reshape vectors into their subspace slices.
+
+        Args:
+            vectors: The ``(n, dim)`` vectors.
+
+        Returns:
+            A ``(n, num_subspaces, dim / num_subspaces)`` view.
+
+        Raises:
+            ValueError: If the dimension is not divisible by the number of subspaces.
+        """
+        n, dim = vectors.shape
+        if dim % self.num_subspaces:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by {self.num_subspaces} subspaces")
+        return vectors.reshape(n, self.num_subspaces, dim // self.num_subspaces)
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Train one k-means codebook per subspace.
+
+        Args:
+            vectors: The ``(n, dim)`` normalized training vectors.
+        """
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), self.max_train_samples)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+        parts = self._split(sample)
+        ksub = min(256, sample_size)
+        self._codebooks = np.stack([
+            kmeans(np.ascontiguousarray(parts[:, m]), ksub, self.kmeans_iterations, rng, spherical=False)
+            for m in range(self.num_subspaces)
+        ])
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode vectors as one centroid index per subspace.
+
+        Args:
+            vectors: The ``(n, dim)`` normalized vectors.
+
+        Returns:
+            The ``(n, num_subspaces)`` uint8 codes.
+
+        Raises:
+            RuntimeError: If the quantizer has not been trained.
+        """
+        if self._codebooks is None:
+            raise RuntimeError("Product quantizer is not trained")
+        parts = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(vectors), self.num_subspaces), dtype=np.uint8)
+        for m, codebook in enumerate(self._codebooks):
+            codes[:, m] = assign_clusters(codebook, parts[:, m], spherical=False)
+        return codes
+
+    def _score_batch(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Score codes by summing per-subspace lookup-table entries.
+
+        Args:
+            codes: The ``(n, num_subspaces)`` codes.
+            query: The normalized query vector.
+
+        Returns:
+            Approximate similarity scores.
+
+        Raises:
+            RuntimeError: If the quantizer has not been trained.
+        """
+        if self._codebooks is None:
+            raise RuntimeError("Product quantizer is not trained")
+        table = np.einsum("mkd,md->mk", self._codebooks, self._split(query[None, :])[0])
+        scores: np.ndarray = table[np.arange(self.num_subspaces), codes].sum(axis=1)
+        return scores
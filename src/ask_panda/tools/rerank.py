@@ -0,0 +1,42 @@
+"""Diversity-aware re-ranking of retrieved documents."""
+
+import numpy as np
+
+
+def maximal_marginal_relevance(vectors: np.ndarray, relevance: np.ndarray, top_k: int, diversity: float) -> np.ndarray:
+    """Select a relevant but non-redundant subset of candidates.
+
+    Greedily picks the candidate maximizing
+    ``(1 - diversity) * relevance - diversity * max_similarity_to_selected``.
+    The candidate similarity matrix is computed in a single matrix product and
+    each greedy step is one vectorized update over all candidates.
+
+    Args:
+        vectors: ``(n, dim)`` normalized candidate embeddings.
+        relevance: Relevance score of each candidate, on a scale comparable to cosine similarity.
+        top_k: Number of candidates to select.
+        diversity: Trade-off between relevance (0.0) and novelty (1.0).
+
+    Returns:
+        Positions of the selected candidates, in selection order.
+
+    Raises:
+        ValueError: If ``diversity`` is outside ``[0, 1]``.
+    """
+    if not 0.0 <= diversity <= 1.0:
+        raise ValueError(f"Diversity must be between 0 and 1, got {diversity}")
+    count = min(top_k, len(vectors))
+    if count <= 0:
+        return np.zeros(0, dtype=np.int64)
+    similarity = vectors @ vectors.T
+    gain = (1.0 - diversity) * np.asarray(relevance, dtype=np.float32)
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    selected = np.zeros(count, dtype=np.int64)
+    available = np.ones(len(vectors), dtype=bool)
+    for step in range(count):
+        objective = np.where(available, gain - diversity * redundancy, -np.inf)
+        best = int(np.argmax(objective))
+        selected[step] = best
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
@@ -0,0 +1,127 @@
+"""Semantic cache of answers to paraphrased questions."""
+
+import time
+from collections.abc import Callable, Mapping
+from typing import Any
+
+from ask_panda.models.base import BaseModel
+from ask_panda.models.cache import normalize_text
+from ask_panda.tools.vector_store import VectorStore
+
+
+class SemanticCache:
+    """Answers keyed by question embeddings, matched by cosine similarity.
+
+    Questions are normalized (Unicode, whitespace and case) before they are
+    embedded. A lookup searches a small dedicated vector index restricted to
+    the same experiment and client type and returns the answer of the most
+    similar cached question, if its similarity reaches ``threshold`` and it
+    has not expired. Each client domain can have its own TTL, so volatile
+    answers (maintenance, status) expire quickly while documentation answers
+    live long. The index holds at most ``max_entries`` answers, dropping the
+    oldest first.
+    """
+
+    def __init__(
+        self,
+        model: BaseModel,
+        threshold: float = 0.92,
+        ttl: float = 3600.0,
+        ttls: Mapping[str, float] | None = None,
+        max_entries: int = 10_000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            model: The model embedding questions.
+            threshold: Minimum cosine similarity of a cached question to count as a hit.
+            ttl: Seconds an answer stays valid for client types without their own TTL.
+            ttls: Seconds an answer stays valid, per client type.
+            max_entries: Maximum number of cached answers.
+            clock: Clock returning seconds.
+        """
+        self.model = model
+        self.threshold = threshold
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._store: VectorStore | None = None
+        # Answers by index id, oldest first
+        self._answers: dict[int, tuple[Any, float]] = {}
+
+    async def embed(self, question: str) -> list[float]:
+        """Embed a normalized question.
+
+        Args:
+            question: The question.
+
+        Returns:
+            The embedding, for :meth:`get` and :meth:`put`.
+        """
+        return await self.model.embed(normalize_text(question).lower())
+
+    def get(self, embedding: list[float], experiment: str, client_type: str) -> Any | None:
+        """Look up the answer to the most similar cached question.
+
+        Args:
+            embedding: The question embedding.
+            experiment: The experiment name.
+            client_type: The client type answering the question.
+
+        Returns:
+            The cached answer, or None on a miss.
+        """
+        if self._store is not None:
+            now = self.clock()
+            where = {"experiment": experiment, "client_type": client_type}
+            for result in self._store.search("", top_k=4, query_embedding=embedding, where=where):
+                if result["score"] < self.threshold:
+                    break
+                answer, expires = self._answers[result["index"]]
+                if expires > now:
+                    self.hits += 1
+                    return answer
+                self._remove(result["index"])
+        self.misses += 1
+        return None
+
+    def put(self, embedding: list[float], experiment: str, client_type: str, answer: Any) -> None:
+        """Cache the answer to a question.
+
+        Args:
+            embedding: The question embedding.
+            experiment: The experiment name.
+            client_type: The client type that answered the question.
+            answer: The answer.
+        """
+        if self._store is None:
+            self._store = VectorStore(embedding_dim=len(embedding), initial_capacity=64)
+        doc_id = self._store.add_document("", {"experiment": experiment, "client_type": client_type}, embedding)
+        self._answers[doc_id] = (answer, self.clock() + self.ttls.get(client_type, self.ttl))
+        while len(self._answers) > self.max_entries:
+            self._remove(next(iter(self._answers)))
+
+    def _remove(self, doc_id: int) -> None:
+        """Drop a cached answer, if still present.
+
+        Args:
+            doc_id: The index id of the answer.
+        """
+        if self._answers.pop(doc_id, None) is not None and self._store is not None:
+            self._store.delete_document(doc_id)
+
+    @property
+    def count(self) -> int:
+        """Get the number of cached answers, including expired ones not yet dropped."""
+        return len(self._answers)
+
+    def clear(self) -> None:
+        """Drop all cached answers and release the index."""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        self._answers.clear()
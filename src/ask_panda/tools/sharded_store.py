@@ -0,0 +1,276 @@
+"""Multi-process, sharded search over a saved vector store."""
+
+import asyncio
+import multiprocessing
+import os
+from collections.abc import Mapping, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from ask_panda.tools.ann_index import select_top_k
+from ask_panda.tools.metadata_index import MetadataIndex
+from ask_panda.tools.vector_store_file import EMBEDDING_DTYPE, EMBEDDINGS_FILE, read_store
+
+ShardKey = tuple[str, int, int]
+
+# Per-worker cache of mapped embedding files, keyed by path and file identity.
+_MATRICES: dict[ShardKey, np.ndarray] = {}
+
+
+def _matrix(key: ShardKey, count: int, dim: int) -> np.ndarray:
+    """Map the embedding matrix of a saved store in a worker process.
+
+    Args:
+        key: Embeddings file path, inode and modification time.
+        count: Number of rows.
+        dim: Embedding dimension.
+
+    Returns:
+        The read-only embedding matrix.
+    """
+    matrix = _MATRICES.get(key)
+    if matrix is None:
+        # A re-saved store replaces the file, so stale mappings are dropped.
+        for stale in [k for k in _MATRICES if k[0] == key[0]]:
+            del _MATRICES[stale]
+        matrix = _MATRICES[key] = np.memmap(key[0], dtype=EMBEDDING_DTYPE, mode="r", shape=(count, dim))
+    return matrix
+
+
+def _search_shard(
+    key: ShardKey,
+    count: int,
+    dim: int,
+    start: int,
+    end: int,
+    query_vector: np.ndarray,
+    top_k: int,
+    rows: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Scan one shard of the embedding matrix.
+
+    Args:
+        key: Embeddings file path, inode and modification time.
+        count: Number of rows in the store.
+        dim: Embedding dimension.
+        start: First row of the shard.
+        end: End row of the shard, exclusive.
+        query_vector: The normalized query vector.
+        top_k: Number of results to return.
+        rows: Optional sorted rows within the shard to restrict the scan to.
+
+    Returns:
+        Row ids and their cosine scores, best match first.
+    """
+    matrix = _matrix(key, count, dim)
+    if rows is None:
+        scores = matrix[start:end] @ query_vector
+        best = select_top_k(scores, top_k)
+        return best + start, scores[best]
+    scores = matrix[rows] @ query_vector
+    best = select_top_k(scores, top_k)
+    return rows[best], scores[best]
+
+
+class ShardedVectorStore:
+    """Read-only vector store that spreads exact search over worker processes.
+
+    The store is opened from a directory written by :meth:`VectorStore.save`.
+    Its embedding matrix is split into contiguous row ranges; each query is
+    fanned out to one task per shard, every worker memory-maps the same file
+    (so the pages are shared through the OS page cache rather than copied)
+    and the partial top-k lists are merged in the calling process.
+
+    To change the corpus, update a :class:`VectorStore`, save it to the same
+    directory and call :meth:`reload`.
+    """
+
+    def __init__(self, path: str | Path, num_workers: int | None = None, num_shards: int | None = None) -> None:
+        """Open a saved store and start the worker processes.
+
+        Args:
+            path: The store directory.
+            num_workers: Number of worker processes; defaults to the CPU count.
+            num_shards: Number of row ranges per query; defaults to ``num_workers``.
+        """
+        self.path = Path(path)
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.num_shards = num_shards or self.num_workers
+        # Workers are spawned rather than forked so they never inherit the server's threads or event loop.
+        self._executor = ProcessPoolExecutor(self.num_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.reload()
+
+    def reload(self) -> None:
+        """Re-open the store directory, picking up a newly saved version."""
+        manifest, embeddings, ids, documents = read_store(self.path)
+        self.embedding_dim: int = manifest["embedding_dim"]
+        self._ids = ids
+        self._next_id: int = manifest["next_id"]
+        self._row_of: np.ndarray | None = None
+        self._documents = documents
+        self._metadata_index = MetadataIndex()
+        self._count = len(documents)
+        stat = (self.path / EMBEDDINGS_FILE).stat() if self._count else None
+        self._key: ShardKey = (str(self.path / EMBEDDINGS_FILE), stat.st_ino if stat else 0, stat.st_mtime_ns if stat else 0)
+        self._bounds = np.linspace(0, self._count, min(self.num_shards, max(self._count, 1)) + 1).astype(np.int64)
+
+    def _normalize(self, vector: Sequence[float] | np.ndarray) -> np.ndarray:
+        """Convert a query vector to a normalized float32 array.
+
+        Args:
+            vector: The query vector.
+
+        Returns:
+            The unit-length vector.
+
+        Raises:
+            ValueError: If the vector dimension does not match the store.
+        """
+        array = np.asarray(vector, dtype=np.float32).ravel()
+        if len(array) != self.embedding_dim:
+            raise ValueError(f"Expected embedding dimension {self.embedding_dim}, got {len(array)}")
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def filter(self, where: Mapping[str, Any]) -> np.ndarray:
+        """Find the rows whose metadata matches every condition.
+
+        Args:
+            where: Metadata conditions, see :meth:`VectorStore.search`.
+
+        Returns:
+            Sorted row indices of matching documents.
+        """
+        for row in range(self._metadata_index.count, self._count):
+            self._metadata_index.add(row, self._documents[row]["metadata"])
+        return self._metadata_index.lookup(where)
+
+    def _fan_out(
+        self, query_vector: np.ndarray, top_k: int, where: Mapping[str, Any] | None
+    ) -> list[Future[tuple[np.ndarray, np.ndarray]]]:
+        """Submit one scan task per non-empty shard.
+
+        Args:
+            query_vector: The normalized query vector.
+            top_k: Number of results per shard.
+            where: Optional metadata conditions.
+
+        Returns:
+            The pending shard results.
+        """
+        allowed = self.filter(where) if where else None
+        futures = []
+        for start, end in zip(self._bounds[:-1].tolist(), self._bounds[1:].tolist(), strict=True):
+            rows = None
+            if allowed is not None:
+                rows = allowed[np.searchsorted(allowed, start):np.searchsorted(allowed, end)]
+                if not len(rows):
+                    continue
+            futures.append(
+                self._executor.submit(
+                    _search_shard, self._key, self._count, self.embedding_dim, start, end, query_vector, top_k, rows
+                )
+            )
+        return futures
+
+    def _merge(self, partials: list[tuple[np.ndarray, np.ndarray]], top_k: int) -> list[dict[str, Any]]:
+        """Merge per-shard top-k lists into the final results.
+
+        Args:
+            partials: Row ids and scores from each shard.
+            top_k: Number of results to return.
+
+        Returns:
+            List of matching documents with scores, best match first.
+        """
+        if not partials:
+            return []
+        rows = np.concatenate([rows for rows, _ in partials])
+        scores = np.concatenate([scores for _, scores in partials])
+        best = select_top_k(scores, top_k)
+        results = []
+        for row, score in zip(rows[best].tolist(), scores[best].tolist(), strict=True):
+            doc = self._documents[row]
+            results.append({"index": int(self._ids[row]), "content": doc["content"], "metadata": doc["metadata"], "score": score})
+        return results
+
+    def search(
+        self,
+        query_embedding: Sequence[float] | np.ndarray,
+        top_k: int = 5,
+        where: Mapping[str, Any] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Search all shards in parallel by cosine similarity.
+
+        Args:
+            query_embedding: The query embedding.
+            top_k: Number of results to return.
+            where: Optional metadata conditions, see :meth:`VectorStore.search`.
+
+        Returns:
+            List of matching documents with scores, best match first.
+        """
+        if top_k <= 0 or self._count == 0:
+            return []
+        futures = self._fan_out(self._normalize(query_embedding), top_k, where)
+        return self._merge([future.result() for future in futures], top_k)
+
+    async def asearch(
+        self,
+        query_embedding: Sequence[float] | np.ndarray,
+        top_k: int = 5,
+        where: Mapping[str, Any] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Search all shards in parallel without blocking the event loop.
+
+        Cancelling the caller cancels the shard tasks that have not started yet.
+
+        Args:
+            query_embedding: The query embedding.
+            top_k: Number of results to return.
+            where: Optional metadata conditions, see :meth:`VectorStore.search`.
+
+        Returns:
+            List of matching documents with scores, best match first.
+        """
+        if top_k <= 0 or self._count == 0:
+            return []
+        futures = self._fan_out(self._normalize(query_embedding), top_k, where)
+        partials = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        return self._merge(list(partials), top_k)
+
+    def get_document(self, doc_id: int) -> dict[str, Any] | None:
+        """Get a document by id.
+
+        Args:
+            doc_id: The document id.
+
+        Returns:
+            The document entry or None if not found.
+        """
+        if self._row_of is None:
+            self._row_of = np.full(self._next_id, -1, dtype=np.int64)
+            self._row_of[self._ids] = np.arange(self._count)
+        if 0 <= doc_id < self._next_id and self._row_of[doc_id] >= 0:
+            return self._documents[int(self._row_of[doc_id])]
+        return None
+
+    @property
+    def count(self) -> int:
+        """Get the number of documents in the store."""
+        return self._count
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> "ShardedVectorStore":
+        """Use the store as a context manager."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Shut down the workers on exit."""
+        self.close()
@@ -1,98 +1,977 @@
 """Vector store for document embeddings and similarity search."""
 
-from typing import Any
+import asyncio
+import copy
+import threading
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Literal
+
+import numpy as np
+
+from ask_panda.tools.ann_index import VectorIndex, select_top_k
+from ask_panda.tools.dedup import SimHashDeduplicator
+from ask_panda.tools.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from ask_panda.tools.metadata_index import MetadataIndex
+from ask_panda.tools.quantization import Quantizer
+from ask_panda.tools.rerank import maximal_marginal_relevance
+from ask_panda.tools.vector_store_file import DocumentTable, read_store, write_store
+
+ArrayLike = Sequence[float] | np.ndarray
+SearchMode = Literal["vector", "lexical", "hybrid"]
+
+
+def _grow(array: np.ndarray, size: int, needed: int) -> np.ndarray:
+    """Return an array with room for ``needed`` writable rows.
+
+    Capacity doubles until it fits; a read-only (memory-mapped) array is
+    copied into private memory even when it is large enough.
+
+    Args:
+        array: The current array.
+        size: Number of rows in use.
+        needed: Number of rows required.
+
+    Returns:
+        The same array if it already fits, otherwise a larger copy.
+    """
+    capacity = array.shape[0]
+    if needed <= capacity and array.flags.writeable:
+        return array
+    capacity = max(capacity, 1)
+    while capacity < needed:
+        capacity *= 2
+    grown = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+    grown[:size] = array[:size]
+    return grown
+
+
+class _Snapshot:
+    """The arrays a search scans, captured under the store lock.
+
+    Writes only ever append past ``size``, swap in new arrays or flip alive
+    flags, so the captured rows stay valid while the lock is released.
+    Likewise a quantizer is retrained as a new object and swapped in, so a
+    scan keeps scoring its codes with the quantizer they were encoded by.
+    """
+
+    __slots__ = ("alive", "codes", "documents", "matrix", "row_ids", "size")
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        codes: np.ndarray,
+        alive: np.ndarray | None,
+        row_ids: np.ndarray,
+        documents: DocumentTable,
+        size: int,
+    ) -> None:
+        """Initialize the snapshot.
+
+        Args:
+            matrix: The embedding matrix.
+            codes: The quantized codes.
+            alive: A private copy of the alive flags, or None if no row is tombstoned.
+            row_ids: The document id of every row.
+            documents: The document table.
+            size: Number of rows in use.
+        """
+        self.matrix = matrix
+        self.codes = codes
+        self.alive = alive
+        self.row_ids = row_ids
+        self.documents = documents
+        self.size = size
+
+    def live(self, rows: np.ndarray) -> np.ndarray:
+        """Drop tombstoned rows.
+
+        Args:
+            rows: Row indices.
+
+        Returns:
+            The live rows, in the same order.
+        """
+        return rows if self.alive is None else rows[self.alive[rows]]
+
+    def vector_search(
+        self, query_vector: np.ndarray, candidates: np.ndarray | None, top_k: int, quantizer: Quantizer | None, rescore_factor: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Rank candidates by cosine similarity.
+
+        Args:
+            query_vector: The normalized query vector.
+            candidates: Candidate row ids, or None for all rows.
+            top_k: Number of results to return.
+            quantizer: Trained quantizer to shortlist candidates with, if any.
+            rescore_factor: Shortlist size, as a multiple of ``top_k``.
+
+        Returns:
+            Row ids and their cosine scores, best match first.
+        """
+        if quantizer is not None:
+            candidates = self.shortlist(quantizer, query_vector, candidates, top_k * rescore_factor)
+        return self.score(query_vector, candidates, top_k)
+
+    def shortlist(self, quantizer: Quantizer, query_vector: np.ndarray, candidates: np.ndarray | None, size: int) -> np.ndarray:
+        """Narrow candidates using the quantized codes.
+
+        Args:
+            quantizer: The trained quantizer.
+            query_vector: The normalized query vector.
+            candidates: Candidate row ids, or None for all rows.
+            size: Number of rows to keep.
+
+        Returns:
+            The shortlisted row ids.
+        """
+        codes = self.codes[:self.size] if candidates is None else self.codes[candidates]
+        scores = quantizer.score(codes, query_vector)
+        if candidates is None and self.alive is not None:
+            scores[~self.alive] = -np.inf
+        best = select_top_k(scores, size)
+        return self.live(best) if candidates is None else candidates[best]
+
+    def score(self, query_vector: np.ndarray, candidates: np.ndarray | None, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Score candidates at full precision and keep the best.
+
+        Args:
+            query_vector: The normalized query vector.
+            candidates: Candidate row ids, or None for all rows.
+            top_k: Number of results to keep.
+
+        Returns:
+            Row ids and their cosine scores, best match first.
+        """
+        if candidates is None:
+            scores = self.matrix[:self.size] @ query_vector
+            if self.alive is not None:
+                scores[~self.alive] = -np.inf
+            best = self.live(select_top_k(scores, top_k))
+            return best, scores[best]
+        scores = self.matrix[candidates] @ query_vector
+        best = select_top_k(scores, top_k)
+        return candidates[best], scores[best]
+
+    def result(self, row: int, score: float) -> dict[str, Any]:
+        """Build a search result entry.
+
+        Args:
+            row: The row index.
+            score: The similarity score.
+
+        Returns:
+            The search result dictionary.
+        """
+        doc = self.documents[row]
+        return {
+            "index": int(self.row_ids[row]),
+            "content": doc["content"],
+            "metadata": doc["metadata"],
+            "score": score,
+        }
 
 
 class VectorStore:
-    """Simple in-memory vector store for document embeddings."""
+    """In-memory vector store backed by a contiguous float32 embedding matrix.
+
+    Embeddings are L2-normalized on insert, so cosine similarity reduces to a
+    single matrix-vector product at query time. The matrix grows geometrically
+    to keep appends amortized O(1).
+
+    An optional :class:`VectorIndex` narrows each query to a candidate set,
+    and an optional :class:`Quantizer` scans candidates through compact codes
+    and rescores only a shortlist with the full-precision embeddings. When
+    the store is opened memory-mapped, those full-precision rows stay on disk
+    until a shortlist touches them.
+
+    A BM25 :class:`LexicalIndex` over the document texts backs lexical and
+    hybrid search, where both rankings are merged by reciprocal rank fusion.
+
+    Every document gets a stable id that survives updates, compaction and
+    saving. Updates and deletes only tombstone the old row, so they never copy
+    the matrix; once the tombstoned fraction passes ``compaction_threshold`` a
+    background thread rewrites the live rows and swaps them in.
+
+    With a :class:`SimHashDeduplicator`, documents that are near-duplicates
+    of a stored document are skipped on insert and counted in
+    :attr:`duplicates_skipped`.
+
+    :meth:`asearch` and :meth:`aadd_documents` run the same work on a small,
+    per-store thread pool so callers inside an event loop are never blocked
+    by the NumPy compute, which releases the GIL. Searches hold the store
+    lock only to probe the indexes and capture the arrays; the scans run on
+    that snapshot, so concurrent searches and writes do not wait for them.
+    """
 
-    def __init__(self, embedding_dim: int = 1536) -> None:
+    fusion_depth = 50
+
+    def __init__(
+        self,
+        embedding_dim: int = 1536,
+        initial_capacity: int = 1024,
+        index: VectorIndex | None = None,
+        quantizer: Quantizer | None = None,
+        rescore_factor: int = 4,
+        compaction_threshold: float | None = 0.25,
+        max_workers: int = 4,
+        deduplicator: SimHashDeduplicator | None = None,
+    ) -> None:
         """Initialize the vector store.
 
         Args:
             embedding_dim: Dimension of the embeddings.
+            initial_capacity: Number of rows to preallocate for the embedding matrix.
+            index: Optional approximate search index, see :meth:`build_index`.
+            quantizer: Optional embedding quantizer, see :meth:`build_index`.
+            rescore_factor: Shortlist size, as a multiple of ``top_k``, rescored at full precision.
+            compaction_threshold: Fraction of tombstoned rows that triggers a background
+                :meth:`compact`, or None to only compact on demand.
+            max_workers: Size of the thread pool used by the async methods.
+            deduplicator: Optional near-duplicate detector applied by :meth:`add_documents`.
         """
         self.embedding_dim = embedding_dim
-        self._documents: list[dict[str, Any]] = []
-        self._embeddings: list[list[float]] = []
+        self.index = index
+        self.quantizer = quantizer
+        self.rescore_factor = rescore_factor
+        self.compaction_threshold = compaction_threshold
+        self.max_workers = max_workers
+        self.deduplicator = deduplicator
+        self.duplicates_skipped = 0
+        self._documents = DocumentTable()
+        self._metadata_index = MetadataIndex()
+        self._lexical_index = LexicalIndex()
+        self._matrix = np.zeros((max(initial_capacity, 1), embedding_dim), dtype=np.float32)
+        self._codes = np.zeros((0, 0), dtype=np.uint8)
+        self._coded = 0
+        self._row_ids = np.zeros(max(initial_capacity, 1), dtype=np.int64)
+        self._alive = np.zeros(max(initial_capacity, 1), dtype=bool)
+        self._row_of: np.ndarray | None = np.zeros(0, dtype=np.int64)
+        self._size = 0
+        self._dead = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+        self._compaction: threading.Thread | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._deduplicator_synced = True
+        # Whether build_index was called while the store was too small for the index
+        self._index_pending = False
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Get a view of the normalized embeddings currently stored."""
+        return self._matrix[:self._size]
+
+    def _normalize(self, vectors: ArrayLike | Sequence[ArrayLike]) -> np.ndarray:
+        """Convert vectors to a normalized float32 matrix.
+
+        Args:
+            vectors: A single vector or a sequence of vectors.
+
+        Returns:
+            A 2-D float32 array of unit-length rows (zero rows are left as zero).
+
+        Raises:
+            ValueError: If the vector dimension does not match the store.
+        """
+        matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+        if matrix.shape[1] != self.embedding_dim:
+            raise ValueError(f"Expected embedding dimension {self.embedding_dim}, got {matrix.shape[1]}")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def _append(self, ids: np.ndarray, vectors: np.ndarray) -> int:
+        """Append normalized vectors as live rows.
+
+        Args:
+            ids: Document id of each vector.
+            vectors: 2-D array of normalized vectors.
+
+        Returns:
+            The row index of the first appended vector.
+        """
+        start, end = self._size, self._size + len(vectors)
+        self._matrix = _grow(self._matrix, start, end)
+        self._matrix[start:end] = vectors
+        self._row_ids = _grow(self._row_ids, start, end)
+        self._row_ids[start:end] = ids
+        self._alive = _grow(self._alive, start, end)
+        self._alive[start:end] = True
+        if self._row_of is not None:
+            if len(self._row_of) < self._next_id:
+                missing = max(self._next_id, 2 * len(self._row_of)) - len(self._row_of)
+                self._row_of = np.concatenate([self._row_of, np.full(missing, -1, dtype=np.int64)])
+            self._row_of[ids] = np.arange(start, end)
+        self._size = end
+        self._encode_missing()
+        if self.index is not None:
+            if self.index.is_built:
+                self.index.add(start, vectors)
+            elif self._index_pending and end >= self.index.min_train_size:
+                self.index.build(self.embeddings)
+                self._index_pending = not self.index.is_built
+        return start
+
+    def _encode_missing(self) -> bool:
+        """Encode the rows that have no quantized code yet.
+
+        Rows lack codes when they were added before the quantizer was trained
+        elsewhere, or when a trained quantizer is given to :meth:`open`.
+
+        Returns:
+            Whether every row has a code, i.e. whether the quantizer is trained.
+        """
+        if self.quantizer is None or not self.quantizer.is_trained:
+            return False
+        if self._coded < self._size:
+            codes = self.quantizer.encode(self._matrix[self._coded:self._size])
+            if self._coded == 0:
+                self._codes = codes
+            else:
+                self._codes = _grow(self._codes, self._coded, self._size)
+                self._codes[self._coded:self._size] = codes
+            self._coded = self._size
+        return True
+
+    def _rows_by_id(self) -> np.ndarray:
+        """Get the id-to-row lookup, building it on first use after :meth:`open`.
+
+        Returns:
+            Row of every document id, or -1 for deleted ids.
+        """
+        if self._row_of is None:
+            row_of = np.full(self._next_id, -1, dtype=np.int64)
+            live = np.flatnonzero(self._alive[:self._size])
+            row_of[self._row_ids[live]] = live
+            self._row_of = row_of
+        return self._row_of
+
+    def _row(self, doc_id: int) -> int:
+        """Get the row currently holding a document.
+
+        Args:
+            doc_id: The document id.
+
+        Returns:
+            The row index, or -1 if there is no such document.
+        """
+        row_of = self._rows_by_id()
+        return int(row_of[doc_id]) if 0 <= doc_id < self._next_id and doc_id < len(row_of) else -1
+
+    def _tombstone(self, row: int) -> None:
+        """Mark a row as deleted.
+
+        Args:
+            row: The row index.
+        """
+        self._alive[row] = False
+        self._dead += 1
+        if self._row_of is not None:
+            self._row_of[self._row_ids[row]] = -1
+
+    def _live(self, rows: np.ndarray) -> np.ndarray:
+        """Drop tombstoned rows.
+
+        Args:
+            rows: Row indices.
+
+        Returns:
+            The live rows, in the same order.
+        """
+        return rows[self._alive[rows]] if self._dead else rows
 
-    def add_document(self, document: str, metadata: dict[str, Any] | None = None) -> int:
+    def add_document(self, document: str, metadata: dict[str, Any] | None = None, embedding: ArrayLike | None = None) -> int:
         """Add a document to the store.
 
         Args:
             document: The document text.
             metadata: Optional metadata for the document.
+            embedding: Optional embedding vector. Documents without one are stored as a zero vector.
 
         Returns:
-            The index of the added document.
+            The id of the added document.
         """
-        doc_entry = {
-            "content": document,
-            "metadata": metadata or {},
-        }
-        self._documents.append(doc_entry)
-        # Placeholder: In real implementation, would compute embedding
-        self._embeddings.append([0.0] * self.embedding_dim)
-        return len(self._documents) - 1
+        return self.add_documents([document], [metadata or {}], None if embedding is None else [embedding])[0]
 
-    def add_documents(self, documents: list[str], metadata_list: list[dict[str, Any]] | None = None) -> list[int]:
+    def add_documents(
+        self,
+        documents: list[str],
+        metadata_list: list[dict[str, Any]] | None = None,
+        embeddings: Sequence[ArrayLike] | np.ndarray | None = None,
+    ) -> list[int]:
         """Add multiple documents to the store.
 
         Args:
             documents: List of document texts.
             metadata_list: Optional list of metadata for each document.
+            embeddings: Optional embedding vectors, one per document.
 
         Returns:
-            List of indices of the added documents.
+            List of ids of the added documents. A document skipped as a
+            near-duplicate gets the id of the document it duplicates.
+
+        Raises:
+            ValueError: If the number of embeddings does not match the number of documents.
         """
+        if not documents:
+            return []
         metadata_list = metadata_list or [{}] * len(documents)
-        indices = []
-        for doc, metadata in zip(documents, metadata_list, strict=True):
-            idx = self.add_document(doc, metadata)
-            indices.append(idx)
-        return indices
+        vectors = np.zeros((len(documents), self.embedding_dim), dtype=np.float32) if embeddings is None else self._normalize(embeddings)
+        if len(vectors) != len(documents):
+            raise ValueError(f"Got {len(vectors)} embeddings for {len(documents)} documents")
+        signatures = None if self.deduplicator is None else [self.deduplicator.signature(doc) for doc in documents]
+
+        with self._lock:
+            if signatures is None:
+                ids = np.arange(self._next_id, self._next_id + len(documents))
+                keep = np.arange(len(documents))
+            else:
+                ids, keep = self._deduplicate(signatures)
+            self._next_id += len(keep)
+            for position in keep.tolist():
+                self._documents.append({"content": documents[position], "metadata": metadata_list[position] or {}})
+            if len(keep):
+                self._append(ids[keep], vectors[keep])
+        return ids.tolist()
+
+    def _deduplicate(self, signatures: list[int]) -> tuple[np.ndarray, np.ndarray]:
+        """Assign ids to new documents, mapping near-duplicates to existing ids.
+
+        Args:
+            signatures: SimHash signature of each new document.
+
+        Returns:
+            The id of every document, and the positions of the documents to insert.
+        """
+        deduplicator = self._synced_deduplicator()
+        ids = np.zeros(len(signatures), dtype=np.int64)
+        keep: list[int] = []
+        for position, signature in enumerate(signatures):
+            duplicate = deduplicator.find(signature)
+            if duplicate is None:
+                ids[position] = self._next_id + len(keep)
+                deduplicator.add(int(ids[position]), signature)
+                keep.append(position)
+            else:
+                ids[position] = duplicate
+                self.duplicates_skipped += 1
+        return ids, np.array(keep, dtype=np.int64)
+
+    def _synced_deduplicator(self) -> SimHashDeduplicator:
+        """Get the deduplicator, signing the stored documents if it has not seen them.
+
+        Returns:
+            The deduplicator.
+        """
+        if self.deduplicator is None:
+            raise RuntimeError("No deduplicator configured for this vector store")
+        if not self._deduplicator_synced:
+            # Stores opened from disk are signed once, on first use.
+            for row in np.flatnonzero(self._alive[:self._size]).tolist():
+                signature = self.deduplicator.signature(self._documents[row]["content"])
+                self.deduplicator.add(int(self._row_ids[row]), signature)
+            self._deduplicator_synced = True
+        return self.deduplicator
 
-    def search(self, query: str, top_k: int = 5) -> list[dict[str, Any]]:
+    def find_duplicate(self, document: str) -> int | None:
+        """Find a stored near-duplicate of a document.
+
+        Args:
+            document: The document text.
+
+        Returns:
+            The id of the stored near-duplicate, or None if there is none or
+            the store has no deduplicator.
+        """
+        if self.deduplicator is None:
+            return None
+        signature = self.deduplicator.signature(document)
+        with self._lock:
+            return self._synced_deduplicator().find(signature)
+
+    def update_document(
+        self, doc_id: int, document: str, metadata: dict[str, Any] | None = None, embedding: ArrayLike | None = None
+    ) -> None:
+        """Replace a document, keeping its id.
+
+        The old row is tombstoned and the new version appended, so the
+        embedding matrix is never copied or shifted.
+
+        Args:
+            doc_id: The document id.
+            document: The new document text.
+            metadata: The new metadata.
+            embedding: The new embedding vector. Documents without one are stored as a zero vector.
+
+        Raises:
+            ValueError: If there is no document with this id.
+        """
+        vectors = np.zeros((1, self.embedding_dim), dtype=np.float32) if embedding is None else self._normalize(embedding)
+        with self._lock:
+            row = self._row(doc_id)
+            if row < 0:
+                raise ValueError(f"Document {doc_id} not found")
+            self._tombstone(row)
+            self._documents.append({"content": document, "metadata": metadata or {}})
+            self._append(np.array([doc_id]), vectors)
+            if self.deduplicator is not None and self._deduplicator_synced:
+                self.deduplicator.add(doc_id, self.deduplicator.signature(document))
+        self._maybe_compact()
+
+    def delete_document(self, doc_id: int) -> None:
+        """Delete a document.
+
+        Args:
+            doc_id: The document id.
+
+        Raises:
+            ValueError: If there is no document with this id.
+        """
+        with self._lock:
+            row = self._row(doc_id)
+            if row < 0:
+                raise ValueError(f"Document {doc_id} not found")
+            self._tombstone(row)
+            if self.deduplicator is not None:
+                self.deduplicator.remove(doc_id)
+        self._maybe_compact()
+
+    def build_index(self) -> None:
+        """Build the approximate search structures over the current embeddings.
+
+        Trains the quantizer and encodes every row, then builds the index.
+        The quantizer is trained as a copy that replaces ``quantizer``, so
+        searches already running and other stores sharing the old one are not
+        affected. Indexes decline to build for stores smaller than their
+        ``min_train_size``; candidate selection then stays exact until enough
+        documents have been added, at which point the index is built
+        automatically. Documents added afterwards are encoded and indexed
+        incrementally.
+
+        Raises:
+            RuntimeError: If the store has neither an index nor a quantizer configured.
+        """
+        if self.index is None and self.quantizer is None:
+            raise RuntimeError("No index or quantizer configured for this vector store")
+        with self._lock:
+            if self.quantizer is not None and self._size:
+                quantizer = copy.copy(self.quantizer)
+                quantizer.train(self.embeddings)
+                self.quantizer, self._codes, self._coded = quantizer, quantizer.encode(self.embeddings), self._size
+            if self.index is not None:
+                self.index.build(self.embeddings)
+                self._index_pending = not self.index.is_built
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        query_embedding: ArrayLike | None = None,
+        exact: bool = False,
+        where: Mapping[str, Any] | None = None,
+        mode: SearchMode = "vector",
+        diversity: float = 0.0,
+        **search_params: Any,
+    ) -> list[dict[str, Any]]:
         """Search for similar documents.
 
         Args:
             query: The search query.
             top_k: Number of results to return.
+            query_embedding: Precomputed embedding of the query. Without one, vector
+                search scores every document 0.0 and results follow insertion order,
+                and hybrid search falls back to lexical ranking.
+            exact: Score every embedding at full precision, bypassing the index and quantizer.
+            where: Metadata conditions, e.g. ``{"experiment": "atlas", "release": ["24.0", "25.0"]}``.
+                Lists match any member; conditions are combined with AND. Only
+                matching documents are scored.
+            mode: ``"vector"`` for cosine similarity, ``"lexical"`` for BM25 over the
+                document texts, or ``"hybrid"`` to fuse both rankings. Lexical and
+                hybrid scores are BM25 and fused reciprocal-rank scores respectively.
+            diversity: Re-rank the best ``fusion_depth`` matches with maximal marginal
+                relevance, trading relevance (0.0) for novelty (1.0) so near-identical
+                documents are not all returned. Scores stay the ranking scores.
+            **search_params: Index-specific parameters such as ``nprobe``.
+
+        Returns:
+            List of matching documents with scores, best match first. The
+            ``index`` of each result is the document id.
+
+        Raises:
+            ValueError: If the mode or the diversity is invalid.
+        """
+        if mode not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"Unknown search mode: {mode}")
+        query_vector = candidates = lexical = None
+        with self._lock:
+            if top_k <= 0 or self._size == self._dead:
+                return []
+            allowed = self._filter_rows(where) if where else None
+            pool = max(top_k, self.fusion_depth) if diversity else top_k
+            depth = pool if mode == "vector" else max(pool, self.fusion_depth)
+            quantizer = None
+
+            if mode == "lexical" or (mode == "hybrid" and query_embedding is None):
+                rows, scores = self._lexical_search(query, pool, allowed)
+            elif query_embedding is None:
+                rows = np.flatnonzero(self._alive[:self._size])[:pool] if allowed is None else allowed[:pool]
+                scores = np.zeros(len(rows), dtype=np.float32)
+            else:
+                query_vector = self._normalize(query_embedding)[0]
+                candidates = self._vector_candidates(query_vector, depth, allowed, exact, **search_params)
+                if not exact and self._encode_missing():
+                    quantizer = self.quantizer
+                if mode == "hybrid":
+                    lexical, _ = self._lexical_search(query, depth, allowed)
+            snapshot = self._snapshot()
+
+        if query_vector is not None:
+            rows, scores = snapshot.vector_search(query_vector, candidates, depth, quantizer, self.rescore_factor)
+            if lexical is not None:
+                rows, scores = reciprocal_rank_fusion([rows, lexical], pool)
+        if diversity and len(rows):
+            relevance = scores if mode == "vector" else scores / (scores[0] or 1.0)
+            selected = maximal_marginal_relevance(snapshot.matrix[rows], relevance, top_k, diversity)
+            rows, scores = rows[selected], scores[selected]
+        return [snapshot.result(int(row), float(score)) for row, score in zip(rows, scores, strict=True)]
+
+    async def asearch(
+        self,
+        query: str,
+        top_k: int = 5,
+        query_embedding: ArrayLike | None = None,
+        exact: bool = False,
+        where: Mapping[str, Any] | None = None,
+        mode: SearchMode = "vector",
+        diversity: float = 0.0,
+        **search_params: Any,
+    ) -> list[dict[str, Any]]:
+        """Search for similar documents without blocking the event loop.
+
+        The search runs on the store's thread pool, so at most ``max_workers``
+        searches compute at once and the rest wait in the pool's queue.
+        Cancelling the caller drops a queued search; one that is already
+        running finishes in the background and its result is discarded.
+
+        Args:
+            query: The search query.
+            top_k: Number of results to return.
+            query_embedding: Precomputed embedding of the query.
+            exact: Score every embedding at full precision.
+            where: Metadata conditions.
+            mode: ``"vector"``, ``"lexical"`` or ``"hybrid"``.
+            diversity: Maximal marginal relevance trade-off, see :meth:`search`.
+            **search_params: Index-specific parameters such as ``nprobe``.
 
         Returns:
-            List of matching documents with scores.
+            List of matching documents with scores, best match first, see :meth:`search`.
         """
-        # Placeholder: In real implementation, would compute query embedding
-        # and perform similarity search
-        results = []
-        for i, doc in enumerate(self._documents[:top_k]):
-            results.append({
-                "index": i,
-                "content": doc["content"],
-                "metadata": doc["metadata"],
-                "score": 0.5,  # Placeholder score
-            })
+        search = partial(self.search, query, top_k, query_embedding, exact, where, mode, diversity, **search_params)
+        results: list[dict[str, Any]] = await self._run(search)
         return results
 
-    def get_document(self, index: int) -> dict[str, Any] | None:
-        """Get a document by index.
+    async def aadd_documents(
+        self,
+        documents: list[str],
+        metadata_list: list[dict[str, Any]] | None = None,
+        embeddings: Sequence[ArrayLike] | np.ndarray | None = None,
+    ) -> list[int]:
+        """Add multiple documents without blocking the event loop.
+
+        Normalization, quantization and index assignment run on the store's
+        thread pool; see :meth:`add_documents`.
 
         Args:
-            index: The document index.
+            documents: List of document texts.
+            metadata_list: Optional list of metadata for each document.
+            embeddings: Optional embedding vectors, one per document.
+
+        Returns:
+            List of ids of the added documents.
+        """
+        ids: list[int] = await self._run(partial(self.add_documents, documents, metadata_list, embeddings))
+        return ids
+
+    async def _run(self, func: partial[Any]) -> Any:
+        """Run a call on the store's thread pool.
+
+        Args:
+            func: The call to run.
+
+        Returns:
+            The result of the call.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="vector-store")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func)
+
+    def _vector_candidates(
+        self, query_vector: np.ndarray, top_k: int, allowed: np.ndarray | None, exact: bool, **search_params: Any
+    ) -> np.ndarray | None:
+        """Narrow a vector search to the rows worth scoring.
+
+        Args:
+            query_vector: The normalized query vector.
+            top_k: Number of results to return.
+            allowed: Optional sorted ids the results are restricted to.
+            exact: Bypass the index.
+            **search_params: Index-specific search parameters.
+
+        Returns:
+            Candidate row ids, or None for all rows.
+        """
+        candidates = allowed
+        if self.index is not None and self.index.is_built and not exact:
+            candidates = self._live(self.index.candidates(query_vector, **search_params))
+            if allowed is not None:
+                candidates = np.intersect1d(candidates, allowed)
+                # A selective filter can miss the probed lists; score the filtered set directly instead.
+                if len(candidates) < top_k:
+                    candidates = allowed
+        return candidates
+
+    def _snapshot(self) -> _Snapshot:
+        """Capture the arrays a search scans; the caller holds the lock.
+
+        Returns:
+            The snapshot.
+        """
+        alive = self._alive[:self._size].copy() if self._dead else None
+        return _Snapshot(self._matrix, self._codes, alive, self._row_ids, self._documents, self._size)
+
+    def _lexical_search(self, query: str, top_k: int, allowed: np.ndarray | None) -> tuple[np.ndarray, np.ndarray]:
+        """Rank documents by BM25 score.
+
+        The lexical index is brought up to date lazily, so stores that never
+        run lexical queries never tokenize their documents.
+
+        Args:
+            query: The query text.
+            top_k: Number of results to return.
+            allowed: Optional sorted ids the results are restricted to.
+
+        Returns:
+            Row ids and their BM25 scores, best match first.
+        """
+        for row in range(self._lexical_index.count, self._size):
+            self._lexical_index.add(row, self._documents[row]["content"])
+        mask = self._alive[:self._size] if self._dead else None
+        return self._lexical_index.search(query, top_k, allowed, mask)
+
+    def filter(self, where: Mapping[str, Any]) -> np.ndarray:
+        """Find the documents whose metadata matches every condition.
+
+        The inverted metadata index is brought up to date lazily, so opening a
+        saved store does not decode any metadata until the first filter.
+
+        Args:
+            where: Metadata conditions, see :meth:`search`.
+
+        Returns:
+            Sorted ids of matching documents.
+        """
+        with self._lock:
+            return np.sort(self._row_ids[self._filter_rows(where)])
+
+    def _filter_rows(self, where: Mapping[str, Any]) -> np.ndarray:
+        """Find the live rows whose metadata matches every condition.
+
+        Args:
+            where: Metadata conditions, see :meth:`search`.
+
+        Returns:
+            Sorted indices of matching rows.
+        """
+        for row in range(self._metadata_index.count, self._size):
+            self._metadata_index.add(row, self._documents[row]["metadata"])
+        return self._live(self._metadata_index.lookup(where))
+
+    def _maybe_compact(self) -> None:
+        """Start a background compaction once enough rows are tombstoned."""
+        with self._lock:
+            if self.compaction_threshold is None or self._dead <= self.compaction_threshold * self._size:
+                return
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            self._compaction = threading.Thread(target=self.compact, name="vector-store-compaction", daemon=True)
+            self._compaction.start()
+
+    def wait_for_compaction(self, timeout: float | None = None) -> None:
+        """Wait for a running background compaction to finish.
+
+        Args:
+            timeout: Maximum number of seconds to wait.
+        """
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join(timeout)
+
+    def compact(self) -> None:
+        """Rewrite the store without its tombstoned rows.
+
+        The live rows are copied and the metadata and lexical indexes rebuilt
+        from a snapshot without holding the lock, so searches and writes carry
+        on meanwhile. The lock is then taken once to carry over rows appended
+        or deleted since the snapshot, renumber the search index and swap the
+        new arrays in. Document ids are unaffected.
+        """
+        with self._lock:
+            if not self._dead:
+                return
+            size = self._size
+            keep = np.flatnonzero(self._alive[:size])
+            matrix, row_ids, documents = self._matrix, self._row_ids, self._documents
+            build_metadata, build_lexical = self._metadata_index.count > 0, self._lexical_index.count > 0
+
+        kept = len(keep)
+        new_matrix = matrix[keep]
+        new_row_ids = row_ids[keep]
+        new_documents = documents.take(keep)
+        metadata_index, lexical_index = MetadataIndex(), LexicalIndex(self._lexical_index.k1, self._lexical_index.b)
+        for row in range(kept) if build_metadata or build_lexical else ():
+            doc = new_documents[row]
+            if build_metadata:
+                metadata_index.add(row, doc["metadata"])
+            if build_lexical:
+                lexical_index.add(row, doc["content"])
+
+        with self._lock:
+            if self._documents is not documents:
+                # Cleared while compacting; the snapshot is stale.
+                return
+            end = self._size
+            total = kept + end - size
+            mapping = np.full(end, -1, dtype=np.int64)
+            mapping[keep] = np.arange(kept)
+            mapping[size:end] = np.arange(kept, total)
+            alive = np.ones(total, dtype=bool)
+            alive[:kept] = self._alive[keep]
+            alive[kept:] = self._alive[size:end]
+
+            new_matrix = _grow(new_matrix, kept, total)
+            new_matrix[kept:total] = self._matrix[size:end]
+            new_codes, coded = self._codes, 0
+            if self._coded >= end:
+                # Codes are copied here rather than from the snapshot in case build_index re-encoded them.
+                new_codes, coded = _grow(new_codes[keep], kept, total), total
+                new_codes[kept:total] = self._codes[size:end]
+            new_row_ids = _grow(new_row_ids, kept, total)
+            new_row_ids[kept:total] = self._row_ids[size:end]
+            for row in range(size, end):
+                new_documents.append(self._documents[row])
+            if self.index is not None and self.index.is_built:
+                self.index.remap(mapping, new_matrix[:total])
+
+            self._matrix, self._codes, self._row_ids, self._documents = new_matrix, new_codes, new_row_ids, new_documents
+            self._coded = coded
+            self._alive = alive
+            self._metadata_index, self._lexical_index = metadata_index, lexical_index
+            self._size = total
+            self._dead = int(total - np.count_nonzero(alive))
+            self._row_of = None
+
+    def save(self, path: str | Path) -> None:
+        """Save the live documents of the store to a directory.
+
+        Args:
+            path: The target directory. It is created if needed.
+        """
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size])
+            write_store(path, self._matrix, self._documents, self._row_ids, rows, self._next_id)
+
+    @classmethod
+    def open(
+        cls,
+        path: str | Path,
+        mmap: bool = True,
+        index: VectorIndex | None = None,
+        quantizer: Quantizer | None = None,
+        deduplicator: SimHashDeduplicator | None = None,
+    ) -> "VectorStore":
+        """Open a store saved with :meth:`save`.
+
+        With ``mmap`` the embedding matrix and document blobs are mapped
+        read-only: opening costs the same regardless of corpus size, and
+        several worker processes share the same physical pages. Adding
+        documents afterwards copies the matrix into private memory.
+
+        Args:
+            path: The store directory.
+            mmap: Whether to memory-map the files instead of reading them.
+            index: Optional approximate search index; call :meth:`build_index` to train it.
+            quantizer: Optional embedding quantizer; call :meth:`build_index` to train it.
+            deduplicator: Optional near-duplicate detector; stored documents are signed on the first insert.
+
+        Returns:
+            The opened vector store.
+        """
+        manifest, embeddings, ids, documents = read_store(path, use_mmap=mmap)
+        store = cls(
+            embedding_dim=manifest["embedding_dim"],
+            initial_capacity=1,
+            index=index,
+            quantizer=quantizer,
+            deduplicator=deduplicator,
+        )
+        store._matrix = embeddings
+        store._row_ids = ids
+        store._alive = np.ones(len(ids), dtype=bool)
+        store._row_of = None
+        store._documents = documents
+        store._size = len(documents)
+        store._next_id = manifest["next_id"]
+        store._deduplicator_synced = store._size == 0
+        return store
+
+    def get_document(self, doc_id: int) -> dict[str, Any] | None:
+        """Get a document by id.
+
+        Args:
+            doc_id: The document id.
 
         Returns:
             The document entry or None if not found.
         """
-        if 0 <= index < len(self._documents):
-            return self._documents[index]
-        return None
+        with self._lock:
+            row = self._row(doc_id)
+            return self._documents[row] if row >= 0 else None
 
     def clear(self) -> None:
-        """Clear all documents from the store."""
-        self._documents.clear()
-        self._embeddings.clear()
+        """Clear all documents from the store.
+
+        Ids of removed documents are not reused. The arrays are replaced
+        rather than overwritten, so searches already running are not affected.
+        """
+        with self._lock:
+            capacity = len(self._row_ids)
+            self._matrix = np.zeros((capacity, self.embedding_dim), dtype=np.float32)
+            self._codes = np.zeros((0, 0), dtype=np.uint8)
+            self._row_ids = np.zeros(capacity, dtype=np.int64)
+            self._alive = np.zeros(capacity, dtype=bool)
+            self._documents = DocumentTable()
+            self._metadata_index.clear()
+            self._lexical_index.clear()
+            self._size = 0
+            self._dead = 0
+            self._coded = 0
+            self._row_of = np.full(self._next_id, -1, dtype=np.int64)
+            if self.index is not None:
+                self.index.reset()
+            if self.deduplicator is not None:
+                self.deduplicator.clear()
+                self._deduplicator_synced = True
 
     @property
     def count(self) -> int:
         """Get the number of documents in the store."""
-        return len(self._documents)
+        return self._size - self._dead
+
+    def close(self) -> None:
+        """Shut down the thread pool used by the async methods, if started."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,298 @@
+"""On-disk format and document table for the vector store.
+
+A saved store is a directory holding:
+
+* ``manifest.json`` - format name, version, embedding dimension, row count and next document id.
+* ``embeddings.f32`` - the normalized embedding matrix as raw little-endian float32 rows.
+* ``ids.i64`` - the stable document id of each row as little-endian int64 (since version 2).
+* ``offsets.i64`` - ``(count + 1, 2)`` little-endian int64 byte offsets into the two blobs below.
+* ``content.bin`` - concatenated UTF-8 document texts.
+* ``metadata.bin`` - concatenated compact JSON metadata objects.
+
+All files are plain arrays or blobs so they can be mapped read-only and shared
+between processes; nothing is decoded until a document is actually requested.
+"""
+
+import json
+import mmap
+import os
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+FORMAT_NAME = "ask-panda-vector-store"
+FORMAT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+IDS_FILE = "ids.i64"
+OFFSETS_FILE = "offsets.i64"
+CONTENT_FILE = "content.bin"
+METADATA_FILE = "metadata.bin"
+
+EMBEDDING_DTYPE = np.dtype("<f4")
+OFFSET_DTYPE = np.dtype("<i8")
+ID_DTYPE = np.dtype("<i8")
+
+
+def _encode_metadata(metadata: dict[str, Any]) -> bytes:
+    """Encode metadata as compact JSON.
+
+    Args:
+        metadata: The metadata dictionary.
+
+    Returns:
+        The UTF-8 encoded JSON.
+    """
+    return json.dumps(metadata, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _map_blob(path: Path, use_mmap: bool) -> bytes | mmap.mmap:
+    """Open a blob file either as a read-only mapping or fully in memory.
+
+    Args:
+        path: Path to the blob file.
+        use_mmap: Whether to memory-map the file.
+
+    Returns:
+        A bytes-like view of the file content.
+    """
+    if not use_mmap or path.stat().st_size == 0:
+        return path.read_bytes()
+    with path.open("rb") as handle:
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class DocumentTable:
+    """Sequence of document entries, optionally backed by saved blob files.
+
+    Documents loaded from disk are decoded on access; documents added
+    afterwards are kept as regular dictionaries. :meth:`take` selects a
+    subset without decoding or copying the saved blobs.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty table."""
+        self._offsets: np.ndarray = np.zeros((1, 2), dtype=OFFSET_DTYPE)
+        self._content: bytes | mmap.mmap = b""
+        self._metadata: bytes | mmap.mmap = b""
+        self._positions: np.ndarray | None = None
+        self._base = 0
+        self._appended: list[dict[str, Any]] = []
+
+    @classmethod
+    def attach(cls, offsets: np.ndarray, content: bytes | mmap.mmap, metadata: bytes | mmap.mmap) -> "DocumentTable":
+        """Create a table over saved blobs.
+
+        Args:
+            offsets: ``(count + 1, 2)`` array of content and metadata byte offsets.
+            content: The content blob.
+            metadata: The metadata blob.
+
+        Returns:
+            The document table.
+        """
+        table = cls()
+        table._offsets = offsets
+        table._content = content
+        table._metadata = metadata
+        table._base = len(offsets) - 1
+        return table
+
+    def __len__(self) -> int:
+        """Get the number of documents."""
+        return self._base + len(self._appended)
+
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        """Get a document entry by index.
+
+        Args:
+            index: The document index.
+
+        Returns:
+            The document entry with ``content`` and ``metadata`` keys.
+        """
+        if index >= self._base:
+            return self._appended[index - self._base]
+        content, metadata = self.encoded(index)
+        return {"content": content.decode("utf-8"), "metadata": json.loads(metadata)}
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        """Iterate over document entries."""
+        for index in range(len(self)):
+            yield self[index]
+
+    def encoded(self, index: int) -> tuple[bytes, bytes]:
+        """Get the encoded content and metadata of a document.
+
+        Args:
+            index: The document index.
+
+        Returns:
+            The UTF-8 content and JSON metadata bytes.
+        """
+        if index >= self._base:
+            doc = self._appended[index - self._base]
+            return doc["content"].encode("utf-8"), _encode_metadata(doc["metadata"])
+        position = index if self._positions is None else int(self._positions[index])
+        (c_start, m_start), (c_end, m_end) = self._offsets[position], self._offsets[position + 1]
+        return bytes(self._content[c_start:c_end]), bytes(self._metadata[m_start:m_end])
+
+    def take(self, rows: np.ndarray) -> "DocumentTable":
+        """Select documents by index into a new table.
+
+        The new table shares the saved blobs; only the selected positions and
+        the appended entries are copied.
+
+        Args:
+            rows: Sorted indices of the documents to keep.
+
+        Returns:
+            A table holding the selected documents in order.
+        """
+        table = DocumentTable()
+        table._offsets, table._content, table._metadata = self._offsets, self._content, self._metadata
+        saved = rows[rows < self._base]
+        table._positions = saved if self._positions is None else self._positions[saved]
+        table._base = len(saved)
+        table._appended = [self._appended[row - self._base] for row in rows[rows >= self._base].tolist()]
+        return table
+
+    def append(self, document: dict[str, Any]) -> None:
+        """Append a document entry.
+
+        Args:
+            document: The document entry.
+        """
+        self._appended.append(document)
+
+    def clear(self) -> None:
+        """Remove all documents and detach from any saved blobs."""
+        self._offsets = np.zeros((1, 2), dtype=OFFSET_DTYPE)
+        self._content = b""
+        self._metadata = b""
+        self._positions = None
+        self._base = 0
+        self._appended.clear()
+
+
+def _tmp(path: Path) -> Path:
+    """Get the temporary path used while writing a file.
+
+    Args:
+        path: The final file path.
+
+    Returns:
+        The temporary file path.
+    """
+    return path.with_name(path.name + ".tmp")
+
+
+def write_store(
+    path: str | Path,
+    embeddings: np.ndarray,
+    documents: DocumentTable,
+    ids: np.ndarray,
+    rows: np.ndarray,
+    next_id: int,
+    batch_size: int = 65_536,
+) -> None:
+    """Write selected rows of a vector store to a directory.
+
+    Documents are streamed to the blob files and embeddings are copied in
+    batches, and every file is written under a temporary name and renamed into
+    place. The manifest is renamed last, so a new directory only becomes
+    openable once every other file is complete.
+
+    Args:
+        path: The target directory.
+        embeddings: The normalized embedding matrix.
+        documents: The documents, aligned with the embedding rows.
+        ids: The stable document id of each row.
+        rows: Sorted indices of the rows to write.
+        next_id: The next document id the store will assign.
+        batch_size: Number of embedding rows copied at a time.
+    """
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    count, dim = len(rows), embeddings.shape[1]
+
+    offsets = np.zeros((count + 1, 2), dtype=OFFSET_DTYPE)
+    with _tmp(directory / CONTENT_FILE).open("wb") as content_out, _tmp(directory / METADATA_FILE).open("wb") as metadata_out:
+        for position, row in enumerate(rows.tolist()):
+            content, metadata = documents.encoded(row)
+            content_out.write(content)
+            metadata_out.write(metadata)
+            offsets[position + 1] = offsets[position] + (len(content), len(metadata))
+    with _tmp(directory / EMBEDDINGS_FILE).open("wb") as embeddings_out:
+        for start in range(0, count, batch_size):
+            np.ascontiguousarray(embeddings[rows[start:start + batch_size]], dtype=EMBEDDING_DTYPE).tofile(embeddings_out)
+    np.asarray(ids[rows], dtype=ID_DTYPE).tofile(_tmp(directory / IDS_FILE))
+    offsets.tofile(_tmp(directory / OFFSETS_FILE))
+    manifest = {"format": FORMAT_NAME, "version": FORMAT_VERSION, "embedding_dim": dim, "count": count, "next_id": next_id}
+    _tmp(directory / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    for name in (CONTENT_FILE, METADATA_FILE, EMBEDDINGS_FILE, IDS_FILE, OFFSETS_FILE, MANIFEST_FILE):
+        os.replace(_tmp(directory / name), directory / name)
+
+
+def read_manifest(path: str | Path) -> dict[str, Any]:
+    """Read and validate the manifest of a saved store.
+
+    Args:
+        path: The store directory.
+
+    Returns:
+        The manifest dictionary.
+
+    Raises:
+        ValueError: If the directory does not hold a supported store.
+    """
+    manifest: dict[str, Any] = json.loads((Path(path) / MANIFEST_FILE).read_text(encoding="utf-8"))
+    if manifest.get("format") != FORMAT_NAME:
+        raise ValueError(f"Not a vector store: {path}")
+    if manifest.get("version") not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unsupported vector store version {manifest.get('version')} (expected one of {SUPPORTED_VERSIONS})")
+    # Version 1 stores predate stable ids: every row's id is its position.
+    manifest.setdefault("next_id", manifest["count"])
+    return manifest
+
+
+def read_store(path: str | Path, use_mmap: bool = True) -> tuple[dict[str, Any], np.ndarray, np.ndarray, DocumentTable]:
+    """Open a saved vector store.
+
+    With ``use_mmap`` the embedding matrix, ids and blobs are mapped
+    read-only, so opening is O(1) in the corpus size and pages are shared
+    between processes.
+
+    Args:
+        path: The store directory.
+        use_mmap: Whether to memory-map the files instead of reading them.
+
+    Returns:
+        The manifest, the embedding matrix, the row ids and the document table.
+    """
+    directory = Path(path)
+    manifest = read_manifest(directory)
+    count, dim = manifest["count"], manifest["embedding_dim"]
+
+    if count == 0:
+        return manifest, np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=np.int64), DocumentTable()
+
+    def load(name: str, dtype: np.dtype, shape: tuple[int, ...]) -> np.ndarray:
+        if use_mmap:
+            return np.memmap(directory / name, dtype=dtype, mode="r", shape=shape)
+        return np.fromfile(directory / name, dtype=dtype).reshape(shape)
+
+    embeddings = load(EMBEDDINGS_FILE, EMBEDDING_DTYPE, (count, dim))
+    offsets = load(OFFSETS_FILE, OFFSET_DTYPE, (count + 1, 2))
+    ids = load(IDS_FILE, ID_DTYPE, (count,)) if manifest["version"] >= 2 else np.arange(count, dtype=np.int64)
+    documents = DocumentTable.attach(
+        offsets,
+        _map_blob(directory / CONTENT_FILE, use_mmap),
+        _map_blob(directory / METADATA_FILE, use_mmap),
+    )
+    return manifest, embeddings, ids, documents
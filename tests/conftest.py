@@ -0,0 +1,66 @@
+"""Shared test fixtures and fakes."""
+
+import asyncio
+from collections.abc import AsyncGenerator
+from typing import Any
+
+from ask_panda.config.schemas import ModelConfig
+from ask_panda.models.base import BaseModel
+
+
+class FakeModel(BaseModel):
+    """Model that numbers its responses, embeds text as a bag of characters and records every call."""
+
+    def __init__(self, dim: int = 8, model_name: str = "fake") -> None:
+        """Initialize the fake model.
+
+        Args:
+            dim: Dimension of the embeddings.
+            model_name: Name of the model, part of embedding cache keys.
+        """
+        super().__init__(ModelConfig(model_name=model_name))
+        self.dim = dim
+        self.embedded: list[str] = []
+        self.generated = 0
+        self.batch_calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate(self, messages: list[dict[str, str]], **kwargs: Any) -> str:
+        """Return a numbered response."""
+        self.generated += 1
+        return f"response {self.generated}"
+
+    async def generate_stream(self, messages: list[dict[str, str]], **kwargs: Any) -> AsyncGenerator[str, None]:
+        """Stream a numbered response."""
+        yield await self.generate(messages, **kwargs)
+
+    async def embed(self, text: str) -> list[float]:
+        """Embed text as character counts modulo the dimension."""
+        self.embedded.append(text)
+        return embed_characters(text, self.dim)
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Embed a batch while tracking concurrency."""
+        self.batch_calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return [await self.embed(text) for text in texts]
+
+
+def embed_characters(text: str, dim: int = 8) -> list[float]:
+    """Embed text the way FakeModel does, without recording a call.
+
+    Args:
+        text: The text to embed.
+        dim: Dimension of the embedding.
+
+    Returns:
+        The character counts modulo the dimension.
+    """
+    vector = [0.0] * dim
+    for char in text:
+        vector[ord(char) % dim] += 1.0
+    return vector
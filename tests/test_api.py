@@ -1,9 +1,16 @@
 """Tests for API routes."""
 
+import asyncio
+from typing import Any
+
 import pytest
 from fastapi.testclient import TestClient
 
+from ask_panda import server
 from ask_panda.api.app import create_app
+from ask_panda.config.schemas import AgentConfig, ExperimentConfig, ModelConfig
+
+from .conftest import FakeModel
 
 
 @pytest.fixture
@@ -104,3 +111,124 @@ class TestExperimentsEndpoint:
         """Test getting non-existent experiment."""
         response = client.get("/api/v1/experiments/unknown")
         assert response.status_code == 404
+
+
+class EchoAgent:
+    """Agent stub that counts the messages of each conversation."""
+
+    def __init__(self) -> None:
+        """Initialize the stub."""
+        self.turns: dict[str, int] = {}
+
+    async def chat(self, message: str, conversation_id: str | None = None) -> str:
+        """Answer with the turn number of the conversation."""
+        assert conversation_id is not None
+        self.turns[conversation_id] = self.turns.get(conversation_id, 0) + 1
+        return f"{message} #{self.turns[conversation_id]}"
+
+    def close(self) -> None:
+        """Release nothing."""
+
+
+class TestChatWithAgent:
+    """Tests for the chat endpoint backed by an agent."""
+
+    def test_conversation_id_is_passed_to_agent(self) -> None:
+        """Test that messages are routed to their conversation."""
+        client = TestClient(create_app(agent=EchoAgent()))
+        for expected in ["Hi #1", "Hi #2"]:
+            response = client.post("/api/v1/chat", json={"message": "Hi", "conversation_id": "test-123"})
+            assert response.json()["message"] == expected
+        response = client.post("/api/v1/chat", json={"message": "Hi"})
+        assert response.json()["message"] == "Hi #1"
+
+
+class TestServerMain:
+    """Tests for the server entry point."""
+
+    def test_main_serves_an_agent(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that the shipped server answers chat requests with a real agent for the chosen experiment."""
+        served: list[Any] = []
+        monkeypatch.setattr(server.uvicorn, "run", lambda app, **kwargs: served.append(app))
+        monkeypatch.setattr("sys.argv", ["ask-panda-server", "--experiment", "epic"])
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        server.main()
+        agent = served[0].state.agent
+        assert isinstance(agent, server.Agent) and agent.config.experiment.name == "epic"
+        agent.close()
+
+    def test_main_without_credentials_serves_placeholders(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that the server still starts, with placeholder answers, when no model credentials are set."""
+        served: list[Any] = []
+        monkeypatch.setattr(server.uvicorn, "run", lambda app, **kwargs: served.append(app))
+        monkeypatch.setattr("sys.argv", ["ask-panda-server"])
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+        monkeypatch.delenv("API_KEY", raising=False)
+        server.main()
+        assert served[0].state.agent is None
+        response = TestClient(served[0]).post("/api/v1/chat", json={"message": "Hi"})
+        assert response.json()["message"] == "I understand you're asking about: Hi"
+
+
+class TestAgentSemanticCache:
+    """Tests for the semantic answer cache of the agent."""
+
+    def _agent(self, monkeypatch: pytest.MonkeyPatch) -> server.Agent:
+        """Create an agent with a semantic cache, a fake model and clients echoing the query."""
+        config = AgentConfig(experiment=ExperimentConfig(name="atlas"), model=ModelConfig(api_key="test-key"), semantic_cache=True)
+        agent = server.Agent(config)
+        assert agent.answer_cache is not None
+        agent.model = agent.answer_cache.model = FakeModel(dim=64)
+
+        async def route_query(query: str, client_type: str | None = None) -> dict[str, Any]:
+            return {"query": query}
+
+        monkeypatch.setattr(agent.client_selector, "route_query", route_query)
+        return agent
+
+    async def test_only_opening_turns_are_shared(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that answers depending on a conversation's history are neither served nor shared."""
+        agent = self._agent(monkeypatch)
+        assert agent.answer_cache is not None
+        question = "What does error 1305 mean?"
+        assert (await agent.query(question, conversation_id="a"))["response"] == "response 1"
+        paraphrase = await agent.query("what does  error 1305 mean?", conversation_id="b")
+        assert paraphrase["response"] == "response 1" and paraphrase["cached"]
+        follow_up = await agent.query(question, conversation_id="a")
+        assert follow_up["response"] == "response 2" and "cached" not in follow_up
+        assert (await agent.query(question, conversation_id="c"))["response"] == "response 1"
+        assert agent.answer_cache.count == 1
+        agent.close()
+
+    async def test_calls_without_conversation_are_shared(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that repeated calls without a conversation id are answered from the cache."""
+        agent = self._agent(monkeypatch)
+        assert agent.answer_cache is not None
+        results = [await agent.query("What does error 1305 mean?") for _ in range(3)]
+        assert [result["response"] for result in results] == ["response 1"] * 3
+        assert [result.get("cached", False) for result in results] == [False, True, True]
+        agent.close()
+
+
+class TestAgentConcurrency:
+    """Tests for concurrent calls to the agent."""
+
+    async def test_calls_without_conversation_run_concurrently(self) -> None:
+        """Test that calls without a conversation id neither wait for each other nor share history."""
+        agent = server.Agent(AgentConfig(experiment=ExperimentConfig(name="atlas"), model=ModelConfig(api_key="test-key")))
+        both_started = asyncio.Event()
+        prompts: list[list[dict[str, str]]] = []
+
+        class RendezvousModel(FakeModel):
+            async def generate(self, messages: list[dict[str, str]], **kwargs: Any) -> str:
+                prompts.append(messages)
+                if len(prompts) == 2:
+                    both_started.set()
+                await both_started.wait()
+                return await super().generate(messages, **kwargs)
+
+        agent.model = RendezvousModel()
+        replies = await asyncio.wait_for(asyncio.gather(agent.chat("first"), agent.chat("second")), timeout=1.0)
+        assert sorted(replies) == ["response 1", "response 2"]
+        assert [len(prompt) for prompt in prompts] == [2, 2]
+        agent.close()
@@ -1,6 +1,9 @@
 """Tests for clients."""
 
+import asyncio
+from typing import Any
 
+from ask_panda.clients.base import BaseClient
 from ask_panda.clients.selection import ClientSelector
 from ask_panda.config.schemas import ClientConfig
 
@@ -76,3 +79,43 @@ class TestClientSelector:
         selector = ClientSelector(config)
         client_type = selector.select_client_type("Is there any maintenance scheduled?")
         assert client_type == "maintenance"
+
+
+class SlowClient(BaseClient):
+    """Client that counts the queries reaching the service."""
+
+    def __init__(self) -> None:
+        """Initialize the client."""
+        super().__init__(base_url="http://localhost")
+        self.queries = 0
+
+    async def query(self, query: str, **kwargs: Any) -> dict[str, Any]:
+        """Answer after yielding to other tasks."""
+        self.queries += 1
+        await asyncio.sleep(0.01)
+        return {"query": query, **kwargs}
+
+
+class TestRouteQueryCoalescing:
+    """Tests for request coalescing in ClientSelector."""
+
+    async def test_identical_queries_share_one_call(self) -> None:
+        """Test that identical concurrent queries reach the service once."""
+        selector = ClientSelector(ClientConfig())
+        client = SlowClient()
+        selector._clients["maintenance"] = client
+        results = await asyncio.gather(
+            *(selector.route_query("status of CERN-PROD") for _ in range(4)),
+            selector.route_query("status of CERN-PROD", client_type="maintenance", site="CERN"),
+        )
+        assert results[0] is results[3]
+        assert results[4] == {"query": "status of CERN-PROD", "site": "CERN"}
+        assert client.queries == 2
+
+    async def test_coalescing_disabled(self) -> None:
+        """Test that every query reaches the service when coalescing is off."""
+        selector = ClientSelector(ClientConfig(coalesce_requests=False))
+        client = SlowClient()
+        selector._clients["maintenance"] = client
+        await asyncio.gather(*(selector.route_query("status", client_type="maintenance") for _ in range(3)))
+        assert client.queries == 3
@@ -115,3 +115,10 @@ class TestAgentConfig:
         assert config.experiment.name == "verarubin"
         assert config.server.port == 9000
         assert config.system_prompt == "Custom prompt"
+
+    def test_summary_threshold_below_memory_budget(self) -> None:
+        """Test that summarizing must start before the memory budget trims turns."""
+        config = AgentConfig(experiment=ExperimentConfig(name="atlas"), memory_max_tokens=8000, summary_threshold=5000)
+        assert config.summary_threshold == 5000
+        with pytest.raises(ValidationError):
+            AgentConfig(experiment=ExperimentConfig(name="atlas"), summary_threshold=5000)
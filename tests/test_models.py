@@ -0,0 +1,151 @@
+"""Tests for model backends and wrappers."""
+
+import asyncio
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+from ask_panda.models.cache import CachedModel, EmbeddingCache, ResponseCache, normalize_text
+
+from .conftest import FakeModel, embed_characters
+
+
+class TestEmbeddingCache:
+    """Tests for EmbeddingCache and CachedModel embeddings."""
+
+    def test_normalize_text(self) -> None:
+        """Test that whitespace and Unicode forms are normalized."""
+        assert normalize_text("  job\n\tfailed  ") == "job failed"
+        assert normalize_text("cafe\u0301") == normalize_text("caf\u00e9")
+
+    async def test_embed_cached(self) -> None:
+        """Test that repeated texts are embedded once."""
+        model = FakeModel()
+        cached = CachedModel(model)
+        first = await cached.embed("What does error 1305 mean?")
+        second = await cached.embed("What  does error 1305 mean? ")
+        assert first == second == embed_characters("What does error 1305 mean?")
+        assert model.embedded == ["What does error 1305 mean?"]
+        assert cached.embedding_cache.stats() == {"hits": 1, "disk_hits": 0, "misses": 1, "size": 1}
+
+    async def test_embed_batch_only_misses(self) -> None:
+        """Test that batches only embed uncached, distinct texts."""
+        model = FakeModel()
+        cached = CachedModel(model)
+        await cached.embed("a")
+        vectors = await cached.embed_batch(["a", "bb", "bb", "ccc"])
+        assert vectors == [embed_characters(text) for text in ["a", "bb", "bb", "ccc"]]
+        assert model.embedded == ["a", "bb", "ccc"]
+
+    def test_lru_eviction(self) -> None:
+        """Test that the memory tier evicts the least recently used entry."""
+        cache = EmbeddingCache(max_entries=2)
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        assert cache.get("a") is not None
+        cache.put("c", [3.0])
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+
+    async def test_disk_tier(self, tmp_path: Path) -> None:
+        """Test that the SQLite tier survives a restart and serves batches in one lookup."""
+        path = tmp_path / "embeddings.sqlite"
+        first = CachedModel(FakeModel(), EmbeddingCache(path=path))
+        await first.embed("site CERN-PROD")
+        first.embedding_cache.close()
+
+        model = FakeModel()
+        second = CachedModel(model, EmbeddingCache(path=path))
+        assert await second.embed_batch(["site CERN-PROD", "site BNL"]) == [embed_characters("site CERN-PROD"), embed_characters("site BNL")]
+        assert model.embedded == ["site BNL"]
+        assert second.embedding_cache.stats() == {"hits": 0, "disk_hits": 1, "misses": 1, "size": 2}
+        found = second.embedding_cache.get_many([EmbeddingCache.key("fake", "site BNL"), "unknown"])
+        assert list(found.values())[0] is not None and found["unknown"] is None
+
+    async def test_generate_passthrough(self) -> None:
+        """Test that generation is delegated to the wrapped model."""
+        model = FakeModel()
+        cached = CachedModel(model)
+        assert await cached.generate([{"role": "user", "content": "hi"}]) == "response 1"
+        assert [chunk async for chunk in cached.generate_stream([{"role": "user", "content": "hi"}])] == ["response 2"]
+        assert cached.embedding_model == "fake"
+
+
+class TestResponseCache:
+    """Tests for ResponseCache and response caching in CachedModel."""
+
+    QUESTION = [{"role": "user", "content": "what does error 1305 mean"}]
+
+    def test_key_is_canonical(self) -> None:
+        """Test that the key depends on the request, not on dict ordering."""
+        key = ResponseCache.key("gpt-4", [{"role": "user", "content": "hi"}], 0, 100)
+        assert key == ResponseCache.key("gpt-4", [{"content": "hi", "role": "user"}], 0.0, 100)
+        assert key != ResponseCache.key("gpt-4", [{"role": "user", "content": "hi"}], 0, 200)
+        assert key != ResponseCache.key("gpt-3.5", [{"role": "user", "content": "hi"}], 0, 100)
+
+    async def test_generate_cached(self) -> None:
+        """Test that repeated deterministic requests are served from the cache."""
+        model = FakeModel()
+        cached = CachedModel(model, response_cache=ResponseCache())
+        assert await cached.generate(self.QUESTION, temperature=0) == "response 1"
+        assert await cached.generate(self.QUESTION, temperature=0) == "response 1"
+        assert [chunk async for chunk in cached.generate_stream(self.QUESTION, temperature=0)] == ["response 1"]
+        assert await cached.generate(self.QUESTION, temperature=0, max_tokens=10) == "response 2"
+        assert model.generated == 2
+        assert cached.response_cache is not None and cached.response_cache.hits == 2
+
+    async def test_sampled_requests_bypass(self) -> None:
+        """Test that non-zero temperature bypasses the cache unless allowed."""
+        model = FakeModel()
+        cached = CachedModel(model, response_cache=ResponseCache())
+        await cached.generate(self.QUESTION)
+        assert await cached.generate(self.QUESTION) == "response 2"
+        assert cached.response_cache is not None and cached.response_cache.bypasses == 2
+        sampled = CachedModel(model, response_cache=ResponseCache(cache_sampled=True))
+        await sampled.generate(self.QUESTION)
+        assert await sampled.generate(self.QUESTION) == "response 3"
+
+    async def test_ttl_and_disk_tier(self, tmp_path: Path) -> None:
+        """Test expiry and that responses survive a restart through the disk tier."""
+        now = [0.0]
+        path = tmp_path / "responses.db"
+        cache = ResponseCache(max_entries=1, ttl=60.0, path=path, clock=lambda: now[0])
+        key = ResponseCache.key("fake", self.QUESTION, 0, 4096)
+        cache.put(key, "answer")
+        cache.put("other", "evicts the first entry from memory")
+        assert cache.get(key) == "answer" and cache.disk_hits == 1
+        cache.close()
+        model = FakeModel()
+        restarted = CachedModel(model, response_cache=ResponseCache(ttl=60.0, path=path, clock=lambda: now[0]))
+        assert await restarted.generate(self.QUESTION, temperature=0) == "answer"
+        now[0] = 61.0
+        assert await restarted.generate(self.QUESTION, temperature=0) == "response 1"
+        # Pruning expired responses on every write uses the index instead of scanning the table
+        reader = sqlite3.connect(str(path))
+        plan = reader.execute("EXPLAIN QUERY PLAN DELETE FROM responses WHERE created < 0").fetchall()
+        reader.close()
+        assert "responses_by_created" in str(plan)
+
+
+class SlowModel(FakeModel):
+    """Fake model whose generation takes a moment."""
+
+    async def generate(self, messages: list[dict[str, str]], **kwargs: Any) -> str:
+        """Return a numbered response after yielding to other tasks."""
+        await asyncio.sleep(0.01)
+        return await super().generate(messages, **kwargs)
+
+
+class TestCoalescing:
+    """Tests for request coalescing in CachedModel."""
+
+    async def test_identical_requests_share_one_call(self) -> None:
+        """Test that identical concurrent requests reach the model once, even when sampled."""
+        model = SlowModel()
+        cached = CachedModel(model, coalesce=True)
+        question = [{"role": "user", "content": "status of CERN-PROD"}]
+        results = await asyncio.gather(*(cached.generate(question) for _ in range(5)), cached.generate(question, max_tokens=5))
+        assert results == ["response 1"] * 5 + ["response 2"]
+        assert model.generated == 2
+        assert cached.flights is not None and cached.flights.coalesced == 4
@@ -0,0 +1,90 @@
+"""Tests for single-flight request coalescing."""
+
+import asyncio
+
+import pytest
+
+from ask_panda.singleflight import SingleFlight, request_key
+
+
+class Upstream:
+    """Upstream service whose calls block until released."""
+
+    def __init__(self) -> None:
+        """Initialize the service."""
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def call(self, value: str) -> str:
+        """Answer once released."""
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if value == "bad":
+            raise RuntimeError("upstream failed")
+        return value.upper()
+
+
+class TestSingleFlight:
+    """Tests for SingleFlight."""
+
+    def test_request_key(self) -> None:
+        """Test that keys ignore option order but not values."""
+        assert request_key("docs", "q", a=1, b=2) == request_key("docs", "q", b=2, a=1)
+        assert request_key("docs", "q", a=1) != request_key("logs", "q", a=1)
+
+    async def test_coalesces_concurrent_calls(self) -> None:
+        """Test that identical concurrent calls share one upstream call."""
+        flights = SingleFlight()
+        upstream = Upstream()
+        tasks = [asyncio.create_task(flights.do(key, lambda k=key: upstream.call(k))) for key in ["a", "a", "a", "b"]]
+        await asyncio.sleep(0)
+        assert flights.in_flight == 2
+        upstream.release.set()
+        assert await asyncio.gather(*tasks) == ["A", "A", "A", "B"]
+        assert (upstream.calls, flights.coalesced, flights.in_flight) == (2, 2, 0)
+        assert await flights.do("a", lambda: upstream.call("a")) == "A"
+        assert upstream.calls == 3
+
+    async def test_error_propagates_to_all_callers(self) -> None:
+        """Test that every caller gets the error and the next call starts afresh."""
+        flights = SingleFlight()
+        upstream = Upstream()
+        tasks = [asyncio.create_task(flights.do("k", lambda: upstream.call("bad"))) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert upstream.calls == 1 and flights.in_flight == 0
+
+    async def test_cancelled_caller_does_not_cancel_others(self) -> None:
+        """Test that cancelling one caller leaves the shared call running for the rest."""
+        flights = SingleFlight()
+        upstream = Upstream()
+        first = asyncio.create_task(flights.do("k", lambda: upstream.call("k")))
+        second = asyncio.create_task(flights.do("k", lambda: upstream.call("k")))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        upstream.release.set()
+        assert await second == "K"
+        assert upstream.cancelled == 0
+
+    async def test_last_caller_cancels_call(self) -> None:
+        """Test that the shared call is cancelled once nobody waits for it."""
+        flights = SingleFlight()
+        upstream = Upstream()
+        tasks = [asyncio.create_task(flights.do("k", lambda: upstream.call("k"))) for _ in range(2)]
+        await asyncio.sleep(0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert upstream.cancelled == 1 and flights.in_flight == 0
+        upstream.release.set()
+        assert await flights.do("k", lambda: upstream.call("k")) == "K"
@@ -1,9 +1,35 @@
 """Tests for tools."""
 
 
-from ask_panda.tools.context_memory import ContextMemory
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+from ask_panda.models.tokens import MESSAGE_OVERHEAD, estimate_tokens
+from ask_panda.tools.ann_index import IVFIndex
+from ask_panda.tools.chunking import chunk_file, chunk_lines
+from ask_panda.tools.context_memory import ContextMemory, Message
+from ask_panda.tools.conversation_store import ConversationStore
+from ask_panda.tools.conversations import ConversationRegistry
+from ask_panda.tools.dedup import SimHashDeduplicator
+from ask_panda.tools.ingestion import IngestionStats, ingest_documents, ingest_files
+from ask_panda.tools.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from ask_panda.tools.long_term_memory import LongTermMemory
+from ask_panda.tools.quantization import ProductQuantizer, ScalarQuantizer
+from ask_panda.tools.rerank import maximal_marginal_relevance
+from ask_panda.tools.semantic_cache import SemanticCache
+from ask_panda.tools.sharded_store import ShardedVectorStore
 from ask_panda.tools.vector_store import VectorStore
 
+from .conftest import FakeModel
+
 
 class TestVectorStore:
     """Tests for VectorStore."""
@@ -44,6 +70,423 @@ class TestVectorStore:
         results = store.search("Python", top_k=2)
         assert len(results) == 2
 
+    def test_search_with_embeddings(self) -> None:
+        """Test cosine top-k search with precomputed embeddings."""
+        store = VectorStore(embedding_dim=3, initial_capacity=1)
+        store.add_documents(
+            ["x axis", "y axis", "diagonal"],
+            embeddings=[[2.0, 0.0, 0.0], [0.0, 1.0, 0.0], [1.0, 1.0, 0.0]],
+        )
+        results = store.search("x", top_k=2, query_embedding=[1.0, 0.0, 0.0])
+        assert [r["content"] for r in results] == ["x axis", "diagonal"]
+        assert results[0]["score"] == pytest.approx(1.0)
+        assert results[1]["score"] == pytest.approx(np.sqrt(0.5))
+
+    def test_embeddings_grow_and_normalize(self) -> None:
+        """Test that the embedding matrix grows and stores unit vectors."""
+        store = VectorStore(embedding_dim=4, initial_capacity=2)
+        rng = np.random.default_rng(0)
+        store.add_documents([f"Doc {i}" for i in range(10)], embeddings=rng.normal(size=(10, 4)))
+        assert store.embeddings.shape == (10, 4)
+        assert store.embeddings.dtype == np.float32
+        np.testing.assert_allclose(np.linalg.norm(store.embeddings, axis=1), 1.0, rtol=1e-5)
+
+    def test_embedding_dimension_mismatch(self) -> None:
+        """Test that embeddings of the wrong dimension are rejected."""
+        store = VectorStore(embedding_dim=3)
+        with pytest.raises(ValueError):
+            store.add_document("Doc", embedding=[1.0, 0.0])
+
+    def test_save_and_open(self, tmp_path: Path) -> None:
+        """Test saving a store and opening it memory-mapped."""
+        store = VectorStore(embedding_dim=3)
+        store.add_documents(
+            ["x axis", "y axis \u2713"],
+            metadata_list=[{"experiment": "atlas"}, {}],
+            embeddings=[[1.0, 0.0, 0.0], [0.0, 3.0, 0.0]],
+        )
+        store.save(tmp_path / "store")
+
+        opened = VectorStore.open(tmp_path / "store", mmap=True)
+        assert opened.count == 2
+        assert opened.embedding_dim == 3
+        assert isinstance(opened.embeddings, np.memmap)
+        assert opened.get_document(0) == {"content": "x axis", "metadata": {"experiment": "atlas"}}
+        assert opened.get_document(1) == {"content": "y axis \u2713", "metadata": {}}
+        results = opened.search("y", top_k=1, query_embedding=[0.0, 1.0, 0.0])
+        assert results[0]["content"] == "y axis \u2713"
+        assert results[0]["score"] == pytest.approx(1.0)
+
+    def test_open_then_add(self, tmp_path: Path) -> None:
+        """Test that an opened store can grow and be saved again."""
+        store = VectorStore(embedding_dim=2)
+        store.add_document("Doc 1", embedding=[1.0, 0.0])
+        store.save(tmp_path)
+        opened = VectorStore.open(tmp_path)
+        assert opened.add_document("Doc 2", embedding=[0.0, 1.0]) == 1
+        opened.save(tmp_path / "copy")
+        reopened = VectorStore.open(tmp_path / "copy", mmap=False)
+        assert [doc["content"] for doc in (reopened.get_document(0), reopened.get_document(1))] == ["Doc 1", "Doc 2"]
+
+    def test_open_rejects_unknown_version(self, tmp_path: Path) -> None:
+        """Test that unsupported on-disk versions are rejected."""
+        VectorStore(embedding_dim=2).save(tmp_path)
+        manifest = json.loads((tmp_path / "manifest.json").read_text())
+        manifest["version"] = 999
+        (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+        with pytest.raises(ValueError):
+            VectorStore.open(tmp_path)
+
+    def test_ivf_index_recall(self) -> None:
+        """Test that the IVF index finds the exact nearest neighbours with full probing."""
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(2000, 16))
+        store = VectorStore(embedding_dim=16, index=IVFIndex(nlist=16, nprobe=4, min_train_size=100))
+        store.add_documents([f"Doc {i}" for i in range(2000)], embeddings=vectors)
+        store.build_index()
+        assert store.index is not None and store.index.is_built
+
+        query = rng.normal(size=16)
+        exact = [r["index"] for r in store.search("q", top_k=10, query_embedding=query, exact=True)]
+        full = [r["index"] for r in store.search("q", top_k=10, query_embedding=query, nprobe=16)]
+        approx = [r["index"] for r in store.search("q", top_k=10, query_embedding=query)]
+        assert full == exact
+        assert len(set(approx) & set(exact)) >= 5
+
+    def test_ivf_index_incremental_insert(self) -> None:
+        """Test that documents added after a build are searchable through the index."""
+        rng = np.random.default_rng(2)
+        store = VectorStore(embedding_dim=8, index=IVFIndex(nlist=4, min_train_size=50))
+        store.add_documents([f"Doc {i}" for i in range(100)], embeddings=rng.normal(size=(100, 8)))
+        store.build_index()
+        target = rng.normal(size=8)
+        idx = store.add_document("new", embedding=target)
+        results = store.search("new", top_k=1, query_embedding=target, nprobe=1)
+        assert results[0]["index"] == idx
+
+    def test_ivf_index_small_store_falls_back_to_exact(self) -> None:
+        """Test that small stores are not indexed and search stays exact."""
+        store = VectorStore(embedding_dim=2, index=IVFIndex(min_train_size=100))
+        store.add_documents(["a", "b"], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+        store.build_index()
+        assert store.index is not None and not store.index.is_built
+        assert store.search("b", top_k=1, query_embedding=[0.0, 1.0])[0]["content"] == "b"
+
+    def test_ivf_index_builds_once_store_is_large_enough(self) -> None:
+        """Test that an index that declined to build is built once enough documents have been added."""
+        rng = np.random.default_rng(3)
+        store = VectorStore(embedding_dim=8, index=IVFIndex(nlist=4, min_train_size=50))
+        store.add_documents([f"Doc {i}" for i in range(30)], embeddings=rng.normal(size=(30, 8)))
+        store.build_index()
+        assert store.index is not None and not store.index.is_built
+        store.add_documents([f"Doc {i}" for i in range(30, 49)], embeddings=rng.normal(size=(19, 8)))
+        assert not store.index.is_built
+        target = rng.normal(size=8)
+        idx = store.add_document("new", embedding=target)
+        assert store.index.is_built
+        assert store.search("new", top_k=1, query_embedding=target, nprobe=1)[0]["index"] == idx
+
+    @pytest.mark.parametrize("quantizer", [ScalarQuantizer(), ProductQuantizer(num_subspaces=8, kmeans_iterations=5)])
+    def test_quantized_search_recall(self, quantizer: ScalarQuantizer | ProductQuantizer) -> None:
+        """Test that quantized scans with full-precision rescoring keep recall against exact search."""
+        rng = np.random.default_rng(3)
+        store = VectorStore(embedding_dim=32, quantizer=quantizer, rescore_factor=8)
+        store.add_documents([f"Doc {i}" for i in range(1000)], embeddings=rng.normal(size=(1000, 32)))
+        store.build_index()
+
+        hits = 0
+        for query in rng.normal(size=(10, 32)):
+            exact = {r["index"] for r in store.search("q", top_k=10, query_embedding=query, exact=True)}
+            approx = store.search("q", top_k=10, query_embedding=query)
+            hits += len(exact & {r["index"] for r in approx})
+            assert approx[0]["score"] == pytest.approx(float(store.embeddings[approx[0]["index"]] @ (query / np.linalg.norm(query))), rel=1e-5)
+        assert hits / 100 >= 0.8
+
+    def test_quantized_search_with_index(self) -> None:
+        """Test combining an IVF index with a quantizer and incremental inserts."""
+        rng = np.random.default_rng(4)
+        store = VectorStore(embedding_dim=16, index=IVFIndex(nlist=8, min_train_size=10), quantizer=ScalarQuantizer())
+        store.add_documents([f"Doc {i}" for i in range(500)], embeddings=rng.normal(size=(500, 16)))
+        store.build_index()
+        target = rng.normal(size=16)
+        idx = store.add_document("new", embedding=target)
+        assert store.search("new", top_k=1, query_embedding=target, nprobe=8)[0]["index"] == idx
+
+    def test_pretrained_quantizer(self, tmp_path: Path) -> None:
+        """Test that rows stored without codes are encoded for an already trained quantizer."""
+        rng = np.random.default_rng(5)
+        embeddings = rng.normal(size=(200, 16))
+        trained = VectorStore(embedding_dim=16, quantizer=ScalarQuantizer())
+        trained.add_documents([f"Doc {i}" for i in range(200)], embeddings=embeddings)
+        trained.build_index()
+        trained.save(tmp_path / "store")
+
+        store = VectorStore(embedding_dim=16, quantizer=trained.quantizer)
+        store.add_documents([f"Doc {i}" for i in range(200)], embeddings=embeddings)
+        assert store.search("q", top_k=1, query_embedding=embeddings[7])[0]["index"] == 7
+
+        opened = VectorStore.open(tmp_path / "store", quantizer=trained.quantizer)
+        assert opened.search("q", top_k=1, query_embedding=embeddings[9])[0]["index"] == 9
+        idx = opened.add_document("new", embedding=embeddings[9] + 1.0)
+        assert opened.search("q", top_k=1, query_embedding=embeddings[9] + 1.0)[0]["index"] == idx
+
+    async def test_ingest_documents(self) -> None:
+        """Test batched, bounded-concurrency ingestion with progress reporting."""
+        model = FakeModel()
+        store = VectorStore(embedding_dim=8)
+        progress: list[int] = []
+        documents = (f"Document number {i}" for i in range(25))
+        indices, stats = await ingest_documents(
+            store,
+            model,
+            documents,
+            metadata_list=({"n": i} for i in range(25)),
+            batch_size=4,
+            max_concurrency=2,
+            on_progress=lambda s: progress.append(s.documents),
+        )
+        assert store.count == 25
+        assert model.batch_calls == 7
+        assert model.max_in_flight == 2
+        assert progress[-1] == 25 and len(progress) == 7
+        assert isinstance(stats, IngestionStats) and stats.documents_per_second > 0
+        assert stats.skipped == 0
+        for i, index in enumerate(indices):
+            doc = store.get_document(index)
+            assert doc is not None and doc["content"] == f"Document number {i}" and doc["metadata"] == {"n": i}
+        expected = np.array(await model.embed("Document number 3"), dtype=np.float32)
+        np.testing.assert_allclose(store.embeddings[indices[3]], expected / np.linalg.norm(expected), rtol=1e-6)
+
+    async def test_ingest_skips_duplicates_before_embedding(self) -> None:
+        """Test that ingestion does not embed documents already stored."""
+        store = VectorStore(embedding_dim=8, deduplicator=SimHashDeduplicator())
+        page = "Jobs are assigned to sites by the brokerage according to data locality and site weight."
+        store.add_document(page)
+        model = FakeModel()
+        documents = [page, "Harvester submits pilots.", page, "Harvester submits pilots."]
+        ids, stats = await ingest_documents(store, model, documents, batch_size=2, max_concurrency=1)
+        assert ids == [0, 1, 0, 1]
+        assert stats.skipped == 3 and store.count == 2
+        assert model.batch_calls == 1
+
+    def test_search_where(self) -> None:
+        """Test that metadata filters restrict the scored documents."""
+        store = VectorStore(embedding_dim=2)
+        store.add_documents(
+            ["atlas best", "rubin best", "atlas second", "epic"],
+            metadata_list=[
+                {"experiment": "atlas", "release": "24.0"},
+                {"experiment": "verarubin", "release": "24.0"},
+                {"experiment": "atlas", "release": "25.0", "tags": ["pilot", "harvester"]},
+                {"experiment": "epic"},
+            ],
+            embeddings=[[1.0, 0.0], [1.0, 0.01], [1.0, 0.5], [1.0, 0.0]],
+        )
+        query = [1.0, 0.0]
+        results = store.search("q", top_k=5, query_embedding=query, where={"experiment": "atlas"})
+        assert [r["content"] for r in results] == ["atlas best", "atlas second"]
+        results = store.search("q", top_k=5, query_embedding=query, where={"experiment": "atlas", "release": ["25.0", "26.0"]})
+        assert [r["content"] for r in results] == ["atlas second"]
+        assert [r["content"] for r in store.search("q", query_embedding=query, where={"tags": "pilot"})] == ["atlas second"]
+        assert store.search("q", query_embedding=query, where={"experiment": "cms"}) == []
+        assert store.filter({"release": "24.0"}).tolist() == [0, 1]
+
+    def test_search_where_with_index(self, tmp_path: Path) -> None:
+        """Test filtered search through an IVF index on a reopened store."""
+        rng = np.random.default_rng(5)
+        store = VectorStore(embedding_dim=8)
+        store.add_documents(
+            [f"Doc {i}" for i in range(400)],
+            metadata_list=[{"shard": i % 40} for i in range(400)],
+            embeddings=rng.normal(size=(400, 8)),
+        )
+        store.save(tmp_path)
+        opened = VectorStore.open(tmp_path, index=IVFIndex(nlist=16, nprobe=1, min_train_size=10))
+        opened.build_index()
+        results = opened.search("q", top_k=5, query_embedding=rng.normal(size=8), where={"shard": 7})
+        assert len(results) == 5
+        assert all(r["metadata"]["shard"] == 7 for r in results)
+
+    def test_lexical_search(self) -> None:
+        """Test BM25 search on exact tokens such as site names and error codes."""
+        store = VectorStore(embedding_dim=2)
+        store.add_documents([
+            "Jobs at CERN-PROD fail with error 1305",
+            "CERN computing overview",
+            "Pilot error 1099 at BNL",
+        ])
+        results = store.search("status of CERN-PROD", top_k=3, mode="lexical")
+        assert [r["index"] for r in results] == [0, 1]
+        assert results[0]["score"] > results[1]["score"] > 0
+        assert [r["index"] for r in store.search("error 1305", top_k=1, mode="lexical")] == [0]
+        store.add_document("Error 1305 explained: 1305 means lost heartbeat")
+        assert store.search("1305", top_k=1, mode="lexical")[0]["index"] == 3
+
+    def test_hybrid_search(self) -> None:
+        """Test that hybrid search fuses lexical and vector rankings."""
+        store = VectorStore(embedding_dim=2)
+        store.add_documents(
+            ["task 4711 failed", "unrelated text", "semantically close"],
+            metadata_list=[{"experiment": "atlas"}, {"experiment": "atlas"}, {"experiment": "epic"}],
+            embeddings=[[0.0, 1.0], [0.6, 0.8], [1.0, 0.0]],
+        )
+        results = store.search("task 4711", top_k=3, query_embedding=[1.0, 0.1], mode="hybrid")
+        assert {r["index"] for r in results[:2]} == {0, 2}
+        filtered = store.search("task 4711", top_k=3, query_embedding=[1.0, 0.1], mode="hybrid", where={"experiment": "atlas"})
+        assert [r["index"] for r in filtered] == [0, 1]
+        with pytest.raises(ValueError):
+            store.search("q", mode="fuzzy")  # type: ignore[arg-type]
+
+    def test_update_and_delete(self) -> None:
+        """Test that updates keep the document id and deleted documents are never returned."""
+        store = VectorStore(embedding_dim=2, compaction_threshold=None)
+        store.add_documents(
+            ["alpha", "beta", "gamma"],
+            metadata_list=[{"kind": "a"}, {"kind": "b"}, {"kind": "a"}],
+            embeddings=[[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]],
+        )
+        store.update_document(0, "alpha v2", {"kind": "b"}, embedding=[0.0, 1.0])
+        store.delete_document(1)
+        assert store.count == 2
+        assert store.get_document(0) == {"content": "alpha v2", "metadata": {"kind": "b"}}
+        assert store.get_document(1) is None
+
+        results = store.search("q", top_k=5, query_embedding=[1.0, 0.0])
+        assert sorted(r["index"] for r in results) == [0, 2]
+        assert [r["index"] for r in store.search("beta alpha", top_k=5, mode="lexical")] == [0]
+        assert store.filter({"kind": "b"}).tolist() == [0]
+        assert [r["index"] for r in store.search("q", top_k=5)] == [2, 0]
+        with pytest.raises(ValueError):
+            store.delete_document(1)
+        with pytest.raises(ValueError):
+            store.update_document(7, "missing")
+
+    def test_compaction(self) -> None:
+        """Test that compaction drops tombstones and keeps ids and results."""
+        rng = np.random.default_rng(6)
+        store = VectorStore(embedding_dim=8, index=IVFIndex(nlist=4, nprobe=4, min_train_size=10), compaction_threshold=None)
+        ids = store.add_documents([f"Doc {i}" for i in range(200)], embeddings=rng.normal(size=(200, 8)))
+        store.build_index()
+        for doc_id in ids[::2]:
+            store.delete_document(doc_id)
+        store.update_document(1, "Doc 1 v2", embedding=rng.normal(size=8))
+        query = rng.normal(size=8)
+        before = store.search("q", top_k=10, query_embedding=query)
+
+        store.compact()
+        assert len(store.embeddings) == store.count == 100
+        assert store.search("q", top_k=10, query_embedding=query) == before
+        assert store.get_document(1) == {"content": "Doc 1 v2", "metadata": {}}
+        assert store.get_document(3) == {"content": "Doc 3", "metadata": {}}
+        assert store.add_document("Doc 200") == 200
+
+    def test_background_compaction(self) -> None:
+        """Test that deleting past the threshold compacts in the background."""
+        store = VectorStore(embedding_dim=2, compaction_threshold=0.5)
+        store.add_documents([f"Doc {i}" for i in range(10)], embeddings=[[1.0, float(i)] for i in range(10)])
+        for doc_id in range(6):
+            store.delete_document(doc_id)
+        store.wait_for_compaction(timeout=5)
+        assert len(store.embeddings) == store.count == 4
+        assert [r["index"] for r in store.search("q", top_k=10)] == [6, 7, 8, 9]
+
+    def test_save_and_open_keeps_ids(self, tmp_path: Path) -> None:
+        """Test that saving drops tombstones but keeps document ids."""
+        store = VectorStore(embedding_dim=2, compaction_threshold=None)
+        store.add_documents(["a", "b", "c"], embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+        store.delete_document(1)
+        store.save(tmp_path)
+
+        opened = VectorStore.open(tmp_path)
+        assert opened.count == 2
+        assert opened.get_document(1) is None
+        assert opened.get_document(2) == {"content": "c", "metadata": {}}
+        assert opened.search("q", top_k=1, query_embedding=[1.0, 1.0])[0]["index"] == 2
+        opened.delete_document(0)
+        assert opened.add_document("d") == 3
+        assert [r["content"] for r in opened.search("q", top_k=5)] == ["c", "d"]
+
+    def test_search_diversity(self) -> None:
+        """Test that MMR re-ranking skips near-identical documents."""
+        store = VectorStore(embedding_dim=2)
+        store.add_documents(
+            ["brokerage v1", "brokerage v2", "brokerage v3", "pilot"],
+            embeddings=[[1.0, 0.0], [1.0, 0.001], [1.0, 0.002], [0.7, 0.7]],
+        )
+        query = [1.0, 0.1]
+        plain = store.search("q", top_k=2, query_embedding=query)
+        assert [r["content"] for r in plain] == ["brokerage v3", "brokerage v2"]
+        diverse = store.search("q", top_k=2, query_embedding=query, diversity=0.5)
+        assert [r["content"] for r in diverse] == ["brokerage v3", "pilot"]
+        assert diverse[1]["score"] == pytest.approx(float(np.dot([0.7, 0.7], query) / (0.7 * np.sqrt(2) * np.linalg.norm(query))))
+        lexical = store.search("brokerage pilot", top_k=2, mode="lexical", diversity=0.5)
+        assert [r["content"] for r in lexical] == ["pilot", "brokerage v1"]
+        assert store.search("zzz", mode="lexical", diversity=0.5) == []
+        assert store.search("zzz", mode="hybrid", diversity=0.5) == []
+        assert store.search("q", query_embedding=query, where={"experiment": "none"}, diversity=0.5) == []
+        with pytest.raises(ValueError):
+            store.search("q", query_embedding=query, diversity=1.5)
+
+    def test_deduplicate_on_insert(self, tmp_path: Path) -> None:
+        """Test that near-duplicate documents are skipped and map to the stored id."""
+        page = "The PanDA pilot downloads input files, runs the payload, uploads outputs and reports the job status to the server."
+        store = VectorStore(embedding_dim=2, deduplicator=SimHashDeduplicator())
+        ids = store.add_documents([page, "Brokerage picks a site by weight.", page.replace("The PanDA", "the  PanDA"), page])
+        assert ids == [0, 1, 0, 0]
+        assert store.count == 2 and store.duplicates_skipped == 2
+
+        store.delete_document(0)
+        assert store.add_document(page) == 2
+        store.save(tmp_path)
+        opened = VectorStore.open(tmp_path, deduplicator=SimHashDeduplicator())
+        assert opened.find_duplicate(page + " ") == 2
+        assert opened.add_documents([page, "Harvester manages pilot submission."]) == [2, 3]
+
+    async def test_async_search_and_add(self) -> None:
+        """Test that the async methods run on the thread pool and match the sync results."""
+        store = VectorStore(embedding_dim=2, max_workers=2)
+        ids = await store.aadd_documents(["x", "y"], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+        assert ids == [0, 1]
+        results = await asyncio.gather(*(store.asearch("q", top_k=1, query_embedding=[0.0, 1.0]) for _ in range(8)))
+        assert all(r == store.search("q", top_k=1, query_embedding=[0.0, 1.0]) for r in results)
+        assert (await store.asearch("x", top_k=1, mode="lexical"))[0]["index"] == 0
+        store.close()
+
+    async def test_async_search_cancellation(self) -> None:
+        """Test that a cancelled search raises in the caller and leaves the store usable."""
+        store = VectorStore(embedding_dim=2, max_workers=1)
+        store.add_documents(["x", "y"], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+        first = asyncio.create_task(store.asearch("q", top_k=1, query_embedding=[1.0, 0.0]))
+        second = asyncio.create_task(store.asearch("q", top_k=1, query_embedding=[0.0, 1.0]))
+        await asyncio.sleep(0)
+        second.cancel()
+        assert (await first)[0]["content"] == "x"
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        assert (await store.asearch("q", top_k=1, query_embedding=[0.0, 1.0]))[0]["content"] == "y"
+        store.close()
+
+    async def test_async_searches_scan_in_parallel(self) -> None:
+        """Test that scans run outside the store lock, alongside other searches and writes."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        class RendezvousQuantizer(ScalarQuantizer):
+            """Scalar quantizer whose scans wait until two of them run at once."""
+
+            def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+                """Meet another scan, then score."""
+                barrier.wait()
+                return super().score(codes, query)
+
+        store = VectorStore(embedding_dim=2, quantizer=RendezvousQuantizer(), max_workers=2)
+        store.add_documents(["x", "y"], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+        store.build_index()
+        first, second = await asyncio.gather(
+            store.asearch("q", top_k=1, query_embedding=[1.0, 0.0]), store.asearch("q", top_k=1, query_embedding=[0.0, 1.0])
+        )
+        assert first[0]["content"] == "x" and second[0]["content"] == "y"
+        store.close()
+
     def test_clear(self) -> None:
         """Test clearing the store."""
         store = VectorStore()
@@ -51,6 +494,186 @@ class TestVectorStore:
         store.clear()
         assert store.count == 0
 
+    def test_running_scans_survive_clear_and_retraining(self) -> None:
+        """Test that clearing or retraining the store leaves the arrays and quantizer of a captured scan intact."""
+        store = VectorStore(embedding_dim=2, quantizer=ScalarQuantizer())
+        store.add_documents(["x", "y"], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+        store.build_index()
+        with store._lock:
+            snapshot, quantizer = store._snapshot(), store.quantizer
+        assert quantizer is not None
+        offset = quantizer._offset.copy()
+
+        store.build_index()
+        store.clear()
+        store.add_documents(["z", "w"], embeddings=[[-1.0, 0.0], [0.0, -1.0]])
+        store.build_index()
+        assert store.quantizer is not quantizer
+        np.testing.assert_array_equal(quantizer._offset, offset)
+        rows, _ = snapshot.vector_search(np.array([1.0, 0.0], dtype=np.float32), None, 1, quantizer, 4)
+        assert snapshot.result(int(rows[0]), 1.0)["content"] == "x"
+        assert store.search("q", top_k=1, query_embedding=[-1.0, 0.0])[0]["content"] == "z"
+
+
+class TestShardedVectorStore:
+    """Tests for ShardedVectorStore."""
+
+    def test_matches_exact_search(self, tmp_path: Path) -> None:
+        """Test that fanned-out shard results merge into the exact top-k."""
+        rng = np.random.default_rng(7)
+        store = VectorStore(embedding_dim=16, compaction_threshold=None)
+        store.add_documents(
+            [f"Doc {i}" for i in range(1000)],
+            metadata_list=[{"shard": i % 10} for i in range(1000)],
+            embeddings=rng.normal(size=(1000, 16)),
+        )
+        store.delete_document(3)
+        store.update_document(5, "Doc 5 v2", {"shard": 5}, embedding=rng.normal(size=16))
+        store.save(tmp_path)
+
+        with ShardedVectorStore(tmp_path, num_workers=2, num_shards=4) as sharded:
+            assert sharded.count == 999
+            for query in rng.normal(size=(3, 16)):
+                expected = store.search("q", top_k=10, query_embedding=query)
+                results = sharded.search(query, top_k=10)
+                assert [r["index"] for r in results] == [r["index"] for r in expected]
+                assert [r["score"] for r in results] == pytest.approx([r["score"] for r in expected], rel=1e-5)
+            filtered = sharded.search(query, top_k=3, where={"shard": 5})
+            assert [r["index"] for r in filtered] == [r["index"] for r in store.search("q", 3, query, where={"shard": 5})]
+            assert sharded.get_document(5) == {"content": "Doc 5 v2", "metadata": {"shard": 5}}
+            assert sharded.get_document(3) is None
+
+            store.add_document("new", {"shard": 0}, embedding=query)
+            store.save(tmp_path)
+            sharded.reload()
+            assert sharded.search(query, top_k=1)[0]["content"] == "new"
+            assert asyncio.run(sharded.asearch(query, top_k=3)) == sharded.search(query, top_k=3)
+
+
+class TestRerank:
+    """Tests for maximal marginal relevance."""
+
+    def test_maximal_marginal_relevance(self) -> None:
+        """Test that diversity 0 keeps relevance order and 1 spreads out."""
+        vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+        relevance = np.array([0.9, 0.8, 0.1], dtype=np.float32)
+        assert maximal_marginal_relevance(vectors, relevance, 2, 0.0).tolist() == [0, 1]
+        assert maximal_marginal_relevance(vectors, relevance, 2, 0.5).tolist() == [0, 2]
+        assert maximal_marginal_relevance(vectors, relevance, 5, 0.5).tolist() == [0, 2, 1]
+        assert maximal_marginal_relevance(vectors[:0], relevance[:0], 3, 0.5).tolist() == []
+
+
+class TestSimHashDeduplicator:
+    """Tests for SimHashDeduplicator."""
+
+    def test_signature_distance(self) -> None:
+        """Test that small edits keep signatures close and unrelated texts far apart."""
+        dedup = SimHashDeduplicator()
+        words = [f"word{i}" for i in range(200)]
+        base = dedup.signature(" ".join(words))
+        edited = dedup.signature(" ".join(words[:100] + ["changed"] + words[101:]))
+        other = dedup.signature(" ".join(f"other{i}" for i in range(200)))
+        assert (base ^ edited).bit_count() <= dedup.max_distance
+        assert (base ^ other).bit_count() > dedup.max_distance
+
+    def test_band_lookup(self) -> None:
+        """Test that lookups find signatures within the distance through any band."""
+        dedup = SimHashDeduplicator(max_distance=3)
+        dedup.add(7, 0)
+        assert dedup.find(0b111) == 7
+        assert dedup.find((1 << 63) | (1 << 40) | (1 << 20)) == 7
+        assert dedup.find(0b1111) is None
+        dedup.remove(7)
+        assert dedup.find(0) is None and dedup.count == 0
+
+
+class TestChunking:
+    """Tests for the streaming chunker."""
+
+    def test_markdown_headings(self) -> None:
+        """Test that headings start chunks and fenced code is not a heading."""
+        lines = [
+            "# Pilot\n",
+            "Intro text.\n",
+            "## Errors\n",
+            "Error 1305 means lost heartbeat.\n",
+            "```\n",
+            "# not a heading\n",
+            "```\n",
+            "# Harvester\n",
+            "## Empty\n",
+            "# Brokerage\n",
+            "Sites are chosen by weight.\n",
+        ]
+        chunks = list(chunk_lines(lines, metadata={"source": "manual.md"}))
+        assert [c.metadata["section"] for c in chunks] == ["Pilot", "Pilot > Errors", "Brokerage"]
+        assert chunks[1].text.startswith("Errors\nError 1305")
+        assert "# not a heading" in chunks[1].text
+        assert chunks[2].metadata == {"source": "manual.md", "section": "Brokerage", "chunk": 2}
+
+    def test_token_windows_overlap(self) -> None:
+        """Test fixed-size token windows with overlap."""
+        words = " ".join(f"w{i}" for i in range(10))
+        chunks = list(chunk_lines([words], fmt="text", max_tokens=4, overlap=1))
+        assert [c.text.split() for c in chunks] == [
+            ["w0", "w1", "w2", "w3"],
+            ["w3", "w4", "w5", "w6"],
+            ["w6", "w7", "w8", "w9"],
+        ]
+        with pytest.raises(ValueError):
+            list(chunk_lines([words], max_tokens=4, overlap=4))
+
+    def test_html(self, tmp_path: Path) -> None:
+        """Test that HTML is split by headings and scripts are dropped."""
+        path = tmp_path / "guide.html"
+        path.write_text(
+            "<html><head><title>x</title></head><body>\n<h1>Jobs</h1>\n<p>Jobs &amp; tasks.</p>\n"
+            "<script>var x = 1;</script>\n<h2>Retries</h2><p>Up to three.</p></body></html>\n"
+        )
+        chunks = list(chunk_file(path))
+        assert [(c.metadata["section"], c.text) for c in chunks] == [
+            ("Jobs", "Jobs\nJobs & tasks."),
+            ("Jobs > Retries", "Retries\nUp to three."),
+        ]
+        assert chunks[0].metadata["source"] == str(path)
+
+    async def test_ingest_files(self, tmp_path: Path) -> None:
+        """Test chunking a source tree straight into the store."""
+        (tmp_path / "docs").mkdir()
+        (tmp_path / "docs" / "a.md").write_text("# A\none two three four five\n")
+        (tmp_path / "docs" / "b.html").write_text("<h1>B</h1><p>six seven</p>")
+        (tmp_path / "docs" / "skip.py").write_text("print('no')")
+        store = VectorStore(embedding_dim=8)
+        ids, stats = await ingest_files(store, FakeModel(), [tmp_path / "docs"], max_tokens=4, overlap=0, batch_size=2)
+        assert stats.documents == store.count == 3
+        sources = [Path(doc["metadata"]["source"]).name for doc in map(store.get_document, ids) if doc is not None]
+        assert sources == ["a.md", "a.md", "b.html"]
+
+
+class TestLexicalIndex:
+    """Tests for LexicalIndex and rank fusion."""
+
+    def test_tokenize(self) -> None:
+        """Test that compound identifiers are kept whole and split."""
+        assert tokenize("Site CERN-PROD, task 12345.") == ["site", "cern-prod", "cern", "prod", "task", "12345"]
+
+    def test_bm25_prefers_rare_terms(self) -> None:
+        """Test that rare query terms outweigh common ones."""
+        index = LexicalIndex()
+        for i, text in enumerate(["panda job", "panda job", "panda harvester"]):
+            index.add(i, text)
+        ids, scores = index.search("panda harvester", top_k=3)
+        assert ids.tolist()[0] == 2
+        assert len(ids) == 3 and scores[0] > scores[1]
+        ids, _ = index.search("panda", top_k=3, allowed=np.array([1]))
+        assert ids.tolist() == [1]
+
+    def test_reciprocal_rank_fusion(self) -> None:
+        """Test that documents ranked well in both lists win."""
+        ids, scores = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 1])], top_k=3)
+        assert ids.tolist() == [1, 3, 2]
+        assert scores[0] == pytest.approx(1 / 61 + 1 / 62)
+
 
 class TestContextMemory:
     """Tests for ContextMemory."""
@@ -126,3 +749,458 @@ class TestContextMemory:
         for i in range(5):
             memory.add_user_message(f"Message {i}")
         assert memory.message_count == 3
+
+    def test_max_tokens(self) -> None:
+        """Test that the oldest messages are trimmed to the token budget."""
+        memory = ContextMemory(max_tokens=30, token_counter=lambda text: len(text.split()))
+        memory.add_user_message("one two three four five six")
+        memory.add_assistant_message("seven eight")
+        assert memory.token_count == 6 + 2 + 2 * MESSAGE_OVERHEAD
+        memory.add_user_message(" ".join(["word"] * 12))
+        assert [m["content"] for m in memory.to_chat_format()] == ["seven eight", " ".join(["word"] * 12)]
+        assert memory.token_count == 2 + 12 + 2 * MESSAGE_OVERHEAD
+        memory.add_user_message(" ".join(["long"] * 40))
+        assert memory.message_count == 1 and memory.token_count == 40 + MESSAGE_OVERHEAD
+        memory.clear_messages()
+        assert memory.token_count == 0
+
+    def test_to_chat_format_max_tokens(self) -> None:
+        """Test that a token budget returns the largest recent suffix that fits."""
+        memory = ContextMemory(token_counter=lambda text: len(text.split()))
+        for content in ["a b c d", "e", "f g", "h"]:
+            memory.add_user_message(content)
+        budget = 1 + 2 + 1 + 3 * MESSAGE_OVERHEAD
+        assert [m["content"] for m in memory.to_chat_format(max_tokens=budget)] == ["e", "f g", "h"]
+        assert [m["content"] for m in memory.to_chat_format(max_tokens=budget - 1)] == ["f g", "h"]
+        assert memory.to_chat_format(max_tokens=0) == []
+        assert len(memory.to_chat_format(max_tokens=10_000)) == 4
+
+    def test_chat_view_is_shared(self) -> None:
+        """Test that the chat view reuses message dicts and follows trimming."""
+        memory = ContextMemory(max_messages=2)
+        memory.add_user_message("first")
+        memory.add_assistant_message("second")
+        view = memory.to_chat_format()
+        assert view[1] is memory.to_chat_format()[1]
+        memory.add_user_message("third")
+        assert memory.to_chat_format() == [
+            {"role": "assistant", "content": "second"},
+            {"role": "user", "content": "third"},
+        ]
+        assert memory.to_chat_format()[0] is view[1]
+        memory.clear_messages()
+        assert memory.to_chat_format() == []
+
+    def test_message_record(self) -> None:
+        """Test the compact message record."""
+        message = Message("user", "hello", tokens=5)
+        assert not hasattr(message, "__dict__")
+        assert isinstance(message.timestamp, float)
+        assert message._metadata is None
+        message.metadata["source"] = "cli"
+        assert message.metadata == {"source": "cli"}
+        assert message.chat == {"role": "user", "content": "hello"}
+
+    def test_pinned_messages(self) -> None:
+        """Test that system and pinned messages are never evicted and always come first."""
+        memory = ContextMemory(max_messages=2, max_tokens=30, token_counter=lambda text: len(text.split()))
+        memory.add_system_message(" ".join(["rule"] * 100))
+        memory.pin_message("user", "experiment atlas")
+        prefix = memory.to_chat_format()
+        for i in range(5):
+            memory.add_user_message(f"message {i}")
+        chat = memory.to_chat_format()
+        assert chat[0] is prefix[0] and chat[1] is prefix[1]
+        assert [m["content"] for m in chat[2:]] == ["message 3", "message 4"]
+        assert [m["content"] for m in memory.to_chat_format(max_tokens=0)] == [prefix[0]["content"], "experiment atlas"]
+        assert memory.message_count == 4
+        assert memory.token_count == 100 + 2 + 2 * 2 + 4 * MESSAGE_OVERHEAD
+        memory.clear_messages(keep_pinned=True)
+        assert memory.to_chat_format() == prefix
+        memory.clear_messages()
+        assert memory.message_count == 0 and memory.token_count == 0
+
+    def test_estimate_tokens(self) -> None:
+        """Test the tokenizer-free token estimate."""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("Job 4711 failed.") == 5
+        assert estimate_tokens("pandaserver") == 3
+
+
+class TestConversationRegistry:
+    """Tests for ConversationRegistry."""
+
+    async def test_isolates_conversations(self) -> None:
+        """Test that each conversation id gets its own memory."""
+        registry = ConversationRegistry()
+        async with registry.session("a") as memory:
+            memory.add_user_message("from a")
+        async with registry.session("b") as memory:
+            memory.add_user_message("from b")
+        async with registry.session("a") as memory:
+            assert [m["content"] for m in memory.to_chat_format()] == ["from a"]
+        assert registry.count == 2 and "b" in registry
+
+    async def test_lru_eviction(self) -> None:
+        """Test that the least recently used conversation is evicted first."""
+        registry = ConversationRegistry(max_conversations=2)
+        for conversation_id in ["a", "b", "a", "c"]:
+            async with registry.session(conversation_id):
+                pass
+        assert "b" not in registry and "a" in registry and "c" in registry
+        assert registry.evictions == 1
+
+    async def test_token_budget_and_ttl(self) -> None:
+        """Test eviction by total tokens and by idle time."""
+        now = [0.0]
+        registry = ConversationRegistry(max_total_tokens=40, idle_ttl=60.0, clock=lambda: now[0])
+        for conversation_id in ["a", "b", "c"]:
+            async with registry.session(conversation_id) as memory:
+                memory.add_user_message("ten tokens worth of text in this user message here")
+        assert "a" not in registry and registry.token_count <= 40
+        now[0] = 30.0
+        async with registry.session("c"):
+            pass
+        now[0] = 90.0
+        assert registry.evict() == 1
+        assert list(registry._conversations) == ["c"]
+        registry.remove("c")
+        assert registry.count == 0 and registry.token_count == 0
+
+    async def test_session_locks_conversation(self) -> None:
+        """Test that turns of one conversation are serialized and busy ones are not evicted."""
+        registry = ConversationRegistry(max_conversations=1)
+        order = []
+
+        async def turn(conversation_id: str, label: str) -> None:
+            async with registry.session(conversation_id):
+                order.append(f"{label} start")
+                await asyncio.sleep(0.01)
+                order.append(f"{label} end")
+
+        await asyncio.gather(turn("a", "first"), turn("a", "second"), turn("b", "other"))
+        assert order.index("first end") < order.index("second start")
+        assert order.index("other start") < order.index("first end")
+        assert registry.count == 1
+
+
+class TestConversationStore:
+    """Tests for ConversationStore."""
+
+    def test_write_behind(self, tmp_path: Path) -> None:
+        """Test that appends are buffered and written in batches."""
+        store = ConversationStore(tmp_path / "conversations.db", batch_size=3, flush_interval=None)
+        reader = sqlite3.connect(str(tmp_path / "conversations.db"))
+        for i in range(2):
+            store.append("a", Message("user", f"message {i}", tokens=5))
+        assert reader.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 0
+        store.append("a", Message("assistant", "message 2", tokens=5))
+        assert reader.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 3
+        store.append("b", Message("user", "other", metadata={"source": "cli"}, tokens=5))
+        store.close()
+        assert reader.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 4
+
+        store = ConversationStore(tmp_path / "conversations.db", batch_size=2, flush_interval=60.0)
+        for i in range(2):
+            store.append("c", Message("user", f"message {i}", tokens=5))
+        assert store.count("c") == 2
+        # The full batch is handed to the background thread rather than written by the caller
+        for _ in range(500):
+            if reader.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 6:
+                break
+            time.sleep(0.01)
+        assert reader.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 6
+        store.close()
+        reader.close()
+
+    async def test_workers_share_conversations(self, tmp_path: Path) -> None:
+        """Test that a conversation alternating between workers is reloaded when another worker extended it."""
+        path = tmp_path / "conversations.db"
+        stores = [ConversationStore(path, flush_interval=None) for _ in range(2)]
+
+        def memory_factory(store: ConversationStore) -> Any:
+            def create(conversation_id: str) -> ContextMemory:
+                memory = ContextMemory()
+                memory.add_system_message("system")
+                memory.attach(store, conversation_id)
+                return memory
+
+            return create
+
+        workers = [ConversationRegistry(memory_factory(store)) for store in stores]
+        for turn in range(4):
+            store, worker = stores[turn % 2], workers[turn % 2]
+            async with worker.session("a") as memory:
+                memory.add_user_message(f"question {turn}")
+                memory.add_assistant_message(f"answer {turn}")
+            store.flush()
+        async with workers[0].session("a") as memory:
+            assert [m["content"] for m in memory.to_chat_format()][-3:] == ["answer 2", "question 3", "answer 3"]
+            assert memory.message_count == 9
+            assert not await memory.refresh()
+        for store in stores:
+            store.close()
+
+    async def test_refresh_loads_recent_window(self, tmp_path: Path) -> None:
+        """Test that a conversation survives a restart and only its recent window is loaded."""
+        store = ConversationStore(tmp_path / "conversations.db", flush_interval=None)
+        memory = ContextMemory(token_counter=lambda text: len(text.split()))
+        memory.attach(store, "a")
+        for i in range(6):
+            memory.add_user_message(f"message {i}", source="test")
+        store.close()
+
+        store = ConversationStore(tmp_path / "conversations.db", flush_interval=None)
+        restored = ContextMemory(max_messages=4, max_tokens=100)
+        restored.add_system_message("system")
+        restored.attach(store, "a")
+        assert restored.message_count == 1 and await restored.refresh()
+        assert [m["content"] for m in restored.get_messages()] == ["system", "message 2", "message 3", "message 4", "message 5"]
+        assert restored._messages[-1].metadata == {"source": "test"}
+        budget = ContextMemory(max_tokens=2 * (2 + MESSAGE_OVERHEAD))
+        budget.attach(store, "a")
+        assert await budget.refresh()
+        assert [m["content"] for m in budget.to_chat_format()] == ["message 4", "message 5"]
+
+        restored.clear_messages()
+        assert store.count("a") == 0
+        store.close()
+
+    async def test_sessions_read_the_store_off_the_event_loop(self, tmp_path: Path) -> None:
+        """Test that a session waiting for the store does not block other tasks."""
+        store = ConversationStore(tmp_path / "conversations.db", flush_interval=None)
+
+        def factory(conversation_id: str) -> ContextMemory:
+            memory = ContextMemory()
+            memory.attach(store, conversation_id)
+            return memory
+
+        async def turn() -> None:
+            async with ConversationRegistry(factory).session("a") as memory:
+                memory.add_user_message("hello")
+
+        # A write in progress holds the database lock
+        with store._db_lock:
+            task = asyncio.create_task(turn())
+            await asyncio.sleep(0.05)
+            assert not task.done()
+        await asyncio.wait_for(task, timeout=1.0)
+        assert store.count("a") == 1
+        store.close()
+
+    async def test_registry_eviction_is_lossless(self, tmp_path: Path) -> None:
+        """Test that an evicted conversation is reloaded from the store."""
+        store = ConversationStore(tmp_path / "conversations.db")
+
+        def factory(conversation_id: str) -> ContextMemory:
+            memory = ContextMemory()
+            memory.attach(store, conversation_id)
+            return memory
+
+        registry = ConversationRegistry(factory, max_conversations=1)
+        async with registry.session("a") as memory:
+            memory.add_user_message("remember me")
+        async with registry.session("b"):
+            pass
+        assert "a" not in registry
+        async with registry.session("a") as memory:
+            assert memory.to_chat_format() == [{"role": "user", "content": "remember me"}]
+        store.close()
+
+
+class SummaryModel(FakeModel):
+    """Model that summarizes by counting transcript lines and records its prompts."""
+
+    def __init__(self) -> None:
+        """Initialize the model."""
+        super().__init__()
+        self.prompts: list[str] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def generate(self, messages: list[dict[str, str]], **kwargs: Any) -> str:
+        """Summarize the transcript in the last message."""
+        await self.release.wait()
+        self.prompts.append(messages[-1]["content"])
+        return f"{messages[-1]['content'].count(': ')} earlier messages"
+
+
+class TestContextMemoryCompaction:
+    """Tests for rolling summarization in ContextMemory."""
+
+    def _memory(self) -> ContextMemory:
+        memory = ContextMemory(token_counter=lambda text: len(text.split()), summary_threshold=40, keep_recent=2)
+        memory.add_system_message("You help with PanDA.")
+        return memory
+
+    async def test_compact(self) -> None:
+        """Test that older turns are replaced by a summary after the system prompt."""
+        memory = self._memory()
+        model = SummaryModel()
+        assert not memory.needs_compaction
+        for i in range(6):
+            memory.add_user_message(f"question {i} about task 4711")
+        assert memory.needs_compaction
+        assert await memory.compact(model)
+        assert [m["content"] for m in memory.to_chat_format()] == [
+            "You help with PanDA.",
+            "Summary of the earlier conversation: 4 earlier messages",
+            "question 4 about task 4711",
+            "question 5 about task 4711",
+        ]
+        assert memory.summary == "Summary of the earlier conversation: 4 earlier messages"
+        assert memory.token_count == sum(len(m["content"].split()) + MESSAGE_OVERHEAD for m in memory.to_chat_format())
+        assert not memory.needs_compaction and not await memory.compact(model)
+
+    async def test_rolling_summary(self) -> None:
+        """Test that a second compaction folds the previous summary into the new one."""
+        memory = self._memory()
+        model = SummaryModel()
+        for i in range(6):
+            memory.add_user_message(f"question {i} about task 4711")
+        await memory.compact(model)
+        for i in range(6, 12):
+            memory.add_user_message(f"question {i} about task 4711")
+        await memory.compact(model)
+        assert model.prompts[1].startswith("system: Summary of the earlier conversation")
+        assert [m.is_summary for m in memory._messages] == [True, False, False]
+
+    async def test_trim_keeps_summary(self) -> None:
+        """Test that the token budget trims the oldest turns after the summary, never the summary itself."""
+        memory = ContextMemory(token_counter=lambda text: len(text.split()), max_tokens=60, summary_threshold=40, keep_recent=2)
+        for i in range(6):
+            memory.add_user_message(f"question {i} about task 4711")
+        await memory.compact(SummaryModel())
+        for i in range(6, 12):
+            memory.add_user_message(f"question {i} about task 4711")
+        assert memory.token_count <= 60
+        assert memory._messages[0].is_summary and memory._messages[1].content != "question 4 about task 4711"
+        with pytest.raises(ValueError):
+            ContextMemory(max_tokens=4000, summary_threshold=5000)
+
+    async def test_messages_added_during_compaction_are_kept(self) -> None:
+        """Test that compaction does not block or lose turns added while the model runs."""
+        memory = self._memory()
+        model = SummaryModel()
+        model.release.clear()
+        for i in range(6):
+            memory.add_user_message(f"question {i} about task 4711")
+        task = asyncio.create_task(memory.compact(model))
+        await asyncio.sleep(0)
+        assert not memory.needs_compaction
+        memory.add_assistant_message("answer while summarizing")
+        model.release.set()
+        assert await task
+        contents = [m["content"] for m in memory.to_chat_format()]
+        assert contents[-3:] == ["question 4 about task 4711", "question 5 about task 4711", "answer while summarizing"]
+
+    async def test_reload_during_compaction_discards_summary(self, tmp_path: Path) -> None:
+        """Test that a summary is not prepended to a window reloaded while it was written."""
+        store = ConversationStore(tmp_path / "conversations.db", flush_interval=None)
+        memory = self._memory()
+        memory.attach(store, "a")
+        await memory.refresh()
+        model = SummaryModel()
+        model.release.clear()
+        for i in range(6):
+            memory.add_user_message(f"question {i} about task 4711")
+        task = asyncio.create_task(memory.compact(model))
+        await asyncio.sleep(0)
+        # Another worker handles a turn of the conversation meanwhile
+        store.append("a", Message("assistant", "answer from another worker", tokens=5))
+        assert await memory.refresh()
+        model.release.set()
+        assert not await task
+        assert memory.summary is None
+        contents = [m["content"] for m in memory.to_chat_format()]
+        assert len(contents) == len(set(contents)) == 8 and contents[-1] == "answer from another worker"
+        store.close()
+
+
+class TestLongTermMemory:
+    """Tests for long-term recall in ContextMemory."""
+
+    async def test_recall_relevant_turn(self) -> None:
+        """Test that a trimmed turn relevant to the query comes back into the prompt."""
+        model = FakeModel(dim=64)
+        memory = ContextMemory(max_messages=3, long_term=LongTermMemory(model, top_k=1, min_score=0.9))
+        memory.add_user_message("job 4711 failed at site BNL")
+        memory.add_assistant_message("zzzz")
+        memory.add_user_message("yyyy")
+        memory.add_user_message("why did job 4711 fail at BNL")
+        assert memory.long_term is not None and memory.long_term.count == 1
+        chat = await memory.recall_chat_format()
+        assert chat[0] == {"role": "system", "content": "Relevant earlier turns:\nuser: job 4711 failed at site BNL"}
+        assert [m["content"] for m in chat[1:]] == ["zzzz", "yyyy", "why did job 4711 fail at BNL"]
+        assert model.batch_calls == 1
+
+    async def test_recall_budget_and_irrelevant_query(self) -> None:
+        """Test that nothing is recalled below the score threshold and the budget covers recalled turns."""
+        model = FakeModel(dim=64)
+        memory = ContextMemory(max_messages=2, long_term=LongTermMemory(model, top_k=1, min_score=0.9))
+        memory.add_user_message("job 4711 failed at site BNL")
+        memory.add_assistant_message("ok")
+        memory.add_user_message("qqqq")
+        assert await memory.recall_chat_format() == memory.to_chat_format()
+        chat = await memory.recall_chat_format("job 4711 failed at site BNL", max_tokens=30)
+        assert chat[0]["content"].startswith("Relevant earlier turns:")
+        assert sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD for m in chat) <= 30
+        memory.clear_messages()
+        assert memory.long_term is not None and memory.long_term.count == 0
+
+    async def test_reload_restores_older_turns(self, tmp_path: Path) -> None:
+        """Test that a conversation reloaded from its store can still recall turns older than its window."""
+        store = ConversationStore(tmp_path / "conversations.db", flush_interval=None)
+        memory = ContextMemory()
+        memory.attach(store, "a")
+        memory.add_user_message("job 4711 failed at site BNL")
+        for i in range(6):
+            memory.add_assistant_message(f"zzzz {i}")
+        store.close()
+
+        store = ConversationStore(tmp_path / "conversations.db", flush_interval=None)
+        model = FakeModel(dim=64)
+        restored = ContextMemory(max_messages=3, long_term=LongTermMemory(model, top_k=1, min_score=0.9))
+        restored.attach(store, "a")
+        assert await restored.refresh()
+        assert [m["content"] for m in restored.to_chat_format()] == ["zzzz 3", "zzzz 4", "zzzz 5"]
+        assert restored.long_term is not None and restored.long_term.count == 4
+        chat = await restored.recall_chat_format("why did job 4711 fail at BNL")
+        assert chat[0] == {"role": "system", "content": "Relevant earlier turns:\nuser: job 4711 failed at site BNL"}
+        store.close()
+
+
+class TestSemanticCache:
+    """Tests for SemanticCache."""
+
+    async def test_paraphrase_hit(self) -> None:
+        """Test that a normalized paraphrase hits only for the same experiment and client type."""
+        cache = SemanticCache(FakeModel(dim=64), threshold=0.95)
+        cache.put(await cache.embed("What does error 1305 mean?"), "atlas", "logs", "answer")
+        embedding = await cache.embed("  what does ERROR 1305 mean ? ")
+        assert cache.get(embedding, "atlas", "logs") == "answer"
+        assert cache.get(embedding, "epic", "logs") is None
+        assert cache.get(embedding, "atlas", "docs") is None
+        assert cache.get(await cache.embed("how do I submit a task"), "atlas", "logs") is None
+        assert (cache.hits, cache.misses) == (1, 3)
+
+    async def test_ttl_per_client_type(self) -> None:
+        """Test that answers expire after the TTL of their client domain."""
+        now = [0.0]
+        cache = SemanticCache(FakeModel(dim=64), ttl=100.0, ttls={"maintenance": 10.0}, clock=lambda: now[0])
+        embedding = await cache.embed("status of CERN-PROD")
+        cache.put(embedding, "atlas", "maintenance", "online")
+        cache.put(embedding, "atlas", "docs", "see the manual")
+        now[0] = 11.0
+        assert cache.get(embedding, "atlas", "maintenance") is None
+        assert cache.get(embedding, "atlas", "docs") == "see the manual"
+        assert cache.count == 1
+
+    async def test_max_entries(self) -> None:
+        """Test that the oldest answers are dropped beyond the limit."""
+        cache = SemanticCache(FakeModel(dim=64), max_entries=2)
+        for question in ["aaaa", "bbbb", "cccc"]:
+            cache.put(await cache.embed(question), "atlas", "docs", question)
+        assert cache.count == 2
+        assert cache.get(await cache.embed("aaaa"), "atlas", "docs") is None
+        assert cache.get(await cache.embed("cccc"), "atlas", "docs") == "cccc"